@@ -0,0 +1,39 @@
+"""
+System checks for the billing project.
+"""
+from django.conf import settings
+from django.core.checks import Error, Tags, Warning, register
+
+# Cache backends that keep a separate copy of the cache in every process
+PER_PROCESS_CACHE_BACKENDS = ('LocMemCache', 'DummyCache')
+
+
+def cache_is_shared() -> bool:
+    """True if the default cache is seen by every process (not a per-process backend)."""
+    backend = settings.CACHES.get('default', {}).get('BACKEND', '')
+    return not backend.endswith(PER_PROCESS_CACHE_BACKENDS)
+
+
+@register(Tags.caches, deploy=False)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    The cache holds state shared by every web and Celery process (circuit
+    breakers, rate limiters, locks, scheduler state), so it must not be
+    per-process.
+    """
+    if not cache_is_shared():
+        backend = settings.CACHES['default']['BACKEND']
+        return [Error(
+            f"The default cache ({backend}) is not shared between processes.",
+            hint="Set CACHE_URL to a Redis server.",
+            id='core.E001',
+        )]
+    if not getattr(settings, 'CACHE_URL', ''):
+        # A warning, not an error: existing single-host deployments keep working
+        return [Warning(
+            "CACHE_URL is not set; using the file cache, which is shared only by "
+            "processes on this host and whose locks are not atomic.",
+            hint="Set CACHE_URL to a Redis server shared by the web and Celery processes.",
+            id='core.W001',
+        )]
+    return []
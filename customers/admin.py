@@ -2,7 +2,8 @@
 Admin configuration for customers app.
 """
 from django.contrib import admin
-from .models import Customer, CustomerSession
+from .models import Customer, CustomerSession, ExpiryReminder
+from routers.services.outbox import enqueue_commands
 
 
 @admin.register(Customer)
@@ -41,13 +42,31 @@ class CustomerAdmin(admin.ModelAdmin):
     
     actions = ['enable_customers', 'disable_customers']
     
+    def _set_router_disabled(self, request, queryset, disabled):
+        """
+        Queue enable/disable for the routers, one batch per router.
+        
+        Returns the ids of the selected customers.
+        """
+        by_router = {}
+        for customer in queryset.select_related('router'):
+            by_router.setdefault(customer.router_id, (customer.router, {}))[1][customer.username] = customer.id
+        
+        changed_ids = []
+        for router, customers in by_router.values():
+            enqueue_commands(router, list(customers), 'DISABLE' if disabled else 'ENABLE', user=request.user)
+            changed_ids.extend(customers.values())
+        return changed_ids
+    
     def enable_customers(self, request, queryset):
-        count = queryset.update(is_active=True, status='ACTIVE')
+        changed_ids = self._set_router_disabled(request, queryset, disabled=False)
+        count = Customer.objects.filter(id__in=changed_ids).update(is_active=True, status='ACTIVE')
         self.message_user(request, f"{count} customers enabled successfully.")
     enable_customers.short_description = "Enable selected customers"
     
     def disable_customers(self, request, queryset):
-        count = queryset.update(is_active=False, status='DISABLED')
+        changed_ids = self._set_router_disabled(request, queryset, disabled=True)
+        count = Customer.objects.filter(id__in=changed_ids).update(is_active=False, status='DISABLED')
         self.message_user(request, f"{count} customers disabled successfully.")
     disable_customers.short_description = "Disable selected customers"
 
@@ -66,3 +85,14 @@ class CustomerSessionAdmin(admin.ModelAdmin):
     def has_add_permission(self, request):
         return False
 
+
+@admin.register(ExpiryReminder)
+class ExpiryReminderAdmin(admin.ModelAdmin):
+    list_display = ['customer', 'tier', 'expires_at', 'sent_at']
+    list_filter = ['tier', 'sent_at']
+    search_fields = ['customer__username']
+    readonly_fields = ['customer', 'tier', 'expires_at', 'sent_at']
+    date_hierarchy = 'sent_at'
+    
+    def has_add_permission(self, request):
+        return False
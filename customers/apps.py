@@ -5,3 +5,6 @@ class CustomersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'customers'
 
+    def ready(self):
+        from . import signals  # noqa: F401
+
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-17 14:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['expires_at'], name='customer_active_expiry_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.7 on 2026-10-17 14:45
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0002_customer_active_expiry_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExpiryReminder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tier', models.CharField(help_text='Reminder tier, e.g. "1 day"', max_length=20)),
+                ('expires_at', models.DateTimeField(help_text='Expiry the reminder was sent for')),
+                ('sent_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='expiry_reminders', to='customers.customer')),
+            ],
+            options={
+                'verbose_name': 'Expiry Reminder',
+                'verbose_name_plural': 'Expiry Reminders',
+                'ordering': ['-sent_at'],
+                'indexes': [models.Index(fields=['sent_at'], name='customers_e_sent_at_3c1f0a_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='expiryreminder',
+            constraint=models.UniqueConstraint(fields=('customer', 'tier', 'expires_at'), name='unique_expiry_reminder'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-17 15:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0003_expiry_reminder'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['-created_at', '-id'], name='customer_list_keyset_idx'),
+        ),
+    ]
@@ -72,6 +72,11 @@ class Customer(models.Model):
             models.Index(fields=['router', 'is_active']),
             models.Index(fields=['status', '-created_at']),
             models.Index(fields=['expires_at']),
+            # Keyset pagination of the customer list
+            models.Index(fields=['-created_at', '-id'], name='customer_list_keyset_idx'),
+            # Expiry sweep: only active customers are scanned
+            models.Index(fields=['expires_at'], name='customer_active_expiry_idx',
+                         condition=models.Q(is_active=True)),
         ]
     
     def __str__(self):
@@ -204,3 +209,27 @@ class CustomerSession(models.Model):
             return f"{total_mb / 1024:.2f} GB"
         return f"{total_mb:.2f} MB"
 
+
+
+class ExpiryReminder(models.Model):
+    """
+    Ledger of expiry reminders sent, so each tier fires once per customer per expiry.
+    """
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='expiry_reminders')
+    tier = models.CharField(max_length=20, help_text='Reminder tier, e.g. "1 day"')
+    expires_at = models.DateTimeField(help_text='Expiry the reminder was sent for')
+    sent_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        ordering = ['-sent_at']
+        verbose_name = 'Expiry Reminder'
+        verbose_name_plural = 'Expiry Reminders'
+        constraints = [
+            models.UniqueConstraint(fields=['customer', 'tier', 'expires_at'], name='unique_expiry_reminder'),
+        ]
+        indexes = [
+            models.Index(fields=['sent_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.customer.username} - {self.tier} before {self.expires_at}"
@@ -0,0 +1,141 @@
+"""
+Expiry reminders for customers, in tiers (e.g. 3 days, 1 day, 1 hour before).
+
+Each customer falls in the narrowest tier whose lead time covers its
+expiry, so a customer created 20 hours before expiry only gets the 1 day
+reminder, not 3 days and 1 day at once. The ExpiryReminder ledger records
+every reminder sent for a (customer, tier, expires_at); customers already
+in the ledger are excluded in the query itself, and renewing a customer
+(a new expires_at) makes the tiers fire again.
+
+Runs are serialised with a cache lock. Ledger rows are inserted with
+ignore_conflicts and notifications are created only for the rows this run
+actually inserted, in the same transaction, so overlapping or retried runs
+never notify twice. Customers are streamed with a chunked iterator and
+each chunk is written with a few set-based queries, so memory use is
+constant and the number of queries depends only on the number of
+reminders sent.
+"""
+import logging
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIERS = {'3 days': 3 * 86400, '1 day': 86400, '1 hour': 3600}
+
+LOCK_KEY = 'customers:reminders:lock'
+LOCK_TIMEOUT = 600
+
+# Customers per chunk streamed from the database and inserted at once
+CHUNK_SIZE = 2000
+
+
+def reminder_tiers() -> list:
+    """(tier, lead seconds) pairs from CUSTOMER_EXPIRY_REMINDER_TIERS, longest lead first."""
+    tiers = getattr(settings, 'CUSTOMER_EXPIRY_REMINDER_TIERS', DEFAULT_TIERS)
+    return sorted(tiers.items(), key=lambda item: -item[1])
+
+
+def _send_chunk(chunk: list, tier: str, now: datetime) -> int:
+    from core.models import Notification
+    from customers.models import ExpiryReminder
+
+    with transaction.atomic():
+        ExpiryReminder.objects.bulk_create([
+            ExpiryReminder(customer_id=customer['id'], tier=tier,
+                           expires_at=customer['expires_at'], sent_at=now)
+            for customer in chunk
+        ], ignore_conflicts=True)
+        # Rows another run inserted first were ignored; only this run's rows carry its sent_at
+        inserted = {
+            (customer_id, expires_at) for customer_id, expires_at in ExpiryReminder.objects.filter(
+                customer_id__in=[customer['id'] for customer in chunk], tier=tier, sent_at=now,
+            ).values_list('customer_id', 'expires_at')
+        }
+        chunk = [customer for customer in chunk if (customer['id'], customer['expires_at']) in inserted]
+        Notification.objects.bulk_create([
+            Notification(
+                user_id=customer['created_by_id'],
+                title='Customer Expiry Reminder',
+                message=f"Customer {customer['username']} will expire in {tier}.",
+                notification_type='WARNING',
+                link=f"/customers/{customer['id']}/",
+                created_at=now,
+            )
+            for customer in chunk
+        ])
+    return len(chunk)
+
+
+def send_reminders(now: Optional[datetime] = None) -> Dict[str, int]:
+    """
+    Send the expiry reminders that are due and not sent yet.
+
+    Returns:
+        Dict of tier -> reminders sent, or {'skipped': True} if another run
+        is in progress
+    """
+    token = uuid.uuid4().hex
+    if not cache.add(LOCK_KEY, token, timeout=LOCK_TIMEOUT):
+        logger.info("Expiry reminders already running, skipped")
+        return {'skipped': True}
+    try:
+        return _send_due_reminders(now or timezone.now())
+    finally:
+        # The lock may have timed out and been taken by another run
+        if cache.get(LOCK_KEY) == token:
+            cache.delete(LOCK_KEY)
+
+
+def _send_due_reminders(now: datetime) -> Dict[str, int]:
+    from customers.models import Customer, ExpiryReminder
+
+    tiers = reminder_tiers()
+    sent = {}
+    for index, (tier, lead) in enumerate(tiers):
+        # Window up to the next narrower tier, which takes over from there
+        narrower = tiers[index + 1][1] if index + 1 < len(tiers) else 0
+        customers = (
+            Customer.objects.filter(
+                is_active=True,
+                send_notifications=True,
+                created_by__isnull=False,
+                expires_at__gt=now + timedelta(seconds=narrower),
+                expires_at__lte=now + timedelta(seconds=lead),
+            )
+            .exclude(Exists(ExpiryReminder.objects.filter(
+                customer=OuterRef('pk'), tier=tier, expires_at=OuterRef('expires_at'),
+            )))
+            .order_by('expires_at')
+            .values('id', 'username', 'expires_at', 'created_by_id')
+        )
+
+        count = 0
+        chunk = []
+        for customer in customers.iterator(chunk_size=CHUNK_SIZE):
+            chunk.append(customer)
+            if len(chunk) >= CHUNK_SIZE:
+                count += _send_chunk(chunk, tier, now)
+                chunk = []
+        if chunk:
+            count += _send_chunk(chunk, tier, now)
+        sent[tier] = count
+
+    logger.info(f"Expiry reminders sent: {sent}")
+    return sent
+
+
+def purge_reminders(before: datetime) -> int:
+    """Delete ledger entries sent before a date; returns the number deleted."""
+    from customers.models import ExpiryReminder
+
+    deleted, _ = ExpiryReminder.objects.filter(sent_at__lt=before).delete()
+    return deleted
@@ -0,0 +1,16 @@
+"""
+Signal handlers for customer models.
+"""
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from routers.services.reconciler import mark_router_dirty
+from .models import Customer
+
+
+@receiver(post_save, sender=Customer)
+@receiver(post_delete, sender=Customer)
+def mark_customer_router_dirty(sender, instance, **kwargs):
+    """Queue the customer's router for the next reconciliation run."""
+    if instance.router_id:
+        mark_router_dirty(instance.router_id)
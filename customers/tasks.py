@@ -3,10 +3,6 @@ Celery tasks for customer management.
 """
 from celery import shared_task
 from django.utils import timezone
-from django.db.models import Q
-from .models import Customer
-from routers.services.mikrotik_api import MikroTikAPIService
-from core.models import Notification
 import logging
 
 logger = logging.getLogger(__name__)
@@ -16,92 +12,57 @@ logger = logging.getLogger(__name__)
 def check_expired_users():
     """
     Check for expired customer accounts and disable them.
-    Runs daily via Celery beat.
+    Runs every CUSTOMER_EXPIRY_SWEEP_INTERVAL seconds via Celery beat.
+    Customers are grouped by router and disabled over one session per
+    router, with routers handled in parallel.
     """
-    now = timezone.now()
-    expired_customers = Customer.objects.filter(
-        is_active=True,
-        expires_at__lte=now
-    )
-    
-    disabled_count = 0
-    
-    for customer in expired_customers:
-        # Disable on router
-        api_service = MikroTikAPIService(customer.router)
-        success, message = api_service.disable_ppp_secret(customer.username)
-        
-        if success:
-            customer.status = 'EXPIRED'
-            customer.is_active = False
-            customer.save()
-            
-            # Send notification
-            if customer.send_notifications:
-                Notification.objects.create(
-                    user=customer.created_by if customer.created_by else None,
-                    title='Customer Account Expired',
-                    message=f"Customer {customer.username} ({customer.full_name}) has expired.",
-                    notification_type='WARNING',
-                    link=f'/customers/{customer.id}/'
-                )
-            
-            disabled_count += 1
-            logger.info(f"Disabled expired customer: {customer.username}")
-        else:
-            logger.error(f"Failed to disable customer {customer.username}: {message}")
+    from routers.services.expiry import expire_customers
     
-    logger.info(f"Checked expired users: {disabled_count} disabled")
-    return {'disabled_count': disabled_count}
+    result = expire_customers()
+    if result.get('remaining'):
+        # Backlog (e.g. after downtime): continue without waiting for the next sweep
+        check_expired_users.delay()
+    return result
 
 
 @shared_task
 def send_expiry_reminders():
     """
     Send reminders to customers whose accounts are about to expire.
-    Sends 3 days, 1 day, and 1 hour before expiry.
+    Tiers come from CUSTOMER_EXPIRY_REMINDER_TIERS (3 days, 1 day and
+    1 hour before expiry by default); each fires once per customer per expiry.
     """
     from datetime import timedelta
+    from django.conf import settings
+    from .reminders import purge_reminders, send_reminders
     
     now = timezone.now()
-    
-    # Get customers expiring in 3 days
-    three_days = now + timedelta(days=3)
-    customers_3_days = Customer.objects.filter(
-        is_active=True,
-        expires_at__gte=now,
-        expires_at__lte=three_days,
-        send_notifications=True
-    )
-    
-    for customer in customers_3_days:
-        Notification.objects.create(
-            user=customer.created_by if customer.created_by else None,
-            title='Customer Expiry Reminder',
-            message=f"Customer {customer.username} will expire in 3 days.",
-            notification_type='WARNING',
-            link=f'/customers/{customer.id}/'
-        )
-    
-    logger.info(f"Sent {customers_3_days.count()} expiry reminders (3 days)")
-    return {'reminders_sent': customers_3_days.count()}
+    sent = send_reminders(now)
+    retention = getattr(settings, 'CUSTOMER_EXPIRY_REMINDER_RETENTION_DAYS', 30)
+    purged = purge_reminders(now - timedelta(days=retention))
+    return {'reminders_sent': sent, 'purged': purged}
 
 
 @shared_task
-def sync_customer_data_usage(customer_id):
+def auto_renew_customers():
     """
-    Sync customer data usage from router.
+    Renew auto-renewal customers from their account balance shortly before expiry.
+    Runs every few minutes via Celery beat; one bulk renewal per profile.
+    """
+    from payments.renewals import renew_customers
     
-    Args:
-        customer_id: UUID of the customer
+    return renew_customers()
+
+
+@shared_task
+def sync_customer_data_usage():
+    """
+    Sync data usage of all customers from the routers' PPP interface counters.
+    Runs every few minutes via Celery beat; one bulk read per router.
     """
-    try:
-        customer = Customer.objects.get(id=customer_id)
-        # This would fetch data usage from MikroTik accounting
-        # For now, it's a placeholder
-        logger.info(f"Synced data usage for customer: {customer.username}")
-        return {'customer': customer.username, 'status': 'synced'}
-    except Customer.DoesNotExist:
-        logger.error(f"Customer {customer_id} not found")
-        return {'error': 'Customer not found'}
+    from routers.models import Router
+    from routers.services.data_usage import collect_usage
+    
+    routers = Router.objects.filter(is_active=True, status='ONLINE')
+    return collect_usage(routers)
 
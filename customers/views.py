@@ -1,6 +1,14 @@
 """
 Views for customer management.
 """
+import base64
+import hashlib
+import uuid
+from datetime import datetime
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
@@ -10,14 +18,35 @@ from django.views.decorators.http import require_POST
 
 from .models import Customer, CustomerSession
 from .forms import CustomerForm, CustomerQuickEditForm, CustomerExtendForm
-from routers.services.mikrotik_api import MikroTikAPIService
+from routers.services.outbox import enqueue_command
 from core.models import ActivityLog, Notification
 
 
+def _encode_cursor(customer):
+    """Opaque page cursor for the (created_at, id) position of a customer."""
+    value = f"{customer.created_at.isoformat()}|{customer.id}"
+    return base64.urlsafe_b64encode(value.encode()).decode().rstrip('=')
+
+
+def _decode_cursor(cursor):
+    """(created_at, id) from a page cursor, or None if it is invalid."""
+    try:
+        value = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, customer_id = value.split('|')
+        return datetime.fromisoformat(created_at), uuid.UUID(customer_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
 @login_required
 def customer_list(request):
-    """List all customers with filtering."""
-    customers = Customer.objects.select_related('router', 'profile').all()
+    """
+    List customers with filtering, newest first.
+    
+    Pages are keyset based (?after= / ?before= cursors on created_at, id),
+    so every page costs the same regardless of how deep it is.
+    """
+    customers = Customer.objects.all()
     
     # Apply filters
     status_filter = request.GET.get('status')
@@ -37,19 +66,61 @@ def customer_list(request):
             Q(phone_number__icontains=search_query)
         )
     
-    # Get statistics
-    total_customers = customers.count()
-    active_customers = customers.filter(is_active=True).count()
-    expired_customers = customers.filter(status='EXPIRED').count()
+    # Get statistics: one conditional aggregate, briefly cached per filter set
+    filters = urlencode({key: value for key, value in (
+        ('status', status_filter), ('router', router_filter), ('search', search_query),
+    ) if value})
+    counts_key = f"customers:list:counts:{hashlib.md5(filters.encode()).hexdigest()}"
+    counts = cache.get(counts_key)
+    if counts is None:
+        counts = customers.aggregate(
+            total=Count('id'),
+            active=Count('id', filter=Q(is_active=True)),
+            expired=Count('id', filter=Q(status='EXPIRED')),
+        )
+        cache.set(counts_key, counts, timeout=getattr(settings, 'CUSTOMER_LIST_COUNT_TTL', 30))
+    
+    # Only the columns the list renders
+    page_size = getattr(settings, 'CUSTOMER_LIST_PAGE_SIZE', 50)
+    page = customers.select_related('router', 'profile').only(
+        'id', 'username', 'full_name', 'status', 'expires_at', 'created_at',
+        'router__name', 'profile__name',
+    )
+    after = _decode_cursor(request.GET.get('after', ''))
+    before = _decode_cursor(request.GET.get('before', ''))
+    if before:
+        created_at, customer_id = before
+        page = page.filter(
+            Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=customer_id)
+        ).order_by('created_at', 'id')
+    else:
+        if after:
+            created_at, customer_id = after
+            page = page.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=customer_id)
+            )
+        page = page.order_by('-created_at', '-id')
+    
+    rows = list(page[:page_size + 1])
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if before:
+        rows.reverse()
+        has_next, has_previous = True, has_more
+    else:
+        has_next, has_previous = has_more, bool(after)
     
     context = {
-        'customers': customers,
-        'total_customers': total_customers,
-        'active_customers': active_customers,
-        'expired_customers': expired_customers,
+        'customers': rows,
+        'total_customers': counts['total'],
+        'active_customers': counts['active'],
+        'expired_customers': counts['expired'],
         'status_filter': status_filter,
         'router_filter': router_filter,
         'search_query': search_query,
+        'filter_query': filters,
+        'next_cursor': _encode_cursor(rows[-1]) if rows and has_next else None,
+        'previous_cursor': _encode_cursor(rows[0]) if rows and has_previous else None,
     }
     
     return render(request, 'customers/customer_list.html', context)
@@ -65,21 +136,17 @@ def customer_create(request):
             customer.created_by = request.user
             customer.save()
             
-            # Create user on router via API
-            api_service = MikroTikAPIService(customer.router)
-            success, message = api_service.create_ppp_secret(
-                username=customer.username,
-                password=customer.password,
-                profile=customer.profile.get_mikrotik_profile_name()
+            # Queue creation on the router; applied even if it is offline right now
+            enqueue_command(
+                customer.router, customer.username, 'CREATE',
+                {
+                    'password': customer.password,
+                    'profile': customer.profile.get_mikrotik_profile_name(),
+                    'disabled': 'no' if customer.is_active else 'yes',
+                },
+                user=request.user,
             )
-            
-            if success:
-                messages.success(request, f"Customer '{customer.username}' created successfully on router!")
-            else:
-                messages.warning(
-                    request,
-                    f"Customer created in database but failed to create on router: {message}"
-                )
+            messages.success(request, f"Customer '{customer.username}' created. The router will be updated shortly.")
             
             # Log activity
             ActivityLog.objects.create(
@@ -129,18 +196,36 @@ def customer_edit(request, customer_id):
     customer = get_object_or_404(Customer, id=customer_id)
     
     if request.method == 'POST':
+        # Captured before validation, which writes the form data onto the instance
+        old_router = customer.router
+        old_username = customer.username
+        old_password = customer.password
+        old_profile_id = customer.profile_id
+        
         form = CustomerForm(request.POST, instance=customer)
         if form.is_valid():
-            old_profile = customer.profile
             customer = form.save()
+            secret = {
+                'password': customer.password,
+                'profile': customer.profile.get_mikrotik_profile_name(),
+            }
             
-            # If profile changed, update on router
-            if old_profile != customer.profile:
-                api_service = MikroTikAPIService(customer.router)
-                api_service.update_ppp_secret(
-                    username=customer.username,
-                    profile=customer.profile.get_mikrotik_profile_name()
+            if old_router.id != customer.router_id or old_username != customer.username:
+                # Move the secret to the new router / name
+                enqueue_command(old_router, old_username, 'DELETE', user=request.user)
+                enqueue_command(
+                    customer.router, customer.username, 'CREATE',
+                    {**secret, 'disabled': 'no' if customer.is_active else 'yes'},
+                    user=request.user,
                 )
+            else:
+                changed = {}
+                if old_password != customer.password:
+                    changed['password'] = secret['password']
+                if old_profile_id != customer.profile_id:
+                    changed['profile'] = secret['profile']
+                if changed:
+                    enqueue_command(customer.router, customer.username, 'UPDATE', changed, user=request.user)
             
             # Log activity
             ActivityLog.objects.create(
@@ -172,9 +257,8 @@ def customer_delete(request, customer_id):
     customer = get_object_or_404(Customer, id=customer_id)
     customer_username = customer.username
     
-    # Delete from router
-    api_service = MikroTikAPIService(customer.router)
-    api_service.delete_ppp_secret(customer.username)
+    # Queue deletion from router
+    enqueue_command(customer.router, customer.username, 'DELETE', user=request.user)
     
     # Log activity before deletion
     ActivityLog.objects.create(
@@ -197,26 +281,22 @@ def customer_enable(request, customer_id):
     """Enable a customer account."""
     customer = get_object_or_404(Customer, id=customer_id)
     
-    # Enable on router
-    api_service = MikroTikAPIService(customer.router)
-    success, message = api_service.enable_ppp_secret(customer.username)
+    customer.is_active = True
+    customer.status = 'ACTIVE'
+    customer.save()
     
-    if success:
-        customer.is_active = True
-        customer.status = 'ACTIVE'
-        customer.save()
-        
-        ActivityLog.objects.create(
-            user=request.user,
-            action='ENABLE',
-            model_name='Customer',
-            description=f"Enabled customer: {customer.username}",
-            ip_address=request.META.get('REMOTE_ADDR'),
-        )
-        
-        messages.success(request, f"Customer '{customer.username}' enabled successfully!")
-    else:
-        messages.error(request, f"Failed to enable customer: {message}")
+    # Queue enable on router
+    enqueue_command(customer.router, customer.username, 'ENABLE', user=request.user)
+    
+    ActivityLog.objects.create(
+        user=request.user,
+        action='ENABLE',
+        model_name='Customer',
+        description=f"Enabled customer: {customer.username}",
+        ip_address=request.META.get('REMOTE_ADDR'),
+    )
+    
+    messages.success(request, f"Customer '{customer.username}' enabled successfully!")
     
     return redirect('customers:customer_detail', customer_id=customer.id)
 
@@ -227,24 +307,20 @@ def customer_disable(request, customer_id):
     """Disable a customer account."""
     customer = get_object_or_404(Customer, id=customer_id)
     
-    # Disable on router
-    api_service = MikroTikAPIService(customer.router)
-    success, message = api_service.disable_ppp_secret(customer.username)
+    customer.disable()
     
-    if success:
-        customer.disable()
-        
-        ActivityLog.objects.create(
-            user=request.user,
-            action='DISABLE',
-            model_name='Customer',
-            description=f"Disabled customer: {customer.username}",
-            ip_address=request.META.get('REMOTE_ADDR'),
-        )
-        
-        messages.success(request, f"Customer '{customer.username}' disabled successfully!")
-    else:
-        messages.error(request, f"Failed to disable customer: {message}")
+    # Queue disable on router
+    enqueue_command(customer.router, customer.username, 'DISABLE', user=request.user)
+    
+    ActivityLog.objects.create(
+        user=request.user,
+        action='DISABLE',
+        model_name='Customer',
+        description=f"Disabled customer: {customer.username}",
+        ip_address=request.META.get('REMOTE_ADDR'),
+    )
+    
+    messages.success(request, f"Customer '{customer.username}' disabled successfully!")
     
     return redirect('customers:customer_detail', customer_id=customer.id)
 
@@ -258,6 +334,7 @@ def customer_extend(request, customer_id):
         form = CustomerExtendForm(request.POST)
         if form.is_valid():
             extend_option = form.cleaned_data['extend_option']
+            was_active = customer.is_active
             
             if extend_option == 'custom':
                 days = form.cleaned_data['custom_days']
@@ -266,9 +343,8 @@ def customer_extend(request, customer_id):
                 customer.extend_subscription()
             
             # Enable if disabled
-            if not customer.is_active:
-                api_service = MikroTikAPIService(customer.router)
-                api_service.enable_ppp_secret(customer.username)
+            if not was_active:
+                enqueue_command(customer.router, customer.username, 'ENABLE', user=request.user)
             
             ActivityLog.objects.create(
                 user=request.user,
@@ -311,27 +387,23 @@ def customer_sessions(request, customer_id):
 @login_required
 def active_sessions_view(request):
     """View all currently active sessions."""
-    # Get all active routers
+    # Live tables from the session listener, other online routers queried concurrently
     from routers.models import Router
+    from routers.services.session_listener import iter_active_sessions
     routers = Router.objects.filter(is_active=True, status='ONLINE')
     
     all_active_sessions = []
     
-    for router in routers:
-        api_service = MikroTikAPIService(router)
-        success, connections = api_service.get_active_connections()
-        
-        if success:
-            for conn in connections:
-                # Try to match with customer
-                try:
-                    customer = Customer.objects.get(username=conn['name'], router=router)
-                    conn['customer'] = customer
-                except Customer.DoesNotExist:
-                    conn['customer'] = None
-                
-                conn['router'] = router
-                all_active_sessions.append(conn)
+    for router, connections in iter_active_sessions(routers):
+        # Match sessions to customers with one query per router
+        customers = Customer.objects.in_bulk(
+            [conn['name'] for conn in connections], field_name='username'
+        )
+        for conn in connections:
+            customer = customers.get(conn['name'])
+            conn['customer'] = customer if customer and customer.router_id == router.id else None
+            conn['router'] = router
+            all_active_sessions.append(conn)
     
     context = {
         'active_sessions': all_active_sessions,
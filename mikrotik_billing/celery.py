@@ -9,6 +9,8 @@ from celery.schedules import crontab
 # Set the default Django settings module
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mikrotik_billing.settings')
 
+from django.conf import settings  # noqa: E402
+
 app = Celery('mikrotik_billing')
 
 # Load config from Django settings with CELERY namespace
@@ -19,13 +21,52 @@ app.autodiscover_tasks()
 
 # Periodic tasks
 app.conf.beat_schedule = {
-    'check-router-status-every-5-minutes': {
-        'task': 'routers.tasks.check_all_routers_status',
-        'schedule': crontab(minute='*/5'),  # Every 5 minutes
+    'schedule-router-probes': {
+        'task': 'routers.tasks.schedule_router_probes',
+        # Probes are spread over the tick by PollScheduler
+        'schedule': float(getattr(settings, 'ROUTER_POLL_TICK', 60)),
+    },
+    'flush-router-status-every-5-minutes': {
+        'task': 'routers.tasks.flush_router_status',
+        'schedule': crontab(minute='*/5'),  # Write-behind of last_checked/last_online
+    },
+    'replay-router-commands-every-2-minutes': {
+        'task': 'routers.tasks.replay_all_pending_commands',
+        'schedule': crontab(minute='*/2'),  # Retry changes queued for offline routers
+    },
+    'account-customer-sessions-every-2-minutes': {
+        'task': 'routers.tasks.account_customer_sessions',
+        'schedule': crontab(minute='*/2'),  # Open/close customer sessions
+    },
+    'sync-customer-data-usage-every-5-minutes': {
+        'task': 'customers.tasks.sync_customer_data_usage',
+        'schedule': crontab(minute='*/5'),  # Interface byte counters, whole fleet
+    },
+    'rollup-router-health-hourly': {
+        'task': 'routers.tasks.rollup_router_health',
+        'schedule': crontab(minute=5),  # Hour/day health buckets and retention
+    },
+    'reconcile-changed-routers-every-5-minutes': {
+        'task': 'routers.tasks.reconcile_all_routers',
+        'schedule': crontab(minute='*/5'),  # Routers with changed customers
+    },
+    'reconcile-all-routers-nightly': {
+        'task': 'routers.tasks.reconcile_all_routers',
+        'schedule': crontab(hour=2, minute=30),  # Full sweep, catches edits made on the routers
+        'kwargs': {'only_dirty': False},
+    },
+    'send-expiry-reminders-every-5-minutes': {
+        'task': 'customers.tasks.send_expiry_reminders',
+        'schedule': crontab(minute='*/5'),  # Tiered reminders, each sent once per expiry
+    },
+    'auto-renew-customers-every-5-minutes': {
+        'task': 'customers.tasks.auto_renew_customers',
+        'schedule': crontab(minute='*/5'),  # Within CUSTOMER_AUTO_RENEWAL_LEAD of expiry
     },
-    'check-expired-users-daily': {
+    'check-expired-users': {
         'task': 'customers.tasks.check_expired_users',
-        'schedule': crontab(hour=0, minute=0),  # Daily at midnight
+        # Disables customers within a minute of expiry
+        'schedule': float(getattr(settings, 'CUSTOMER_EXPIRY_SWEEP_INTERVAL', 30)),
     },
     'generate-daily-reports': {
         'task': 'reports.tasks.generate_daily_report',
@@ -146,6 +146,34 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 
+# Cache Configuration
+# Router circuit breakers, rate limiters, locks and other shared router state
+# live in the cache, so every web and Celery process must see the same cache.
+# Use Redis (CACHE_URL) in production; `manage.py check` warns without it.
+# The file cache fallback is only shared between processes on this host, and
+# its add() is not atomic, so locks can occasionally be taken twice. It is
+# sized so that router state is not culled on large fleets.
+CACHE_URL = config('CACHE_URL', default='')
+if CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': config('CACHE_DIR', default=str(BASE_DIR / '.cache')),
+            'OPTIONS': {
+                # Several keys per router (breaker, limiter, poll state, status, locks);
+                # the default of 300 would start evicting them at a few dozen routers
+                'MAX_ENTRIES': config('CACHE_MAX_ENTRIES', default=200000, cast=int),
+            },
+        }
+    }
+
 # Email Configuration
 EMAIL_BACKEND = config('EMAIL_BACKEND', default='django.core.mail.backends.console.EmailBackend')
 EMAIL_HOST = config('EMAIL_HOST', default='smtp.gmail.com')
@@ -171,7 +199,52 @@ if not DEBUG:
 # Custom Settings
 MIKROTIK_API_PORT = 8728
 MIKROTIK_API_TIMEOUT = 10
+MIKROTIK_POOL_MAX_CONNECTIONS = 2  # Pooled API sessions per router and process
+MIKROTIK_POOL_IDLE_TIMEOUT = 300  # Close pooled sessions idle for this many seconds
+MIKROTIK_POOL_HEALTH_CHECK_INTERVAL = 30  # Ping sessions idle longer than this before reuse
+MIKROTIK_FANOUT_CONCURRENCY = 100  # Routers queried in parallel by fleet-wide sweeps
+ROUTER_BREAKER_FAILURE_THRESHOLD = 3  # Consecutive connect failures before a router is skipped
+ROUTER_BREAKER_COOLDOWN = 30  # Seconds before the first half-open probe
+ROUTER_BREAKER_MAX_COOLDOWN = 600  # Cap for the doubling cooldown of a router that stays down
+# API sessions per second, burst and concurrent sessions per router, by router model (board name prefix)
+ROUTER_RATE_LIMITS = {
+    'default': {'rate': 20, 'burst': 10, 'concurrency': 4},
+    'hAP': {'rate': 5, 'burst': 5, 'concurrency': 2},
+    'hEX': {'rate': 5, 'burst': 5, 'concurrency': 2},
+}
+ROUTER_RATE_LIMIT_TIMEOUT = 30  # Seconds a caller may wait in a router's rate limiter
+ROUTER_RATE_LIMIT_SLOT_LEASE = 600  # Seconds before a concurrency slot of a dead process is freed
+ROUTER_RECONCILE_PRUNE = False  # Let reconciliation delete router secrets that have no customer
+ROUTER_FTP_PORT = 21  # FTP service used to upload import scripts to the routers
+ROUTER_SCRIPT_IMPORT_TIMEOUT = 600  # Seconds to wait for a bulk secrets import to finish
+ROUTER_OUTBOX_RETENTION_DAYS = 7  # Keep processed router commands this long
+# Days router health is kept per resolution (samples are rolled up minute -> hour -> day)
+ROUTER_HEALTH_RETENTION_DAYS = {'MINUTE': 2, 'HOUR': 90, 'DAY': 1825}
+ROUTER_SESSION_LISTENER_KEEPALIVE = 30  # Idle seconds before the session listener probes a router
+ROUTER_SESSION_LISTENER_MAX_BACKOFF = 300  # Cap for the session listener's reconnect delay
+ROUTER_LOG_BUFFER_SIZE = 200  # Router log entries buffered before a bulk insert
+ROUTER_LOG_FLUSH_INTERVAL = 5  # Seconds before buffered router logs are written anyway
+# Keep 1 in N router log entries, keyed by log type or 'TYPE:action' (most specific wins)
+ROUTER_LOG_SAMPLING = {
+    'INFO:Connection established': 10,
+}
 ROUTER_CHECK_INTERVAL = 300  # Check router status every 5 minutes
+ROUTER_STATUS_CACHE_TTL = 15  # Seconds a status check is reused by the router status views
+ROUTER_POLL_MIN_INTERVAL = 60  # Probe interval of failing or flapping routers
+ROUTER_POLL_MAX_INTERVAL = 900  # Probe interval of routers that have been stable for a while
+ROUTER_POLL_JITTER = 0.1  # Random +/- fraction added to each probe interval
+ROUTER_POLL_TICK = 60  # Seconds between runs of the probe scheduler
+ROUTER_PROBE_SHARD_SIZE = 100  # Routers probed concurrently by one status check task
+ROUTER_PROBE_SLOT_SECONDS = 5  # Routers due within this many seconds are probed together
+CUSTOMER_EXPIRY_SWEEP_INTERVAL = 30  # Seconds between expiry sweeps
+CUSTOMER_EXPIRY_BATCH_SIZE = 5000  # Customers expired per sweep; the rest wait for the next one
+# Expiry reminder tiers: name (used in the message) -> seconds before expiry
+CUSTOMER_EXPIRY_REMINDER_TIERS = {'3 days': 3 * 86400, '1 day': 86400, '1 hour': 3600}
+CUSTOMER_EXPIRY_REMINDER_RETENTION_DAYS = 30  # Keep the sent-reminder ledger this long
+CUSTOMER_AUTO_RENEWAL_LEAD = 3600  # Seconds before expiry auto-renewal customers are renewed
+CUSTOMER_AUTO_RENEWAL_GRACE = 86400  # Seconds after expiry a lapsed customer is still renewed
+CUSTOMER_LIST_PAGE_SIZE = 50  # Customers per page of the customer list
+CUSTOMER_LIST_COUNT_TTL = 30  # Seconds the customer list counts are reused
 
 # Payment Gateway Settings
 MPESA_CONSUMER_KEY = config('MPESA_CONSUMER_KEY', default='')
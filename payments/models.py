@@ -102,10 +102,10 @@ class Payment(models.Model):
         self.customer.total_paid += self.amount
         self.customer.save()
         
-        # Enable on router if disabled
-        from routers.services.mikrotik_api import MikroTikAPIService
-        api_service = MikroTikAPIService(self.customer.router)
-        api_service.enable_ppp_secret(self.customer.username)
+        # Enable on router if disabled; queued so a payment made while the
+        # router is offline still gets applied when it comes back
+        from routers.services.outbox import enqueue_command
+        enqueue_command(self.customer.router, self.customer.username, 'ENABLE')
     
     def mark_failed(self, reason=''):
         """Mark payment as failed."""
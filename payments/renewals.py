@@ -0,0 +1,135 @@
+"""
+Auto-renewal of customers from their account balance.
+
+Customers with ``auto_renewal`` set are renewed shortly before they
+expire when their ``outstanding_balance`` (credit held on the account)
+covers the profile price. Customers whose account the expiry sweep has
+just closed (status EXPIRED within CUSTOMER_AUTO_RENEWAL_GRACE) are
+renewed as well, e.g. after topping up their balance.
+
+Renewals are set-based, one profile at a time: the due customers are
+locked, debited and extended with one UPDATE for active customers and
+one for lapsed ones, and their Payment rows are written with a single
+bulk_create. Only lapsed customers need a router change; they are
+re-enabled through the outbox with one batch per router. Active
+customers keep their secret as it is.
+"""
+import logging
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from routers.services.outbox import ENABLE, enqueue_commands
+
+logger = logging.getLogger(__name__)
+
+
+def renewal_period(profile) -> timedelta:
+    """Duration added by one renewal (months count as 30 days, as in extend_subscription())."""
+    days = {'HOURS': 1 / 24, 'DAYS': 1, 'WEEKS': 7, 'MONTHS': 30}.get(profile.duration_unit, 1)
+    return timedelta(days=profile.duration_value * days)
+
+
+def _renew_profile(profile, now: datetime, lead: timedelta, grace: timedelta) -> Dict[str, int]:
+    from customers.models import Customer
+    from payments.models import Payment
+
+    period = renewal_period(profile)
+    # A renewal must move the expiry out of the window, or short plans renew twice
+    lead = min(lead, period / 2)
+
+    with transaction.atomic():
+        due = list(
+            Customer.objects.select_for_update(skip_locked=True)
+            .filter(profile=profile, auto_renewal=True, outstanding_balance__gte=profile.price)
+            .filter(
+                Q(is_active=True, expires_at__lte=now + lead)
+                | Q(is_active=False, status='EXPIRED', expires_at__gt=now - grace)
+            )
+            .values('id', 'username', 'router_id', 'is_active')
+        )
+        if not due:
+            return {'renewed': 0, 'enabled': 0}
+
+        active_ids = [customer['id'] for customer in due if customer['is_active']]
+        lapsed = [customer for customer in due if not customer['is_active']]
+        debit = {
+            'outstanding_balance': F('outstanding_balance') - profile.price,
+            'total_paid': F('total_paid') + profile.price,
+            'last_payment_date': now,
+        }
+        if active_ids:
+            Customer.objects.filter(id__in=active_ids).update(
+                expires_at=F('expires_at') + period, **debit,
+            )
+        if lapsed:
+            Customer.objects.filter(id__in=[customer['id'] for customer in lapsed]).update(
+                expires_at=now + period, activated_at=now, is_active=True, status='ACTIVE', **debit,
+            )
+
+        Payment.objects.bulk_create([
+            Payment(
+                customer_id=customer['id'],
+                profile=profile,
+                amount=profile.price,
+                currency=profile.currency,
+                payment_method='OTHER',
+                status='COMPLETED',
+                transaction_id=f"RENEW-{uuid.uuid4().hex[:16].upper()}",
+                created_at=now,
+                completed_at=now,
+                notes='Auto-renewal from account balance',
+            )
+            for customer in due
+        ], batch_size=1000)
+
+        by_router = defaultdict(list)
+        for customer in lapsed:
+            by_router[customer['router_id']].append(customer['username'])
+        if by_router:
+            from routers.models import Router
+
+            for router in Router.objects.filter(id__in=list(by_router)):
+                enqueue_commands(router, by_router[router.id], ENABLE)
+
+    return {'renewed': len(due), 'enabled': len(lapsed)}
+
+
+def renew_customers(now: Optional[datetime] = None) -> Dict:
+    """
+    Renew every auto-renewal customer that is due and can pay from its balance.
+
+    Returns:
+        Dict with renewed and enabled (lapsed customers re-enabled) counts
+        and the number of profiles processed
+    """
+    from customers.models import Customer
+    from profiles.models import Profile
+
+    now = now or timezone.now()
+    lead = timedelta(seconds=getattr(settings, 'CUSTOMER_AUTO_RENEWAL_LEAD', 3600))
+    grace = timedelta(seconds=getattr(settings, 'CUSTOMER_AUTO_RENEWAL_GRACE', 86400))
+
+    profile_ids = (
+        Customer.objects.filter(auto_renewal=True, outstanding_balance__gt=0)
+        .filter(
+            Q(is_active=True, expires_at__lte=now + lead)
+            | Q(is_active=False, status='EXPIRED', expires_at__gt=now - grace)
+        )
+        .order_by().values_list('profile_id', flat=True).distinct()
+    )
+    totals = {'renewed': 0, 'enabled': 0, 'profiles': 0}
+    for profile in Profile.objects.filter(id__in=list(profile_ids)):
+        result = _renew_profile(profile, now, lead, grace)
+        totals['renewed'] += result['renewed']
+        totals['enabled'] += result['enabled']
+        totals['profiles'] += 1
+
+    logger.info(f"Auto-renewal: {totals}")
+    return totals
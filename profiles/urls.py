@@ -12,5 +12,7 @@ urlpatterns = [
     path('<uuid:profile_id>/', views.profile_detail, name='profile_detail'),
     path('<uuid:profile_id>/edit/', views.profile_edit, name='profile_edit'),
     path('<uuid:profile_id>/delete/', views.profile_delete, name='profile_delete'),
+    path('<uuid:profile_id>/rollout/', views.profile_rollout, name='profile_rollout'),
+    path('rollouts/<str:rollout_id>/', views.profile_rollout_status, name='profile_rollout_status'),
 ]
 
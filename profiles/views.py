@@ -2,13 +2,31 @@
 Views for profile management.
 """
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.http import JsonResponse, Http404
+from django.views.decorators.http import require_POST
 from django.db.models import Count
 
 from .models import Profile
 from .forms import ProfileForm
 from core.models import ActivityLog
+from routers.services.profile_rollout import get_rollout, new_rollout_id
+from routers.services.reconciler import mark_router_dirty
+
+# Profile fields that end up in the routers' /ppp/profile table
+ROUTER_FIELDS = {'name', 'download_speed', 'upload_speed', 'rate_limit', 'is_active'}
+
+
+def _start_rollout(request, profile):
+    """Queue a rollout of a profile to every active router and tell the user."""
+    from routers.tasks import rollout_ppp_profiles
+    
+    rollout_id = new_rollout_id()
+    rollout_ppp_profiles.delay([str(profile.id)], rollout_id=rollout_id)
+    progress_url = reverse('profiles:profile_rollout_status', args=[rollout_id])
+    messages.info(request, f"Pushing profile '{profile.name}' to all active routers. Progress: {progress_url}")
 
 
 @login_required
@@ -47,6 +65,8 @@ def profile_create(request):
             )
             
             messages.success(request, f"Profile '{profile.name}' created successfully!")
+            if profile.is_active:
+                _start_rollout(request, profile)
             return redirect('profiles:profile_list')
     else:
         form = ProfileForm()
@@ -98,6 +118,13 @@ def profile_edit(request, profile_id):
             )
             
             messages.success(request, f"Profile '{profile.name}' updated successfully!")
+            if profile.is_active and ROUTER_FIELDS.intersection(form.changed_data):
+                _start_rollout(request, profile)
+            if 'name' in form.changed_data:
+                # A rename adds a new /ppp/profile; the reconciler moves the existing secrets to it
+                router_ids = profile.customer.order_by().values_list('router_id', flat=True).distinct()
+                for router_id in router_ids:
+                    mark_router_dirty(router_id)
             return redirect('profiles:profile_detail', profile_id=profile.id)
     else:
         form = ProfileForm(instance=profile)
@@ -111,6 +138,24 @@ def profile_edit(request, profile_id):
     return render(request, 'profiles/profile_form.html', context)
 
 
+@login_required
+@require_POST
+def profile_rollout(request, profile_id):
+    """Push a profile to every active router."""
+    profile = get_object_or_404(Profile, id=profile_id, is_active=True)
+    _start_rollout(request, profile)
+    return redirect('profiles:profile_detail', profile_id=profile.id)
+
+
+@login_required
+def profile_rollout_status(request, rollout_id):
+    """AJAX endpoint with the per-router progress of a profile rollout."""
+    progress = get_rollout(rollout_id)
+    if progress is None:
+        raise Http404("Unknown rollout")
+    return JsonResponse(progress)
+
+
 @login_required
 def profile_delete(request, profile_id):
     """Delete a profile."""
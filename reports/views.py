@@ -12,6 +12,7 @@ from .models import Report
 from customers.models import Customer, CustomerSession
 from payments.models import Payment
 from routers.models import Router
+from routers.services.status_store import overlay as overlay_router_status
 from profiles.models import Profile
 from vouchers.models import Voucher
 
@@ -203,7 +204,7 @@ def router_report(request):
     ).all()
     
     context = {
-        'routers': routers,
+        'routers': overlay_router_status(routers),
     }
     
     return render(request, 'reports/router_report.html', context)
@@ -2,7 +2,7 @@
 Admin configuration for routers app.
 """
 from django.contrib import admin
-from .models import Router, RouterLog
+from .models import Router, RouterLog, RouterCommand
 
 
 @admin.register(Router)
@@ -54,3 +54,15 @@ class RouterLogAdmin(admin.ModelAdmin):
     def has_change_permission(self, request, obj=None):
         return False
 
+
+@admin.register(RouterCommand)
+class RouterCommandAdmin(admin.ModelAdmin):
+    list_display = ['router', 'username', 'action', 'status', 'attempts', 'created_at', 'processed_at']
+    list_filter = ['status', 'action', 'router']
+    search_fields = ['username', 'router__name', 'last_error']
+    readonly_fields = ['router', 'username', 'action', 'payload', 'status', 'attempts',
+                       'last_error', 'created_at', 'processed_at', 'created_by']
+    date_hierarchy = 'created_at'
+    
+    def has_add_permission(self, request):
+        return False
@@ -5,3 +5,7 @@ class RoutersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'routers'
 
+    def ready(self):
+        from routers.services.log_buffer import connect_celery_signals
+        connect_celery_signals()
+
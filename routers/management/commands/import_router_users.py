@@ -0,0 +1,73 @@
+"""
+Create customers for the PPP secrets that already exist on a router.
+
+Usage:
+    python manage.py import_router_users --router Router1
+    python manage.py import_router_users --router Router1 --default-profile Basic --commit
+    python manage.py import_router_users --router Router1 --expires-at 2026-11-01 --commit
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from profiles.models import Profile
+from routers.models import Router
+from routers.services.secret_import import import_router_secrets
+
+
+class Command(BaseCommand):
+    help = 'Import the PPP secrets of a router as customers (dry run unless --commit)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--router', required=True, metavar='NAME', help='Router to import from')
+        parser.add_argument('--default-profile', metavar='NAME',
+                            help='Profile for secrets whose router profile has no billing profile')
+        parser.add_argument('--expires-at', metavar='DATE',
+                            help='Expiry of the enabled secrets (default: profile duration from now)')
+        parser.add_argument('--commit', action='store_true', help='Create the customers')
+
+    def handle(self, *args, **options):
+        try:
+            router = Router.objects.get(name=options['router'])
+        except Router.DoesNotExist:
+            raise CommandError(f"Unknown router: {options['router']}")
+
+        default_profile = None
+        if options['default_profile']:
+            try:
+                default_profile = Profile.objects.get(name=options['default_profile'])
+            except Profile.DoesNotExist:
+                raise CommandError(f"Unknown profile: {options['default_profile']}")
+
+        expires_at = None
+        if options['expires_at']:
+            expires_at = parse_datetime(options['expires_at'])
+            if expires_at is None and parse_date(options['expires_at']):
+                expires_at = parse_datetime(f"{options['expires_at']} 00:00")
+            if expires_at is None:
+                raise CommandError(f"Invalid date: {options['expires_at']}")
+            if timezone.is_naive(expires_at):
+                expires_at = timezone.make_aware(expires_at)
+
+        report = import_router_secrets(router, commit=options['commit'], default_profile=default_profile,
+                                       expires_at=expires_at)
+        if not report['success']:
+            raise CommandError(report['error'])
+
+        self.stdout.write(f"Router {router.name}: {report['secrets']} secrets")
+        self.stdout.write(f"  new:      {report['new']} ({report['active']} active, "
+                          f"expiring by {report['expiry']})")
+        self.stdout.write(f"  existing: {report['existing']} (already customers, skipped)")
+        self.stdout.write(f"  unmapped: {report['unmapped']} (no matching profile, skipped)")
+        self.stdout.write(f"  invalid:  {report['invalid']} (empty, duplicate or too long, skipped)")
+        self.stdout.write('Profiles:')
+        for row in report['profiles']:
+            self.stdout.write(f"  {row['router_profile']} -> {row['profile'] or '(none)'}: {row['secrets']}")
+        for category, names in report['samples'].items():
+            if names:
+                self.stdout.write(f"Some {category} secrets: {', '.join(names)}")
+
+        if options['commit']:
+            self.stdout.write(self.style.SUCCESS(f"Created {report['created']} customers"))
+        else:
+            self.stdout.write(self.style.WARNING('Dry run, nothing written. Run again with --commit to import.'))
@@ -0,0 +1,52 @@
+"""
+Follow PPP sessions on the router fleet in real time.
+
+Usage:
+    python manage.py listen_sessions
+    python manage.py listen_sessions --router sim-001 --router sim-002 --verbose
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from routers.models import Router
+from routers.services.session_listener import SessionListener, publish_session_events
+
+
+class Command(BaseCommand):
+    help = 'Stream PPP session connects and disconnects from the routers (long-running)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--router', action='append', dest='routers', metavar='NAME',
+                            help='Only follow this router (repeatable); default is every active router')
+        parser.add_argument('--keepalive', type=float, default=None,
+                            help='Idle seconds before a router is probed')
+        parser.add_argument('--flush-interval', type=float, default=1.0,
+                            help='Seconds events are batched before they are published')
+        parser.add_argument('--verbose', action='store_true', help='Print every session event')
+
+    def handle(self, *args, **options):
+        routers = None
+        if options['routers']:
+            routers = list(Router.objects.filter(name__in=options['routers']))
+            missing = set(options['routers']) - {router.name for router in routers}
+            if missing:
+                raise CommandError(f"Unknown routers: {', '.join(sorted(missing))}")
+
+        def publish_and_print(router, events, sessions):
+            publish_session_events(router, events, sessions)
+            for event in events:
+                self.stdout.write(
+                    f"{event.at:%H:%M:%S} {router.name}: {event.kind.lower()} {event.username} "
+                    f"{event.address}{' (resync)' if event.resync else ''}"
+                )
+
+        listener = SessionListener(
+            routers=routers,
+            handler=publish_and_print if options['verbose'] else publish_session_events,
+            keepalive=options['keepalive'],
+            flush_interval=options['flush_interval'],
+        )
+        self.stdout.write(self.style.SUCCESS('Listening for PPP session changes. Press Ctrl+C to stop.'))
+        try:
+            listener.run_forever()
+        except KeyboardInterrupt:
+            pass
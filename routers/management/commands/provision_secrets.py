@@ -0,0 +1,42 @@
+"""
+Bulk-provision a router's PPP secrets with a RouterOS import script.
+
+Usage:
+    python manage.py provision_secrets --router Router1
+    python manage.py provision_secrets --router Router1 --output router1-secrets.rsc
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from routers.models import Router
+from routers.services.bulk_provision import provision_secrets, write_script
+
+
+class Command(BaseCommand):
+    help = "Create or update all customers of a router as PPP secrets in one script import"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--router', required=True, metavar='NAME', help='Router to provision')
+        parser.add_argument('--output', metavar='FILE',
+                            help='Only write the .rsc script to FILE (import it by hand with /import)')
+        parser.add_argument('--wait', type=float, default=None,
+                            help='Seconds to wait for the import to finish')
+
+    def handle(self, *args, **options):
+        try:
+            router = Router.objects.get(name=options['router'])
+        except Router.DoesNotExist:
+            raise CommandError(f"Unknown router: {options['router']}")
+
+        if options['output']:
+            with open(options['output'], 'wb') as output:
+                written = write_script(router, output)
+            self.stdout.write(self.style.SUCCESS(f"Wrote {written} bytes to {options['output']}"))
+            return
+
+        result = provision_secrets(router, wait=options['wait'])
+        if not result['success']:
+            raise CommandError(result['error'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {result['bytes']} bytes in {result['duration']}s; "
+            f"{result['pending']} secrets still differ"
+        ))
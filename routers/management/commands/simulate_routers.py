@@ -0,0 +1,134 @@
+"""
+Run a fleet of simulated RouterOS routers for load testing and benchmarks.
+
+Usage:
+    python manage.py simulate_routers --count 300 --secrets 20000 --latency 40 --register
+    python manage.py simulate_routers --count 500 --benchmark
+    python manage.py simulate_routers --count 50 --churn 2 --register   # then: listen_sessions
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from routers.models import Router
+from routers.simulator import SimulatedFleet
+from routers.services.async_api import run_fan_out
+from routers.services.mikrotik_api import MikroTikAPIService
+
+
+class Command(BaseCommand):
+    help = 'Run simulated MikroTik routers speaking the RouterOS API on localhost'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=10, help='Number of routers')
+        parser.add_argument('--secrets', type=int, default=100, help='PPP secrets per router')
+        parser.add_argument('--profiles', type=int, default=5, help='PPP profiles per router')
+        parser.add_argument('--active-ratio', type=float, default=0.5,
+                            help='Fraction of secrets with an active session')
+        parser.add_argument('--latency', type=float, default=0, help='Reply latency in ms')
+        parser.add_argument('--jitter', type=float, default=0, help='Random extra latency in ms')
+        parser.add_argument('--packet-loss', type=float, default=0,
+                            help='Probability a reply is delayed by a retransmission')
+        parser.add_argument('--drop-rate', type=float, default=0,
+                            help='Probability a connection is dropped instead of replying')
+        parser.add_argument('--login-failure-rate', type=float, default=0,
+                            help='Probability a valid login is rejected')
+        parser.add_argument('--churn', type=float, default=0,
+                            help='PPP sessions connecting or disconnecting per second, per router')
+        parser.add_argument('--host', default='127.0.0.1', help='Listen address')
+        parser.add_argument('--base-port', type=int, default=18728,
+                            help='First API port (0 = random free ports)')
+        parser.add_argument('--spread-hosts', action='store_true',
+                            help='Give every router its own 127.0.x.y address on --base-port')
+        parser.add_argument('--register', action='store_true',
+                            help='Create/update Router rows (sim-001, ...) pointing at the simulators')
+        parser.add_argument('--benchmark', action='store_true',
+                            help='Run fleet sweeps against the simulators, print timings and exit')
+
+    def handle(self, *args, **options):
+        fleet = SimulatedFleet(
+            options['count'],
+            host=options['host'],
+            base_port=options['base_port'],
+            spread_hosts=options['spread_hosts'],
+            secrets=options['secrets'],
+            profiles=options['profiles'],
+            active_ratio=options['active_ratio'],
+            latency=options['latency'] / 1000,
+            jitter=options['jitter'] / 1000,
+            packet_loss=options['packet_loss'],
+            drop_rate=options['drop_rate'],
+            login_failure_rate=options['login_failure_rate'],
+            session_churn=options['churn'],
+        )
+
+        started = time.monotonic()
+        fleet.start()
+        self.stdout.write(self.style.SUCCESS(
+            f"Started {options['count']} simulated routers in {time.monotonic() - started:.1f}s"
+        ))
+
+        try:
+            routers = self._routers(fleet, options['register'])
+            if options['benchmark']:
+                self._benchmark(routers)
+                return
+
+            for router in routers[:5]:
+                self.stdout.write(f"  {router.name}: {router.vpn_ip}:{router.api_port}")
+            if len(routers) > 5:
+                self.stdout.write(f"  ... and {len(routers) - 5} more")
+            self.stdout.write('Press Ctrl+C to stop.')
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            fleet.stop()
+            self.stdout.write(f"Simulator stats: {fleet.stats()}")
+
+    def _routers(self, fleet, register):
+        """Router instances for the simulators, saved to the database if requested."""
+        routers = []
+        for index, server in enumerate(fleet.routers, start=1):
+            name = f"sim-{index:03d}"
+            if register:
+                router, _ = Router.objects.update_or_create(
+                    name=name,
+                    defaults={**server.router_kwargs(), 'description': 'RouterOS simulator', 'is_active': True},
+                )
+            else:
+                router = Router(name=name, **server.router_kwargs())
+            routers.append(router)
+
+        if register:
+            self.stdout.write(f"Registered {len(routers)} routers (sim-001 .. sim-{len(routers):03d})")
+        return routers
+
+    def _benchmark(self, routers):
+        started = time.monotonic()
+        results = run_fan_out(routers, lambda api: api.check_status())
+        elapsed = time.monotonic() - started
+        online = sum(1 for outcome in results if outcome.result and outcome.result[0])
+        slowest = max((outcome.elapsed for outcome in results), default=0)
+        self.stdout.write(
+            f"Concurrent status sweep: {online}/{len(routers)} online in {elapsed:.2f}s "
+            f"(slowest router {slowest:.2f}s)"
+        )
+
+        started = time.monotonic()
+        results = run_fan_out(routers, lambda api: api.get_active_connections())
+        sessions = sum(len(outcome.result[1]) for outcome in results if outcome.result and outcome.result[0])
+        self.stdout.write(
+            f"Concurrent active-session sweep: {sessions} sessions in {time.monotonic() - started:.2f}s"
+        )
+
+        sample = routers[:min(len(routers), 10)]
+        started = time.monotonic()
+        for router in sample:
+            MikroTikAPIService(router).check_status()
+        per_router = (time.monotonic() - started) / max(len(sample), 1)
+        self.stdout.write(
+            f"Sequential status check: {per_router * 1000:.0f} ms/router "
+            f"(~{per_router * len(routers):.1f}s for the whole fleet)"
+        )
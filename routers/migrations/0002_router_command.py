@@ -0,0 +1,39 @@
+# Generated by Django 4.2.7 on 2026-10-17 04:20
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('routers', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RouterCommand',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('username', models.CharField(max_length=100)),
+                ('action', models.CharField(choices=[('CREATE', 'Create secret'), ('UPDATE', 'Update secret'), ('ENABLE', 'Enable secret'), ('DISABLE', 'Disable secret'), ('DELETE', 'Delete secret')], max_length=10)),
+                ('payload', models.JSONField(blank=True, default=dict)),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('DONE', 'Done'), ('FAILED', 'Failed'), ('SUPERSEDED', 'Superseded')], default='PENDING', max_length=10)),
+                ('attempts', models.IntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+                ('router', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='commands', to='routers.router')),
+            ],
+            options={
+                'verbose_name': 'Router Command',
+                'verbose_name_plural': 'Router Commands',
+                'ordering': ['created_at', 'id'],
+                'indexes': [models.Index(fields=['router', 'status', 'created_at'], name='routers_rou_router__ef1293_idx'), models.Index(fields=['router', 'username', 'status'], name='routers_rou_router__9bde4c_idx'), models.Index(fields=['status', 'processed_at'], name='routers_rou_status_dd509a_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.7 on 2026-10-17 09:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('routers', '0002_router_command'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RouterHealthBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.CharField(choices=[('MINUTE', '1 minute'), ('HOUR', '1 hour'), ('DAY', '1 day')], max_length=6)),
+                ('bucket', models.DateTimeField(help_text='Start of the bucket')),
+                ('samples', models.IntegerField(default=0)),
+                ('online_samples', models.IntegerField(default=0)),
+                ('cpu_load_sum', models.FloatField(default=0)),
+                ('cpu_load_max', models.FloatField(default=0)),
+                ('memory_used_sum', models.FloatField(default=0)),
+                ('memory_used_max', models.FloatField(default=0)),
+                ('uptime_seconds', models.BigIntegerField(default=0)),
+                ('router', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='health', to='routers.router')),
+            ],
+            options={
+                'verbose_name': 'Router Health',
+                'verbose_name_plural': 'Router Health',
+                'ordering': ['router', 'resolution', 'bucket'],
+                'indexes': [models.Index(fields=['resolution', 'bucket'], name='routers_rou_resolut_07aef9_idx')],
+                'constraints': [models.UniqueConstraint(fields=('router', 'resolution', 'bucket'), name='unique_router_health_bucket')],
+            },
+        ),
+    ]
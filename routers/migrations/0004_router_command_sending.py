@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 17:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('routers', '0003_router_health_bucket'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='routercommand',
+            name='status',
+            field=models.CharField(choices=[('PENDING', 'Pending'), ('SENDING', 'Sending'), ('DONE', 'Done'), ('FAILED', 'Failed'), ('SUPERSEDED', 'Superseded')], default='PENDING', max_length=10),
+        ),
+    ]
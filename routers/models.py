@@ -119,3 +119,97 @@ class RouterLog(models.Model):
     def __str__(self):
         return f"{self.router.name} - {self.action} ({self.created_at})"
 
+
+class RouterCommand(models.Model):
+    """
+    Pending PPP secret change for a router (outbox).
+    
+    Commands are replayed in order over one session when the router is
+    reachable, so changes made while it is offline are not lost.
+    """
+    ACTIONS = [
+        ('CREATE', 'Create secret'),
+        ('UPDATE', 'Update secret'),
+        ('ENABLE', 'Enable secret'),
+        ('DISABLE', 'Disable secret'),
+        ('DELETE', 'Delete secret'),
+    ]
+    
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('SENDING', 'Sending'),
+        ('DONE', 'Done'),
+        ('FAILED', 'Failed'),
+        ('SUPERSEDED', 'Superseded'),
+    ]
+    
+    router = models.ForeignKey(Router, on_delete=models.CASCADE, related_name='commands')
+    username = models.CharField(max_length=100)
+    action = models.CharField(max_length=10, choices=ACTIONS)
+    payload = models.JSONField(default=dict, blank=True)
+    
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDING')
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    
+    created_at = models.DateTimeField(default=timezone.now)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    
+    class Meta:
+        ordering = ['created_at', 'id']
+        verbose_name = 'Router Command'
+        verbose_name_plural = 'Router Commands'
+        indexes = [
+            models.Index(fields=['router', 'status', 'created_at']),
+            models.Index(fields=['router', 'username', 'status']),
+            models.Index(fields=['status', 'processed_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.router.name} - {self.action} {self.username} ({self.status})"
+
+
+class RouterHealthBucket(models.Model):
+    """
+    Router health samples aggregated per minute, hour or day.
+    
+    Status checks write MINUTE buckets, which are rolled up into HOUR and
+    DAY buckets; each resolution has its own retention. Sums are stored
+    instead of averages so buckets can be merged exactly.
+    """
+    RESOLUTIONS = [
+        ('MINUTE', '1 minute'),
+        ('HOUR', '1 hour'),
+        ('DAY', '1 day'),
+    ]
+    
+    router = models.ForeignKey(Router, on_delete=models.CASCADE, related_name='health')
+    resolution = models.CharField(max_length=6, choices=RESOLUTIONS)
+    bucket = models.DateTimeField(help_text="Start of the bucket")
+    
+    samples = models.IntegerField(default=0)
+    online_samples = models.IntegerField(default=0)
+    
+    # Percentages, summed over the online samples
+    cpu_load_sum = models.FloatField(default=0)
+    cpu_load_max = models.FloatField(default=0)
+    memory_used_sum = models.FloatField(default=0)
+    memory_used_max = models.FloatField(default=0)
+    
+    # Router uptime at the last online sample
+    uptime_seconds = models.BigIntegerField(default=0)
+    
+    class Meta:
+        ordering = ['router', 'resolution', 'bucket']
+        verbose_name = 'Router Health'
+        verbose_name_plural = 'Router Health'
+        constraints = [
+            models.UniqueConstraint(fields=['router', 'resolution', 'bucket'], name='unique_router_health_bucket'),
+        ]
+        indexes = [
+            models.Index(fields=['resolution', 'bucket']),
+        ]
+    
+    def __str__(self):
+        return f"{self.router.name} - {self.resolution} {self.bucket}"
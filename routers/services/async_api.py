@@ -0,0 +1,646 @@
+"""
+Asyncio RouterOS API client for talking to many routers at once.
+
+Mirrors the operations of MikroTikAPIService but runs on asyncio streams,
+so a single worker can query hundreds of routers concurrently. Use
+fan_out() (or iter_fan_out() / run_fan_out() from synchronous code) to
+sweep the fleet with bounded concurrency and
+per-router timeouts; a sweep then takes as long as the slowest router
+rather than the sum of all of them.
+"""
+import asyncio
+import logging
+import queue
+import threading
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+try:
+    from librouteros.exceptions import TrapError, MultiTrapError, FatalError, ConnectionClosed
+    from librouteros.protocol import Encoder, Decoder, compose_word
+except ImportError:
+    # Fallback if librouteros is not installed
+    TrapError = MultiTrapError = FatalError = ConnectionClosed = Exception
+    Encoder = Decoder = None
+    compose_word = None
+
+from django.conf import settings
+
+from routers.services.circuit_breaker import RouterCircuitBreaker
+from routers.services.connection_pool import parse_attribute
+from routers.services.rate_limiter import RouterRateLimiter, RateLimitTimeout
+from routers.services.mikrotik_api import MikroTikAPIService, ppp_interface_traffic
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of .ids sent in a single bulk set
+BULK_CHUNK_SIZE = MikroTikAPIService.BULK_CHUNK_SIZE
+
+
+class AsyncRouterOSConnection:
+    """
+    A single RouterOS API session over an asyncio stream.
+
+    Speaks the same wire protocol as librouteros and reuses its word
+    encoding helpers. Replies are parsed like pooled sessions do (see
+    connection_pool.parse_attribute()), so names and passwords stay strings.
+    """
+
+    encoding = 'ASCII'
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+
+    @classmethod
+    async def open(cls, host: str, port: int, username: str, password: str,
+                   timeout: float) -> 'AsyncRouterOSConnection':
+        """Connect and log in using the post-6.43 plain login method."""
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+        connection = cls(reader, writer)
+        try:
+            await asyncio.wait_for(connection.command('/login', name=username, password=password), timeout)
+        except BaseException:
+            connection.close()
+            raise
+        return connection
+
+    def _encode_sentence(self, cmd: str, *words: str) -> bytes:
+        encoded = b''
+        for word in (cmd,) + words:
+            raw = word.encode(self.encoding, errors='strict')
+            encoded += Encoder.encodeLength(len(raw)) + raw
+        return encoded + b'\x00'
+
+    async def _read_word(self, idle_timeout: Optional[float] = None) -> str:
+        try:
+            # Only the wait for the first byte may time out, so a timeout
+            # never leaves a half-read word in the stream
+            first = await asyncio.wait_for(self.reader.readexactly(1), idle_timeout)
+            if first == b'\x00':
+                return ''
+            length_bytes = first + await self.reader.readexactly(Decoder.determineLength(first))
+            length = Decoder.decodeLength(length_bytes)
+            word = await self.reader.readexactly(length)
+        except asyncio.IncompleteReadError:
+            raise ConnectionClosed('Connection unexpectedly closed.')
+        return word.decode(self.encoding, errors='ignore')
+
+    async def _read_sentence(self, idle_timeout: Optional[float] = None) -> Tuple[str, Dict[str, Any], Optional[str]]:
+        words = [await self._read_word(idle_timeout)]
+        while words[-1] != '':
+            words.append(await self._read_word())
+
+        reply_word, attributes = words[0], words[1:-1]
+        if reply_word == '!fatal':
+            self.close()
+            raise FatalError(attributes[0] if attributes else 'fatal')
+        tag = next((word[5:] for word in attributes if word.startswith('.tag=')), None)
+        return reply_word, dict(parse_attribute(word) for word in attributes if word.startswith('=')), tag
+
+    async def raw_command(self, cmd: str, *words: str) -> List[Dict[str, Any]]:
+        """
+        Send a command with pre-formatted API words and read the full reply.
+
+        Raises:
+            TrapError / MultiTrapError: If the router rejected the command
+        """
+        self.writer.write(self._encode_sentence(cmd, *words))
+        await self.writer.drain()
+
+        traps = []
+        response = []
+        reply_word = None
+        while reply_word != '!done':
+            reply_word, attributes, _ = await self._read_sentence()
+            if reply_word == '!trap':
+                traps.append(TrapError(**attributes))
+            elif reply_word in ('!re', '!done') and attributes:
+                response.append(attributes)
+
+        if len(traps) > 1:
+            raise MultiTrapError(*traps)
+        if traps:
+            raise traps[0]
+        return response
+
+    async def command(self, cmd: str, **kwargs: Any) -> List[Dict[str, Any]]:
+        """Send a command with keyword attributes and read the full reply."""
+        return await self.raw_command(cmd, *(compose_word(key, value) for key, value in kwargs.items()))
+
+    async def print(self, path: str, *proplist: str, **query: Any) -> List[Dict[str, Any]]:
+        """Run ``<path>/print``, optionally limited to proplist and filtered by equality."""
+        words = []
+        if proplist:
+            words.append(f"=.proplist={','.join(proplist)}")
+        words.extend(f"?{compose_word(key, value)[1:]}" for key, value in query.items())
+        return await self.raw_command(f'{path}/print', *words)
+
+    async def listen(self, path: str, *proplist: str,
+                     keepalive: float = 30.0) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Stream the contents of a menu followed by every change to it.
+
+        Sends ``<path>/listen`` and then ``<path>/print`` as tagged commands,
+        so no change can slip in between the snapshot and the stream.
+        The session cannot run other commands while it is listening.
+
+        Yields:
+            ('item', row) for every printed row, ('synced', {}) once the
+            print is complete and ('change', row) for every change; rows
+            removed on the router carry ``.dead``. Changes may arrive before
+            'synced' and must be applied on top of the snapshot.
+
+        Raises:
+            ConnectionClosed: If the router ended the listen, or did not
+                answer a keepalive probe sent after ``keepalive`` idle seconds
+            TrapError: If the router rejected the listen or print
+        """
+        words = [f"=.proplist={','.join(proplist)}"] if proplist else []
+        self.writer.write(self._encode_sentence(f'{path}/listen', *words, '.tag=listen'))
+        self.writer.write(self._encode_sentence(f'{path}/print', *words, '.tag=print'))
+        await self.writer.drain()
+
+        probing = False
+        while True:
+            try:
+                reply_word, attributes, tag = await self._read_sentence(keepalive)
+            except asyncio.TimeoutError:
+                if probing:
+                    raise ConnectionClosed(f'No reply from router within {keepalive}s')
+                # A silent menu and a dead tunnel look the same; ask something
+                self.writer.write(self._encode_sentence('/system/identity/print', '.tag=ping'))
+                await self.writer.drain()
+                probing = True
+                continue
+
+            probing = False
+            if reply_word == '!trap':
+                raise TrapError(**attributes)
+            if tag == 'print':
+                if reply_word == '!re':
+                    yield 'item', attributes
+                elif reply_word == '!done':
+                    yield 'synced', {}
+            elif tag == 'listen':
+                if reply_word == '!re':
+                    yield 'change', attributes
+                elif reply_word == '!done':
+                    raise ConnectionClosed('Router ended the listen')
+
+    def close(self):
+        """Close the underlying stream."""
+        try:
+            self.writer.close()
+        except Exception as e:
+            logger.debug(f"Error closing async connection: {str(e)}")
+
+
+class AsyncMikroTikAPIService:
+    """
+    Asyncio counterpart of MikroTikAPIService.
+
+    Methods return the same (success, payload) tuples as the synchronous
+    service. Use as ``async with AsyncMikroTikAPIService(router) as api``
+    to run several operations on one session; otherwise every call opens
+    and closes its own session.
+    """
+
+    def __init__(self, router, timeout: Optional[float] = None):
+        """
+        Initialize the API service with a router instance.
+
+        Args:
+            router: Router model instance
+            timeout: Connect timeout in seconds (defaults to MIKROTIK_API_TIMEOUT)
+        """
+        self.router = router
+        self.connection: Optional[AsyncRouterOSConnection] = None
+        self.timeout = timeout or getattr(settings, 'MIKROTIK_API_TIMEOUT', 10)
+        self.limiter = RouterRateLimiter(router)
+        # Seconds the last connect spent waiting in the rate limiter
+        self.limiter_wait = 0.0
+
+    async def connect_router(self) -> Tuple[bool, str]:
+        """
+        Establish connection to the MikroTik router.
+
+        Returns:
+            Tuple of (success: bool, message: str)
+        """
+        if Encoder is None:
+            return False, "librouteros library is not installed"
+
+        breaker = RouterCircuitBreaker(self.router.id)
+        allowed, retry_after = breaker.allow_request()
+        if not allowed:
+            return False, (
+                f"Router {self.router.name} is unreachable (recent connection failures); "
+                f"retrying in {retry_after}s"
+            )
+
+        if not self.limiter.held:
+            try:
+                self.limiter_wait = await self.limiter.acquire_async()
+            except RateLimitTimeout as e:
+                logger.warning(f"Router {self.router.name}: {str(e)}")
+                return False, str(e)
+
+        try:
+            self.connection = await AsyncRouterOSConnection.open(
+                host=self.router.vpn_ip,
+                port=self.router.api_port,
+                username=self.router.username,
+                password=self.router.password,
+                timeout=self.timeout,
+            )
+            breaker.record_success()
+            return True, "Connection successful"
+        except asyncio.TimeoutError:
+            error_msg = f"Connection failed: timed out after {self.timeout}s"
+        except (ConnectionClosed, FatalError, TrapError, OSError) as e:
+            error_msg = f"Connection failed: {str(e)}"
+        except BaseException:
+            # Cancelled (e.g. a fan-out timeout); do not keep the slot
+            self.limiter.release()
+            raise
+        self.limiter.release()
+        breaker.record_failure(error_msg)
+        logger.error(f"Router {self.router.name}: {error_msg}")
+        return False, error_msg
+
+    async def disconnect(self):
+        """Close the router connection."""
+        if self.connection:
+            self.connection.close()
+            self.connection = None
+        self.limiter.release()
+
+    async def __aenter__(self):
+        success, message = await self.connect_router()
+        if not success:
+            raise ConnectionError(message)
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.disconnect()
+
+    async def _call(self, operation: Callable[[AsyncRouterOSConnection], Awaitable[Any]],
+                    error_prefix: str, default: Any) -> Tuple[bool, Any]:
+        """Run an operation on the current session or on a short-lived one."""
+        owns_connection = self.connection is None
+        if owns_connection:
+            success, message = await self.connect_router()
+            if not success:
+                return False, message if default is None else default
+
+        try:
+            return True, await operation(self.connection)
+        except (TrapError, MultiTrapError) as e:
+            error_msg = f"{error_prefix}: {str(e)}"
+        except (ConnectionClosed, FatalError, OSError) as e:
+            error_msg = f"{error_prefix}: {str(e)}"
+            # The stream is unusable after a transport error
+            await self.disconnect()
+            owns_connection = False
+        finally:
+            if owns_connection:
+                await self.disconnect()
+
+        logger.error(f"Router {self.router.name}: {error_msg}")
+        return False, error_msg if default is None else default
+
+    async def check_status(self) -> Tuple[bool, Dict]:
+        """
+        Check router status and fetch system information.
+
+        Returns:
+            Tuple of (is_online: bool, info: dict)
+        """
+        async def operation(connection):
+            resource_data = await connection.print('/system/resource')
+            info = {}
+            if resource_data:
+                resource = resource_data[0]
+                info = {
+                    'version': resource.get('version', ''),
+                    'platform': resource.get('platform', ''),
+                    'board_name': resource.get('board-name', ''),
+                    'uptime': resource.get('uptime', ''),
+                    'cpu_load': resource.get('cpu-load', 0),
+                    'free_memory': resource.get('free-memory', 0),
+                    'total_memory': resource.get('total-memory', 0),
+                }
+            try:
+                identity_data = await connection.print('/system/identity')
+                if identity_data:
+                    info['identity'] = identity_data[0].get('name', '')
+            except TrapError:
+                pass
+            return info
+
+        success, result = await self._call(operation, 'Error fetching system info', None)
+        if not success:
+            return False, {'error': result}
+        return True, result
+
+    async def _find_secret_id(self, connection: AsyncRouterOSConnection, username: str) -> Optional[str]:
+        secrets = await connection.print('/ppp/secret', '.id', 'name', name=username)
+        return secrets[0]['.id'] if secrets else None
+
+    async def create_ppp_secret(self, username: str, password: str, profile: str,
+                                service: str = 'any') -> Tuple[bool, str]:
+        """Create a PPP secret (user account) on the router."""
+        async def operation(connection):
+            if await self._find_secret_id(connection, username):
+                return False, f"User {username} already exists on this router"
+            await connection.command('/ppp/secret/add', name=username, password=password,
+                                     profile=profile, service=service)
+            return True, f"User {username} created successfully"
+
+        return self._unwrap(await self._call(operation, 'Error creating user', None))
+
+    async def update_ppp_secret(self, username: str, **kwargs) -> Tuple[bool, str]:
+        """Update an existing PPP secret."""
+        async def operation(connection):
+            secret_id = await self._find_secret_id(connection, username)
+            if not secret_id:
+                return False, f"User {username} not found on router"
+            await connection.command('/ppp/secret/set', **{'.id': secret_id, **kwargs})
+            return True, f"User {username} updated successfully"
+
+        return self._unwrap(await self._call(operation, 'Error updating user', None))
+
+    async def delete_ppp_secret(self, username: str) -> Tuple[bool, str]:
+        """Delete a PPP secret from the router."""
+        async def operation(connection):
+            secret_id = await self._find_secret_id(connection, username)
+            if not secret_id:
+                return False, f"User {username} not found on router"
+            await connection.command('/ppp/secret/remove', **{'.id': secret_id})
+            return True, f"User {username} deleted successfully"
+
+        return self._unwrap(await self._call(operation, 'Error deleting user', None))
+
+    async def disable_ppp_secret(self, username: str) -> Tuple[bool, str]:
+        """Disable a PPP secret (set disabled=yes)."""
+        return await self.update_ppp_secret(username, disabled='yes')
+
+    async def enable_ppp_secret(self, username: str) -> Tuple[bool, str]:
+        """Enable a PPP secret (set disabled=no)."""
+        return await self.update_ppp_secret(username, disabled='no')
+
+    async def get_active_connections(self) -> Tuple[bool, List[Dict]]:
+        """
+        Get list of active PPP connections.
+
+        Returns:
+            Tuple of (success: bool, connections: list)
+        """
+        async def operation(connection):
+            return [
+                {
+                    'id': conn.get('.id', ''),
+                    'name': conn.get('name', ''),
+                    'address': conn.get('address', ''),
+                    'uptime': conn.get('uptime', ''),
+                    'caller_id': conn.get('caller-id', ''),
+                    'service': conn.get('service', ''),
+                }
+                for conn in await connection.print('/ppp/active')
+            ]
+
+        return await self._call(operation, 'Error fetching active connections', [])
+
+    async def get_ppp_interface_traffic(self) -> Tuple[bool, List[Dict]]:
+        """
+        Get the byte counters of every PPP session with a single print.
+
+        Returns:
+            Tuple of (success: bool, interfaces: list, see ppp_interface_traffic())
+        """
+        async def operation(connection):
+            return ppp_interface_traffic(
+                await connection.print('/interface', '.id', 'name', 'rx-byte', 'tx-byte')
+            )
+
+        return await self._call(operation, 'Error fetching interface traffic', [])
+
+    async def get_all_ppp_secrets(self) -> Tuple[bool, List[Dict]]:
+        """
+        Get all PPP secrets from the router.
+
+        Returns:
+            Tuple of (success: bool, secrets: list)
+        """
+        async def operation(connection):
+            return [
+                {
+                    'id': secret.get('.id', ''),
+                    'name': str(secret.get('name', '')),
+                    'password': secret.get('password', ''),
+                    'profile': secret.get('profile', ''),
+                    'service': secret.get('service', ''),
+                    'disabled': secret.get('disabled', False) in (True, 'yes'),
+                }
+                for secret in await connection.print('/ppp/secret')
+            ]
+
+        return await self._call(operation, 'Error fetching PPP secrets', [])
+
+    async def bulk_set_disabled(self, usernames: List[str], disabled: bool) -> Dict[str, Tuple[bool, str]]:
+        """
+        Enable or disable many PPP secrets over one session.
+
+        Secrets are changed with one ``set`` per BULK_CHUNK_SIZE .ids; a
+        rejected chunk is retried user by user.
+
+        Returns:
+            Dict mapping username to (success: bool, message: str)
+        """
+        usernames = list(usernames)
+        value = 'yes' if disabled else 'no'
+        verb = 'disabled' if disabled else 'enabled'
+
+        async def operation(connection):
+            secret_ids = {
+                str(secret['name']): secret['.id']
+                for secret in await connection.print('/ppp/secret', '.id', 'name')
+            }
+            results = {}
+            found = []
+            for username in usernames:
+                if username in secret_ids:
+                    found.append(username)
+                else:
+                    results[username] = (False, f"User {username} not found on router")
+
+            for start in range(0, len(found), BULK_CHUNK_SIZE):
+                chunk = found[start:start + BULK_CHUNK_SIZE]
+                try:
+                    await connection.command(
+                        '/ppp/secret/set', **{'.id': ','.join(secret_ids[u] for u in chunk), 'disabled': value}
+                    )
+                    results.update((u, (True, f"User {u} {verb} successfully")) for u in chunk)
+                except (TrapError, MultiTrapError):
+                    for username in chunk:
+                        try:
+                            await connection.command(
+                                '/ppp/secret/set', **{'.id': secret_ids[username], 'disabled': value}
+                            )
+                            results[username] = (True, f"User {username} {verb} successfully")
+                        except (TrapError, MultiTrapError) as e:
+                            results[username] = (False, f"API error updating user: {str(e)}")
+            return results
+
+        success, result = await self._call(operation, 'Error updating users', None)
+        return result if success else {username: (False, result) for username in usernames}
+
+    async def create_ppp_profile(self, name: str, local_address: str,
+                                 remote_address: str, rate_limit: str = '') -> Tuple[bool, str]:
+        """Create a PPP profile on the router."""
+        async def operation(connection):
+            if await connection.print('/ppp/profile', 'name', name=name):
+                return False, f"Profile {name} already exists"
+            profile_data = {
+                'name': name,
+                'local-address': local_address,
+                'remote-address': remote_address,
+            }
+            if rate_limit:
+                profile_data['rate-limit'] = rate_limit
+            await connection.command('/ppp/profile/add', **profile_data)
+            return True, f"Profile {name} created successfully"
+
+        return self._unwrap(await self._call(operation, 'Error creating profile', None))
+
+    @staticmethod
+    def _unwrap(outcome: Tuple[bool, Any]) -> Tuple[bool, str]:
+        """Flatten _call()'s (True, (success, message)) into (success, message)."""
+        success, result = outcome
+        return result if success else (False, result)
+
+
+class FanOutResult(NamedTuple):
+    """Outcome of one router in a fan-out sweep."""
+    router: Any
+    result: Any
+    error: Optional[str]
+    elapsed: float
+
+
+async def fan_out(routers: Iterable, operation: Callable[[AsyncMikroTikAPIService], Awaitable[Any]],
+                  concurrency: Optional[int] = None,
+                  timeout: Optional[float] = None) -> AsyncIterator[FanOutResult]:
+    """
+    Run an operation against many routers concurrently.
+
+    Results are yielded as each router finishes, so callers can stream
+    them out instead of waiting for the whole sweep.
+
+    Args:
+        routers: Router model instances
+        operation: Coroutine function taking an AsyncMikroTikAPIService,
+                   e.g. ``lambda api: api.check_status()``
+        concurrency: Maximum routers in flight (defaults to MIKROTIK_FANOUT_CONCURRENCY)
+        timeout: Per-router timeout covering connect and operation
+                 (defaults to MIKROTIK_API_TIMEOUT)
+
+    Yields:
+        FanOutResult per router, in completion order
+    """
+    concurrency = concurrency or getattr(settings, 'MIKROTIK_FANOUT_CONCURRENCY', 100)
+    timeout = timeout or getattr(settings, 'MIKROTIK_API_TIMEOUT', 10)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(router) -> FanOutResult:
+        async with semaphore:
+            started = time.monotonic()
+            try:
+                result = await asyncio.wait_for(
+                    operation(AsyncMikroTikAPIService(router, timeout=timeout)), timeout
+                )
+                return FanOutResult(router, result, None, time.monotonic() - started)
+            except asyncio.TimeoutError:
+                error = f"Timed out after {timeout}s"
+            except Exception as e:
+                error = str(e)
+            logger.warning(f"Router {router.name}: {error}")
+            return FanOutResult(router, None, error, time.monotonic() - started)
+
+    tasks = [asyncio.ensure_future(run(router)) for router in routers]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def iter_fan_out(routers: Iterable, operation: Callable[[AsyncMikroTikAPIService], Awaitable[Any]],
+                 concurrency: Optional[int] = None,
+                 timeout: Optional[float] = None) -> Iterator[FanOutResult]:
+    """
+    Synchronous, streaming entry point for fan_out() from views and Celery tasks.
+
+    The event loop runs in a helper thread and results are handed back
+    through a queue, so the caller can use the ORM on each result as it
+    arrives (Django refuses ORM calls from inside a running event loop).
+
+    Args:
+        routers: Router model instances (evaluated before the sweep starts)
+        operation: See fan_out()
+        concurrency: See fan_out()
+        timeout: See fan_out()
+
+    Yields:
+        FanOutResult per router, in completion order
+    """
+    routers = list(routers)
+    if not routers:
+        return
+
+    results: queue.Queue = queue.Queue()
+    done = object()
+    state = {}
+
+    async def sweep():
+        state['task'] = asyncio.current_task()
+        state['loop'] = asyncio.get_running_loop()
+        try:
+            async for outcome in fan_out(routers, operation, concurrency, timeout):
+                results.put(outcome)
+        finally:
+            results.put(done)
+
+    def run_sweep():
+        try:
+            asyncio.run(sweep())
+        except asyncio.CancelledError:
+            pass
+
+    thread = threading.Thread(target=run_sweep, daemon=True)
+    thread.start()
+    try:
+        while True:
+            outcome = results.get()
+            if outcome is done:
+                break
+            yield outcome
+    finally:
+        if thread.is_alive() and 'loop' in state:
+            # Consumer stopped early; cancel the remaining routers
+            state['loop'].call_soon_threadsafe(state['task'].cancel)
+        thread.join()
+
+
+def run_fan_out(routers: Iterable, operation: Callable[[AsyncMikroTikAPIService], Awaitable[Any]],
+                concurrency: Optional[int] = None,
+                timeout: Optional[float] = None) -> List[FanOutResult]:
+    """
+    Run fan_out() to completion and return every result.
+
+    Returns:
+        List of FanOutResult in completion order
+    """
+    return list(iter_fan_out(routers, operation, concurrency, timeout))
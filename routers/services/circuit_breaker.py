@@ -0,0 +1,163 @@
+"""
+Per-router circuit breaker shared across processes through the Django cache.
+
+When a router keeps failing to connect, callers fail fast instead of each
+blocking a worker for the full connect timeout. After a cooldown a single
+caller is let through as a half-open probe; its outcome closes the circuit
+again or re-opens it with a longer cooldown.
+"""
+import logging
+import math
+import time
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+
+class RouterCircuitBreaker:
+    """
+    Circuit breaker for one router.
+
+    States:
+        CLOSED: Requests go through; consecutive failures are counted.
+        OPEN: Requests are rejected until the cooldown has elapsed.
+        HALF_OPEN: Cooldown elapsed; one caller probes the router while
+                   everyone else is still rejected.
+    """
+
+    CLOSED = 'CLOSED'
+    OPEN = 'OPEN'
+    HALF_OPEN = 'HALF_OPEN'
+
+    # Refresh last_success at most this often for a healthy router
+    SUCCESS_REFRESH_INTERVAL = 30
+
+    def __init__(self, router_id):
+        """
+        Args:
+            router_id: Router primary key
+        """
+        self.router_id = str(router_id)
+        self.key = f"router:breaker:{self.router_id}"
+        self.probe_key = f"router:breaker:probe:{self.router_id}"
+        self.failure_threshold = getattr(settings, 'ROUTER_BREAKER_FAILURE_THRESHOLD', 3)
+        self.cooldown = getattr(settings, 'ROUTER_BREAKER_COOLDOWN', 30)
+        self.max_cooldown = getattr(settings, 'ROUTER_BREAKER_MAX_COOLDOWN', 600)
+        self._state: Optional[Dict] = None
+
+    def _load(self) -> Dict:
+        self._state = cache.get(self.key) or {
+            'state': self.CLOSED,
+            'failures': 0,
+            'trips': 0,
+            'opened_at': None,
+            'last_success': None,
+            'last_error': '',
+        }
+        return self._state
+
+    def _save(self, state: Dict):
+        self._state = state
+        # Keep entries around long enough to outlive the longest cooldown
+        cache.set(self.key, state, timeout=max(self.max_cooldown * 4, 3600))
+
+    def _current_cooldown(self, trips: int) -> int:
+        return min(self.cooldown * 2 ** max(trips - 1, 0), self.max_cooldown)
+
+    def get_state(self) -> Dict:
+        """Return the stored state, with HALF_OPEN reported once the cooldown elapsed."""
+        state = dict(self._load())
+        if state['state'] == self.OPEN and self._retry_after(state) == 0:
+            state['state'] = self.HALF_OPEN
+        return state
+
+    def _retry_after(self, state: Dict) -> int:
+        elapsed = time.time() - (state['opened_at'] or 0)
+        return max(math.ceil(self._current_cooldown(state['trips']) - elapsed), 0)
+
+    def allow_request(self) -> Tuple[bool, int]:
+        """
+        Decide whether a caller may contact the router now.
+
+        Returns:
+            Tuple of (allowed: bool, retry_after_seconds: int)
+        """
+        state = self._load()
+        if state['state'] == self.CLOSED:
+            return True, 0
+
+        retry_after = self._retry_after(state)
+        if retry_after > 0:
+            return False, retry_after
+
+        # Cooldown elapsed: let exactly one caller probe the router
+        probe_timeout = getattr(settings, 'MIKROTIK_API_TIMEOUT', 10) * 2
+        if cache.add(self.probe_key, 1, timeout=probe_timeout):
+            logger.info(f"Router {self.router_id}: circuit half-open, probing")
+            return True, 0
+        return False, probe_timeout
+
+    def record_success(self):
+        """Close the circuit after a successful connection."""
+        state = self._state or self._load()
+        now = time.time()
+        if (state['state'] == self.CLOSED and state['failures'] == 0
+                and state['last_success'] and now - state['last_success'] < self.SUCCESS_REFRESH_INTERVAL):
+            return
+
+        if state['state'] != self.CLOSED:
+            logger.info(f"Router {self.router_id}: circuit closed, router reachable again")
+            cache.delete(self.probe_key)
+        self._save({
+            'state': self.CLOSED,
+            'failures': 0,
+            'trips': 0,
+            'opened_at': None,
+            'last_success': now,
+            'last_error': '',
+        })
+
+    def record_failure(self, error: str = ''):
+        """Count a failed connection and open the circuit once the threshold is hit."""
+        state = dict(self._load())
+        state['failures'] += 1
+        state['last_error'] = error
+
+        if state['state'] == self.OPEN or state['failures'] >= self.failure_threshold:
+            state['trips'] += 1
+            state['state'] = self.OPEN
+            state['opened_at'] = time.time()
+            cache.delete(self.probe_key)
+            logger.warning(
+                f"Router {self.router_id}: circuit open for "
+                f"{self._current_cooldown(state['trips'])}s after {state['failures']} failures"
+            )
+        self._save(state)
+
+    @staticmethod
+    def last_successes(router_ids) -> Dict[str, float]:
+        """
+        Time of the last successful connection of many routers, in one cache call.
+
+        Returns:
+            Dict of router id -> timestamp (routers never reached are left out)
+        """
+        keys = {f"router:breaker:{router_id}": str(router_id) for router_id in router_ids}
+        return {
+            keys[key]: state['last_success']
+            for key, state in cache.get_many(list(keys)).items()
+            if state.get('last_success')
+        }
+
+    def is_open(self) -> bool:
+        """True while callers are being rejected (cooldown not yet elapsed)."""
+        state = self._load()
+        return state['state'] != self.CLOSED and self._retry_after(state) > 0
+
+    def reset(self):
+        """Forget all failures, e.g. after the router was edited."""
+        cache.delete_many([self.key, self.probe_key])
+        self._state = None
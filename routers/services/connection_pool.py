@@ -0,0 +1,313 @@
+"""
+Process-wide pool of authenticated RouterOS API sessions.
+
+Opening a session costs a TCP connect plus a RouterOS login over the VPN
+tunnel, so sessions are kept open per router and lent out to
+MikroTikAPIService calls instead of being torn down after every operation.
+"""
+import logging
+import os
+import socket
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+try:
+    from librouteros import connect
+    from librouteros.api import Api
+    from librouteros.exceptions import LibRouterosError
+    from librouteros.protocol import parse_word
+except ImportError:
+    # Fallback if librouteros is not installed
+    connect = parse_word = None
+    Api = object
+    LibRouterosError = Exception
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class PoolExhausted(Exception):
+    """Raised when no session for a router became free within the timeout."""
+
+
+# Attributes holding names and credentials. librouteros casts numeric words
+# to int, which turns a username like 0712345678 into 712345678, so these
+# are always returned as the raw string.
+RAW_ATTRIBUTES = frozenset({'name', 'password', 'profile', 'caller-id', 'comment', 'user'})
+
+
+def parse_attribute(word: str):
+    """librouteros' parse_word(), leaving RAW_ATTRIBUTES uncast."""
+    _, key, value = word.split('=', 2)
+    if key in RAW_ATTRIBUTES:
+        return key, value
+    return parse_word(word)
+
+
+class RouterOSApi(Api):
+    """librouteros Api that reads replies with parse_attribute()."""
+
+    def readSentence(self):
+        reply_word, words = self.protocol.readSentence()
+        return reply_word, dict(parse_attribute(word) for word in words)
+
+
+def open_connection(router, timeout: int):
+    """
+    Open and authenticate a new RouterOS API session.
+
+    Args:
+        router: Router model instance
+        timeout: Socket timeout in seconds
+
+    Returns:
+        librouteros Api instance
+    """
+    return connect(
+        host=router.vpn_ip,
+        username=router.username,
+        password=router.password,
+        port=router.api_port,
+        timeout=timeout,
+        subclass=RouterOSApi,
+    )
+
+
+def close_connection(connection):
+    """Close a session, ignoring errors from an already dead socket."""
+    try:
+        connection.close()
+    except Exception as e:
+        logger.debug(f"Error closing pooled connection: {str(e)}")
+
+
+def ping_connection(connection) -> bool:
+    """
+    Check that a session is still usable.
+
+    Runs a cheap command; a stale socket or expired login fails here.
+    """
+    try:
+        tuple(connection('/system/identity/print'))
+        return True
+    except (LibRouterosError, socket.timeout, socket.error, OSError):
+        return False
+
+
+class _PooledConnection:
+    """A session together with the bookkeeping the pool needs."""
+
+    __slots__ = ('connection', 'created_at', 'last_used')
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+
+class _RouterSlot:
+    """Idle sessions and the concurrency limit for a single router."""
+
+    def __init__(self, fingerprint: tuple, max_connections: int):
+        self.fingerprint = fingerprint
+        self.idle = deque()
+        self.in_use: Dict[int, _PooledConnection] = {}
+        self.semaphore = threading.BoundedSemaphore(max_connections)
+
+
+class RouterConnectionPool:
+    """
+    Thread-safe pool of RouterOS API sessions keyed by router id.
+
+    - At most ``max_connections`` sessions are open per router; callers
+      wait up to the connect timeout for a free one.
+    - Sessions idle for longer than ``idle_timeout`` are closed.
+    - Sessions idle for longer than ``health_check_interval`` are pinged
+      before being lent out and transparently replaced (re-login) when
+      the socket has gone stale.
+    - A router whose address or credentials changed gets fresh sessions.
+    """
+
+    def __init__(self, max_connections: int = 2, idle_timeout: int = 300,
+                 health_check_interval: int = 30):
+        self.max_connections = max_connections
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self._slots: Dict[str, _RouterSlot] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _fingerprint(router) -> tuple:
+        return (router.vpn_ip, router.api_port, router.username, router.password)
+
+    def _get_slot(self, router) -> _RouterSlot:
+        key = str(router.id)
+        fingerprint = self._fingerprint(router)
+        stale = []
+
+        with self._lock:
+            slot = self._slots.get(key)
+            if slot is None or slot.fingerprint != fingerprint:
+                if slot is not None:
+                    stale = list(slot.idle)
+                    slot.idle.clear()
+                slot = _RouterSlot(fingerprint, self.max_connections)
+                self._slots[key] = slot
+
+        for pooled in stale:
+            close_connection(pooled.connection)
+        return slot
+
+    def acquire(self, router, timeout: int) -> tuple:
+        """
+        Borrow a session for the given router.
+
+        Args:
+            router: Router model instance
+            timeout: Seconds to wait for a free session and socket timeout
+                     for a new one
+
+        Returns:
+            Tuple of (connection, is_new: bool)
+
+        Raises:
+            PoolExhausted: If every session for the router stayed busy
+            Any connection error raised by librouteros when logging in
+        """
+        slot = self._get_slot(router)
+        if not slot.semaphore.acquire(timeout=timeout):
+            raise PoolExhausted(
+                f"All {self.max_connections} connections to router {router.name} are busy"
+            )
+
+        try:
+            pooled = self._take_idle(slot)
+            is_new = pooled is None
+            if is_new:
+                pooled = _PooledConnection(open_connection(router, timeout))
+        except BaseException:
+            slot.semaphore.release()
+            raise
+
+        pooled.last_used = time.monotonic()
+        with self._lock:
+            slot.in_use[id(pooled.connection)] = pooled
+        return pooled.connection, is_new
+
+    def _take_idle(self, slot: _RouterSlot) -> Optional[_PooledConnection]:
+        """Pop a usable idle session, closing expired or stale ones."""
+        while True:
+            with self._lock:
+                if not slot.idle:
+                    return None
+                pooled = slot.idle.pop()
+
+            idle_for = time.monotonic() - pooled.last_used
+            if idle_for > self.idle_timeout:
+                close_connection(pooled.connection)
+                continue
+            if idle_for > self.health_check_interval and not ping_connection(pooled.connection):
+                logger.info("Discarding stale pooled RouterOS connection")
+                close_connection(pooled.connection)
+                continue
+            return pooled
+
+    def release(self, router, connection, discard: bool = False):
+        """
+        Return a borrowed session to the pool.
+
+        Args:
+            router: Router model instance the session belongs to
+            connection: Session returned by acquire()
+            discard: Close the session instead of keeping it, e.g. after a
+                     socket error left the protocol in an unknown state
+        """
+        key = str(router.id)
+        with self._lock:
+            slot = self._slots.get(key)
+            pooled = slot.in_use.pop(id(connection), None) if slot else None
+
+        if pooled is None:
+            # Slot was reset (credentials changed or pool cleared) while borrowed
+            close_connection(connection)
+            return
+
+        try:
+            if discard or slot.fingerprint != self._fingerprint(router):
+                close_connection(connection)
+            else:
+                pooled.last_used = time.monotonic()
+                with self._lock:
+                    slot.idle.append(pooled)
+        finally:
+            slot.semaphore.release()
+
+        self.evict_idle()
+
+    def evict_idle(self):
+        """Close every idle session that exceeded the idle timeout."""
+        now = time.monotonic()
+        expired = []
+        with self._lock:
+            for slot in self._slots.values():
+                while slot.idle and now - slot.idle[0].last_used > self.idle_timeout:
+                    expired.append(slot.idle.popleft())
+
+        for pooled in expired:
+            close_connection(pooled.connection)
+
+    def close_router(self, router_id):
+        """Close all idle sessions of one router, e.g. after it was edited."""
+        with self._lock:
+            slot = self._slots.pop(str(router_id), None)
+        if slot:
+            for pooled in slot.idle:
+                close_connection(pooled.connection)
+
+    def close_all(self):
+        """Close every idle session in the pool."""
+        with self._lock:
+            slots = list(self._slots.values())
+            self._slots = {}
+        for slot in slots:
+            for pooled in slot.idle:
+                close_connection(pooled.connection)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Return idle/in-use session counts per router id."""
+        with self._lock:
+            return {
+                key: {'idle': len(slot.idle), 'in_use': len(slot.in_use)}
+                for key, slot in self._slots.items()
+            }
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_connection_pool() -> RouterConnectionPool:
+    """
+    Return the pool for the current process.
+
+    Sockets must not be shared between a parent and its forked children
+    (gunicorn and Celery prefork workers), so a new pool is created
+    whenever the process id changes.
+    """
+    global _pool, _pool_pid
+
+    pid = os.getpid()
+    if _pool is None or _pool_pid != pid:
+        with _pool_lock:
+            if _pool is None or _pool_pid != pid:
+                _pool = RouterConnectionPool(
+                    max_connections=getattr(settings, 'MIKROTIK_POOL_MAX_CONNECTIONS', 2),
+                    idle_timeout=getattr(settings, 'MIKROTIK_POOL_IDLE_TIMEOUT', 300),
+                    health_check_interval=getattr(settings, 'MIKROTIK_POOL_HEALTH_CHECK_INTERVAL', 30),
+                )
+                _pool_pid = pid
+    return _pool
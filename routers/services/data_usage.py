@@ -0,0 +1,156 @@
+"""
+Per-customer data usage from PPP interface byte counters.
+
+Each run reads the counters of every PPP session interface with one
+/interface print per router (all routers queried concurrently) and diffs
+them against the previous reading kept in the cache. The deltas are added
+to Customer.data_used_mb and the session totals are copied into the open
+CustomerSession rows, using one bulk UPDATE per table per router.
+
+A session's interface is recreated on reconnect, so its counters restart
+from zero; a new interface .id or a counter that went down means the
+whole current value is new traffic. Bytes short of a full megabyte are
+carried over to the next run so they are not lost to rounding.
+"""
+import logging
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+
+from routers.services.async_api import iter_fan_out
+from routers.services.session_accounting import customer_ids
+
+logger = logging.getLogger(__name__)
+
+READING_KEY = 'router:usage:reading:{router_id}'
+LOCK_KEY = 'router:usage:lock'
+LOCK_TIMEOUT = 600
+
+BYTES_PER_MB = 1024 * 1024
+
+# Interface .id -> (username, rx bytes, tx bytes, bytes not yet counted)
+Reading = Dict[str, Tuple[str, int, int, int]]
+
+
+def _delta(previous: Optional[Tuple[str, int, int, int]], interface: Dict) -> int:
+    """Bytes transferred on an interface since the previous reading."""
+    rx, tx = interface['rx_bytes'], interface['tx_bytes']
+    if previous is None:
+        # Interface created since the last reading: a new session
+        return rx + tx
+    _, last_rx, last_tx, _ = previous
+    if rx < last_rx or tx < last_tx:
+        # Counters were reset
+        return rx + tx
+    return (rx - last_rx) + (tx - last_tx)
+
+
+def apply_router_usage(router, interfaces: List[Dict]) -> Dict:
+    """
+    Add the traffic since the last reading to the router's customers.
+
+    Args:
+        router: Router model instance
+        interfaces: Output of get_ppp_interface_traffic()
+
+    Returns:
+        Dict with customers/megabytes counts
+    """
+    from customers.models import Customer, CustomerSession
+
+    reading_key = READING_KEY.format(router_id=router.id)
+    previous: Optional[Reading] = cache.get(reading_key)
+
+    reading: Reading = {}
+    megabytes_by_user = defaultdict(int)
+    # Per user totals of the current sessions: [rx, tx]
+    session_bytes = defaultdict(lambda: [0, 0])
+    for interface in interfaces:
+        username, rx, tx = interface['username'], interface['rx_bytes'], interface['tx_bytes']
+        if previous is None:
+            # No baseline yet; counting the full counters could count traffic twice
+            last, delta = None, 0
+        else:
+            last = previous.get(interface['id'])
+            delta = _delta(last, interface)
+        megabytes, remainder = divmod((last[3] if last else 0) + delta, BYTES_PER_MB)
+        reading[interface['id']] = (username, rx, tx, remainder)
+        megabytes_by_user[username] += megabytes
+        session_bytes[username][0] += rx
+        session_bytes[username][1] += tx
+
+    ids = customer_ids(router, list(session_bytes))
+    used = {
+        ids[username]: megabytes
+        for username, megabytes in megabytes_by_user.items()
+        if megabytes and username in ids
+    }
+
+    # Seen from the router: tx went to the customer, rx came from them
+    sessions = [
+        CustomerSession(pk=pk, bytes_in=session_bytes[username][1], bytes_out=session_bytes[username][0])
+        for pk, username in (
+            CustomerSession.objects.filter(router=router, ended_at__isnull=True)
+            .values_list('pk', 'customer__username')
+            .iterator(chunk_size=2000)
+        )
+        if username in session_bytes
+    ]
+
+    with transaction.atomic():
+        if used:
+            Customer.objects.bulk_update(
+                [Customer(pk=customer_id, data_used_mb=F('data_used_mb') + megabytes)
+                 for customer_id, megabytes in used.items()],
+                ['data_used_mb'],
+                batch_size=1000,
+            )
+        if sessions:
+            CustomerSession.objects.bulk_update(sessions, ['bytes_in', 'bytes_out'], batch_size=1000)
+
+    cache.set(reading_key, reading, timeout=None)
+    return {
+        'router': router.name,
+        'customers': len(used),
+        'megabytes': sum(used.values()),
+    }
+
+
+def collect_usage(routers: Iterable) -> Dict:
+    """
+    Read the interface counters of many routers concurrently and apply them.
+
+    Only one run at a time is allowed across workers; overlapping runs
+    would count the same traffic twice.
+
+    Returns:
+        Dict with totals and the number of routers processed
+    """
+    if not cache.add(LOCK_KEY, 1, timeout=LOCK_TIMEOUT):
+        logger.info("Data usage collection already running, skipped")
+        return {'skipped': True}
+
+    totals = {'routers': 0, 'failed': 0, 'customers': 0, 'megabytes': 0}
+    try:
+        for outcome in iter_fan_out(routers, lambda api: api.get_ppp_interface_traffic()):
+            success, interfaces = outcome.result if outcome.error is None else (False, [])
+            if not success:
+                totals['failed'] += 1
+                continue
+            try:
+                stats = apply_router_usage(outcome.router, interfaces)
+            except Exception as e:
+                totals['failed'] += 1
+                logger.error(f"Router {outcome.router.name}: data usage update failed: {str(e)}")
+                continue
+            totals['routers'] += 1
+            totals['customers'] += stats['customers']
+            totals['megabytes'] += stats['megabytes']
+    finally:
+        cache.delete(LOCK_KEY)
+
+    logger.info(f"Data usage collection: {totals}")
+    return totals
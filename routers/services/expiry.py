@@ -0,0 +1,142 @@
+"""
+Bulk expiry of customer accounts.
+
+Expired customers are first marked EXPIRED in the database, with their
+rows locked so a renewal running at the same time either finishes first
+(and the customer is no longer expired) or waits for the sweep. Only the
+customers actually expired are then disabled on the routers: they are
+grouped by router and each router disables its batch over a single API
+session, with all routers handled concurrently through the async fan-out.
+Notifications are created with one bulk INSERT.
+
+A customer whose secret could not be disabled (router unreachable, API
+error) is still expired in the database; a DISABLE command is queued in
+the router's outbox instead, so the change reaches the router as soon as
+it is back.
+
+The sweep runs every CUSTOMER_EXPIRY_SWEEP_INTERVAL seconds and reads
+active customers in expiry order through a partial index
+(customer_active_expiry_idx), so its cost follows the number of customers
+that actually expired rather than the size of the table.
+"""
+import logging
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from routers.models import Router
+from routers.services.async_api import iter_fan_out
+from routers.services.outbox import DISABLE, ENABLE, enqueue_commands
+
+logger = logging.getLogger(__name__)
+
+LOCK_KEY = 'customers:expiry:lock'
+LOCK_TIMEOUT = 600
+
+
+def expire_customers(now: Optional[datetime] = None, customer_ids: Optional[Iterable] = None,
+                     limit: Optional[int] = None) -> Dict:
+    """
+    Disable and mark EXPIRED every active customer whose expiry has passed.
+
+    Args:
+        now: Cut-off time (defaults to now)
+        customer_ids: Only consider these customers
+        limit: Most customers expired in one run, earliest expiry first
+               (defaults to CUSTOMER_EXPIRY_BATCH_SIZE)
+
+    Returns:
+        Dict with expired/disabled/queued/notified counts and the number of
+        routers processed; 'remaining' is set when the batch was full
+    """
+    from core.models import Notification
+    from customers.models import Customer
+
+    if not cache.add(LOCK_KEY, 1, timeout=LOCK_TIMEOUT):
+        logger.info("Customer expiry already running, skipped")
+        return {'skipped': True}
+
+    try:
+        now = now or timezone.now()
+        limit = limit or getattr(settings, 'CUSTOMER_EXPIRY_BATCH_SIZE', 5000)
+        expired = Customer.objects.filter(is_active=True, expires_at__lte=now)
+        if customer_ids is not None:
+            expired = expired.filter(id__in=list(customer_ids))
+
+        with transaction.atomic():
+            # Expiry order (not the model's -created_at) so the partial index is used;
+            # rows being renewed right now are skipped until the next sweep
+            batch = list(
+                expired.order_by('expires_at').select_for_update(skip_locked=True)
+                .values('id', 'username', 'full_name', 'router_id', 'created_by_id', 'send_notifications')[:limit]
+            )
+            Customer.objects.filter(
+                id__in=[customer['id'] for customer in batch], is_active=True, expires_at__lte=now,
+            ).update(status='EXPIRED', is_active=False)
+
+        by_router = defaultdict(dict)
+        for customer in batch:
+            by_router[customer['router_id']][customer['username']] = customer
+
+        totals = {'expired': 0, 'disabled': 0, 'queued': 0, 'notified': 0, 'routers': len(by_router),
+                  'remaining': len(batch) == limit}
+        if not by_router:
+            return totals
+
+        routers = Router.objects.filter(id__in=list(by_router))
+        notifications = []
+        for outcome in iter_fan_out(
+            routers, lambda api: api.bulk_set_disabled(list(by_router[api.router.id]), True)
+        ):
+            router = outcome.router
+            customers = by_router[router.id]
+            results = outcome.result if outcome.error is None else {}
+            # A secret missing from the router needs no disabling
+            done = {
+                username for username, (ok, message) in results.items()
+                if ok or message.endswith('not found on router')
+            }
+            pending = [username for username in customers if username not in done]
+
+            # Renewed after the expiry committed: undo the disable on the router
+            renewed = list(Customer.objects.filter(
+                id__in=[customer['id'] for customer in customers.values()], is_active=True,
+            ).values_list('username', flat=True))
+            if renewed:
+                pending = [username for username in pending if username not in renewed]
+                enqueue_commands(router, renewed, ENABLE)
+            if pending:
+                enqueue_commands(router, pending, DISABLE)
+                logger.warning(
+                    f"Router {router.name}: {len(pending)} expired customers queued for disabling"
+                )
+
+            notifications.extend(
+                Notification(
+                    user_id=customer['created_by_id'],
+                    title='Customer Account Expired',
+                    message=f"Customer {customer['username']} ({customer['full_name']}) has expired.",
+                    notification_type='WARNING',
+                    link=f"/customers/{customer['id']}/",
+                    created_at=now,
+                )
+                for customer in customers.values()
+                if customer['send_notifications'] and customer['created_by_id']
+                and customer['username'] not in renewed
+            )
+            totals['expired'] += len(customers)
+            totals['disabled'] += len(done)
+            totals['queued'] += len(pending)
+
+        Notification.objects.bulk_create(notifications, batch_size=1000)
+        totals['notified'] = len(notifications)
+    finally:
+        cache.delete(LOCK_KEY)
+
+    logger.info(f"Customer expiry: {totals}")
+    return totals
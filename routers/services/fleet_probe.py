@@ -0,0 +1,85 @@
+"""
+Sharded status probes for the whole fleet.
+
+A shard is a list of router ids handled by one Celery task: the routers
+are loaded with one query, probed concurrently with the asyncio client
+and the results written back in bulk through the status store, which
+saves only routers whose status, version, model or identity changed.
+Health samples and the poll schedule are written in bulk as well, so a
+shard costs a handful of queries however many routers it holds.
+"""
+import logging
+from typing import Dict, Iterable, List, Sequence
+
+from django.conf import settings
+from django.utils import timezone
+
+from routers.models import Router, RouterCommand
+from routers.services import health_store, status_store
+from routers.services.async_api import iter_fan_out
+from routers.services.poll_scheduler import PollScheduler
+
+logger = logging.getLogger(__name__)
+
+
+def shard(router_ids: Sequence, size: int = None) -> List[List[str]]:
+    """Split router ids into shards of ROUTER_PROBE_SHARD_SIZE."""
+    size = size or getattr(settings, 'ROUTER_PROBE_SHARD_SIZE', 100)
+    router_ids = [str(router_id) for router_id in router_ids]
+    return [router_ids[start:start + size] for start in range(0, len(router_ids), size)]
+
+
+def probe_routers(routers: Iterable[Router]) -> Dict:
+    """
+    Check the status of many routers concurrently and store the results.
+
+    Args:
+        routers: Router model instances
+
+    Returns:
+        Dict with routers/online/offline/changed counts and the ids of
+        online routers that have queued commands ('replay')
+    """
+    now = timezone.now()
+    probes = []
+    samples = []
+    results = {}
+
+    for outcome in iter_fan_out(routers, lambda api: api.check_status()):
+        router = outcome.router
+        if outcome.error is None:
+            online, info = outcome.result
+        else:
+            online, info = False, {'error': outcome.error}
+        if not online:
+            logger.warning(f"Router {router.name} is offline: {info.get('error', 'Unknown')}")
+
+        samples.append(health_store.health_sample(router, online, info, at=now))
+        results[router.id] = online
+        probes.append((router, online, info))
+
+    changed = status_store.record_results(probes, now)
+    health_store.record_samples(samples)
+    PollScheduler().record_results(results)
+
+    online_ids = [router_id for router_id, online in results.items() if online]
+    replay = list(
+        RouterCommand.objects.filter(router_id__in=online_ids, status='PENDING')
+        .values_list('router_id', flat=True)
+        .distinct()
+    ) if online_ids else []
+
+    for router in changed:
+        logger.info(f"Router {router.name} is {router.status}")
+    return {
+        'routers': len(results),
+        'online': len(online_ids),
+        'offline': len(results) - len(online_ids),
+        'changed': len(changed),
+        'replay': [str(router_id) for router_id in replay],
+    }
+
+
+def probe_shard(router_ids: Sequence) -> Dict:
+    """Load the active routers of a shard and probe them (see probe_routers())."""
+    return probe_routers(Router.objects.filter(id__in=list(router_ids), is_active=True))
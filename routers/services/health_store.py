@@ -0,0 +1,248 @@
+"""
+Time-series store for router health samples.
+
+Every status check records CPU load, memory use, uptime and reachability
+as a MINUTE bucket of RouterHealthBucket (the latest sample in a minute
+wins). rollup_health() folds the minutes into HOUR buckets and the hours
+into DAY buckets and drops buckets older than their resolution's
+retention (ROUTER_HEALTH_RETENTION_DAYS). get_health_series() picks the
+coarsest resolution that still gives the requested detail and
+downsamples it for charting, so a year of history for a router is only a
+few hundred rows.
+"""
+import logging
+import math
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Dict, Iterable, Optional
+
+from django.conf import settings
+from django.utils import timezone
+
+from routers.models import RouterHealthBucket
+from routers.services.mikrotik_api import parse_uptime
+
+logger = logging.getLogger(__name__)
+
+MINUTE = 'MINUTE'
+HOUR = 'HOUR'
+DAY = 'DAY'
+
+RESOLUTION_SECONDS = {MINUTE: 60, HOUR: 3600, DAY: 86400}
+
+# Resolution -> the finer resolution it is rolled up from
+ROLLUPS = {HOUR: MINUTE, DAY: HOUR}
+
+DEFAULT_RETENTION_DAYS = {MINUTE: 2, HOUR: 90, DAY: 1825}
+
+METRIC_FIELDS = [
+    'samples', 'online_samples', 'cpu_load_sum', 'cpu_load_max',
+    'memory_used_sum', 'memory_used_max', 'uptime_seconds',
+]
+
+
+def retention_days(resolution: str) -> int:
+    """Days a resolution is kept (ROUTER_HEALTH_RETENTION_DAYS overrides the defaults)."""
+    overrides = getattr(settings, 'ROUTER_HEALTH_RETENTION_DAYS', {})
+    return overrides.get(resolution, DEFAULT_RETENTION_DAYS[resolution])
+
+
+def floor_time(at: datetime, seconds: int) -> datetime:
+    """
+    Start of the bucket of the given size that contains ``at``.
+
+    Buckets are aligned to the local time zone, so days start at midnight.
+    """
+    offset = int(timezone.localtime(at).utcoffset().total_seconds())
+    timestamp = (int(at.timestamp()) + offset) // seconds * seconds - offset
+    return datetime.fromtimestamp(timestamp, tz=dt_timezone.utc)
+
+
+def health_sample(router, online: bool, info: Optional[Dict] = None,
+                  at: Optional[datetime] = None) -> RouterHealthBucket:
+    """
+    Build the MINUTE bucket for one status check.
+
+    Args:
+        router: Router model instance
+        online: Whether the router answered
+        info: System info returned by check_status()
+        at: Time of the check (defaults to now)
+    """
+    sample = RouterHealthBucket(
+        router=router,
+        resolution=MINUTE,
+        bucket=floor_time(at or timezone.now(), RESOLUTION_SECONDS[MINUTE]),
+        samples=1,
+        online_samples=1 if online else 0,
+    )
+    if online and info:
+        cpu_load = float(info.get('cpu_load') or 0)
+        total_memory = int(info.get('total_memory') or 0)
+        free_memory = int(info.get('free_memory') or 0)
+        memory_used = (total_memory - free_memory) * 100 / total_memory if total_memory else 0
+
+        sample.cpu_load_sum = sample.cpu_load_max = cpu_load
+        sample.memory_used_sum = sample.memory_used_max = memory_used
+        sample.uptime_seconds = parse_uptime(info.get('uptime'))
+    return sample
+
+
+def record_samples(samples: Iterable[RouterHealthBucket]):
+    """Store samples with one INSERT, replacing earlier samples of the same minute."""
+    samples = list(samples)
+    if samples:
+        RouterHealthBucket.objects.bulk_create(
+            samples,
+            batch_size=1000,
+            update_conflicts=True,
+            unique_fields=['router', 'resolution', 'bucket'],
+            update_fields=METRIC_FIELDS,
+        )
+
+
+def record_sample(router, online: bool, info: Optional[Dict] = None):
+    """Store the result of one status check."""
+    record_samples([health_sample(router, online, info)])
+
+
+def _merge(target: Dict, row: Dict):
+    """Add a bucket's metrics to an aggregate; rows must come in time order."""
+    target['samples'] += row['samples']
+    target['online_samples'] += row['online_samples']
+    target['cpu_load_sum'] += row['cpu_load_sum']
+    target['cpu_load_max'] = max(target['cpu_load_max'], row['cpu_load_max'])
+    target['memory_used_sum'] += row['memory_used_sum']
+    target['memory_used_max'] = max(target['memory_used_max'], row['memory_used_max'])
+    if row['online_samples']:
+        target['uptime_seconds'] = row['uptime_seconds']
+
+
+def _empty() -> Dict:
+    return {field: 0 for field in METRIC_FIELDS}
+
+
+def rollup(resolution: str, start: datetime, end: datetime) -> int:
+    """
+    Recompute the buckets of a resolution in [start, end) from the finer one.
+
+    Buckets are recomputed in full, so running this again over the same
+    window (including a partial current bucket) is safe.
+
+    Returns:
+        Number of buckets written
+    """
+    source = ROLLUPS[resolution]
+    size = RESOLUTION_SECONDS[resolution]
+    start = floor_time(start, size)
+
+    buckets: Dict = {}
+    rows = (
+        RouterHealthBucket.objects.filter(resolution=source, bucket__gte=start, bucket__lt=end)
+        .order_by('bucket')
+        .values('router_id', 'bucket', *METRIC_FIELDS)
+    )
+    for row in rows.iterator(chunk_size=5000):
+        key = (row['router_id'], floor_time(row['bucket'], size))
+        _merge(buckets.setdefault(key, _empty()), row)
+
+    record_samples(
+        RouterHealthBucket(router_id=router_id, resolution=resolution, bucket=bucket, **metrics)
+        for (router_id, bucket), metrics in buckets.items()
+    )
+    return len(buckets)
+
+
+def purge_expired(now: Optional[datetime] = None) -> int:
+    """Delete buckets older than their resolution's retention."""
+    now = now or timezone.now()
+    deleted = 0
+    for resolution in RESOLUTION_SECONDS:
+        cutoff = now - timedelta(days=retention_days(resolution))
+        count, _ = RouterHealthBucket.objects.filter(resolution=resolution, bucket__lt=cutoff).delete()
+        deleted += count
+    return deleted
+
+
+def rollup_health(now: Optional[datetime] = None) -> Dict:
+    """
+    Refresh recent HOUR and DAY buckets and enforce retention.
+
+    Meant to run hourly; the previous hour and day are recomputed too so
+    late samples and a missed run are picked up.
+    """
+    now = now or timezone.now()
+    hours = rollup(HOUR, now - timedelta(hours=2), now)
+    days = rollup(DAY, now - timedelta(days=1), now)
+    purged = purge_expired(now)
+    return {'hours': hours, 'days': days, 'purged': purged}
+
+
+def _point(start: datetime, metrics: Dict) -> Dict:
+    online = metrics['online_samples']
+    return {
+        'time': start.isoformat(),
+        'cpu_load_avg': round(metrics['cpu_load_sum'] / online, 1) if online else None,
+        'cpu_load_max': metrics['cpu_load_max'] if online else None,
+        'memory_used_avg': round(metrics['memory_used_sum'] / online, 1) if online else None,
+        'memory_used_max': round(metrics['memory_used_max'], 1) if online else None,
+        'availability': round(online * 100 / metrics['samples'], 1) if metrics['samples'] else None,
+        'uptime_seconds': metrics['uptime_seconds'] if online else None,
+    }
+
+
+def choose_resolution(start: datetime, end: datetime, max_points: int,
+                      now: Optional[datetime] = None) -> str:
+    """
+    Coarsest resolution that still yields about max_points over the range
+    and is retained back to ``start``.
+    """
+    now = now or timezone.now()
+    step = (end - start).total_seconds() / max_points
+    candidates = [
+        resolution for resolution in (MINUTE, HOUR, DAY)
+        if now - timedelta(days=retention_days(resolution)) <= start
+    ] or [DAY]
+    fitting = [resolution for resolution in candidates if RESOLUTION_SECONDS[resolution] <= step]
+    return fitting[-1] if fitting else candidates[0]
+
+
+def get_health_series(router, start: datetime, end: Optional[datetime] = None,
+                      max_points: int = 300) -> Dict:
+    """
+    Downsampled health series of a router for charting.
+
+    Args:
+        router: Router model instance
+        start: Start of the range
+        end: End of the range (defaults to now)
+        max_points: Upper bound on the number of points returned
+
+    Returns:
+        Dict with 'resolution' (stored resolution read), 'step' (seconds per
+        point) and 'points', a list of dicts with time, cpu_load_avg/max,
+        memory_used_avg/max (percent), availability (percent of checks
+        answered) and uptime_seconds. Empty intervals are left out.
+    """
+    end = end or timezone.now()
+    resolution = choose_resolution(start, end, max_points)
+    size = RESOLUTION_SECONDS[resolution]
+    # Step: a whole number of stored buckets, at most max_points of them
+    step = size * max(1, math.ceil((end - start).total_seconds() / max_points / size))
+
+    points: Dict[datetime, Dict] = {}
+    rows = (
+        RouterHealthBucket.objects.filter(
+            router=router, resolution=resolution,
+            bucket__gte=floor_time(start, size), bucket__lt=end,
+        )
+        .order_by('bucket')
+        .values('bucket', *METRIC_FIELDS)
+    )
+    for row in rows:
+        _merge(points.setdefault(floor_time(row['bucket'], step), _empty()), row)
+
+    return {
+        'resolution': resolution,
+        'step': step,
+        'points': [_point(bucket, metrics) for bucket, metrics in points.items()],
+    }
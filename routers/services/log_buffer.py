@@ -0,0 +1,206 @@
+"""
+Buffered, sampled writer for RouterLog rows.
+
+MikroTikAPIService.log_action() used to INSERT one row per connect, success
+and error. Entries are now collected in memory and written with
+bulk_create once the buffer is full, every few seconds, when a Celery task
+finishes and when the process exits. Low-value entries can be sampled per
+log level or per level and action via ROUTER_LOG_SAMPLING.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+class RouterLogBuffer:
+    """
+    Thread-safe in-memory buffer of RouterLog entries.
+
+    Sampling rates map either a log type ('INFO') or a log type and action
+    ('INFO:Connection established') to N, meaning "keep 1 in N". The more
+    specific key wins; unlisted entries are always kept.
+    """
+
+    def __init__(self, max_size: int = 200, flush_interval: float = 5.0,
+                 sampling: Optional[Dict[str, int]] = None):
+        self.max_size = max_size
+        self.flush_interval = flush_interval
+        self.sampling = sampling or {}
+        self._entries: List = []
+        self._counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._timer: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    def _sample_rate(self, log_type: str, action: str) -> int:
+        rate = self.sampling.get(f"{log_type}:{action}")
+        if rate is None:
+            rate = self.sampling.get(log_type, 1)
+        return max(int(rate), 1)
+
+    def _keep(self, log_type: str, action: str) -> bool:
+        rate = self._sample_rate(log_type, action)
+        if rate == 1:
+            return True
+        key = f"{log_type}:{action}"
+        with self._lock:
+            count = self._counters.get(key, 0)
+            self._counters[key] = count + 1
+        return count % rate == 0
+
+    def add(self, router, log_type: str, action: str, message: str,
+            details: Optional[Dict] = None, created_by=None) -> bool:
+        """
+        Queue a RouterLog entry.
+
+        Returns:
+            True if the entry was kept, False if it was sampled out
+        """
+        from routers.models import RouterLog
+
+        if router is None or router.pk is None or router._state.adding:
+            # Unsaved routers (e.g. simulator fixtures) cannot be referenced
+            return False
+        if not self._keep(log_type, action):
+            return False
+
+        entry = RouterLog(
+            router=router,
+            log_type=log_type,
+            action=action,
+            message=message,
+            details=details,
+            created_by=created_by,
+            created_at=timezone.now(),
+        )
+        with self._lock:
+            self._entries.append(entry)
+            full = len(self._entries) >= self.max_size
+        self._ensure_timer()
+
+        if full or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+        return True
+
+    def flush(self) -> int:
+        """
+        Write all buffered entries with bulk_create.
+
+        Returns:
+            Number of rows written
+        """
+        from routers.models import RouterLog
+
+        with self._flush_lock:
+            with self._lock:
+                entries, self._entries = self._entries, []
+                self._last_flush = time.monotonic()
+            if not entries:
+                return 0
+
+            try:
+                RouterLog.objects.bulk_create(entries, batch_size=500)
+                return len(entries)
+            except Exception as e:
+                logger.error(f"Failed to bulk write {len(entries)} router logs: {str(e)}")
+
+            # Salvage what we can, e.g. when one router was deleted meanwhile
+            written = 0
+            for entry in entries:
+                try:
+                    entry.save(force_insert=True)
+                    written += 1
+                except Exception as e:
+                    logger.error(f"Failed to create router log: {str(e)}")
+            return written
+
+    def pending(self) -> int:
+        """Number of entries waiting to be written."""
+        with self._lock:
+            return len(self._entries)
+
+    def _ensure_timer(self):
+        if self._timer is not None and self._timer.is_alive():
+            return
+        with self._lock:
+            if self._timer is not None and self._timer.is_alive():
+                return
+            self._timer = threading.Thread(target=self._run_timer, name='router-log-flush', daemon=True)
+            self._timer.start()
+
+    def _run_timer(self):
+        """Flush periodically so quiet processes do not sit on entries."""
+        while not self._stopped.wait(self.flush_interval):
+            if self.pending():
+                try:
+                    self.flush()
+                finally:
+                    # This thread's DB connection is not managed by Django
+                    connections.close_all()
+
+    def close(self):
+        """Stop the flush timer and write what is left."""
+        self._stopped.set()
+        self.flush()
+
+
+_buffer = None
+_buffer_pid = None
+_buffer_lock = threading.Lock()
+
+
+def get_log_buffer() -> RouterLogBuffer:
+    """
+    Return the log buffer for the current process.
+
+    Forked children (gunicorn, Celery prefork) start with an empty buffer
+    so entries queued by the parent are not written twice.
+    """
+    global _buffer, _buffer_pid
+
+    pid = os.getpid()
+    if _buffer is None or _buffer_pid != pid:
+        with _buffer_lock:
+            if _buffer is None or _buffer_pid != pid:
+                _buffer = RouterLogBuffer(
+                    max_size=getattr(settings, 'ROUTER_LOG_BUFFER_SIZE', 200),
+                    flush_interval=getattr(settings, 'ROUTER_LOG_FLUSH_INTERVAL', 5),
+                    sampling=getattr(settings, 'ROUTER_LOG_SAMPLING', {}),
+                )
+                _buffer_pid = pid
+    return _buffer
+
+
+def flush_router_logs(**kwargs):
+    """Flush the current process' buffer; usable as a signal receiver."""
+    if _buffer is not None and _buffer_pid == os.getpid():
+        _buffer.flush()
+
+
+def _flush_at_exit():
+    if _buffer is not None and _buffer_pid == os.getpid():
+        _buffer.close()
+
+
+atexit.register(_flush_at_exit)
+
+
+def connect_celery_signals():
+    """Flush buffered router logs when a Celery task or worker process finishes."""
+    try:
+        from celery.signals import task_postrun, worker_process_shutdown
+    except ImportError:
+        return
+    task_postrun.connect(flush_router_logs, weak=False, dispatch_uid='router_log_flush_task')
+    worker_process_shutdown.connect(flush_router_logs, weak=False, dispatch_uid='router_log_flush_worker')
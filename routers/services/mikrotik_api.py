@@ -3,31 +3,91 @@ MikroTik API Service for connecting and managing MikroTik routers.
 Uses librouteros library for API communication.
 """
 import logging
+import re
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
 import socket
 
 try:
     from librouteros import connect
-    from librouteros.exceptions import TrapError, FatalError, ConnectionError as RouterOSConnectionError
+    from librouteros.exceptions import TrapError, FatalError, ConnectionClosed as RouterOSConnectionError
+    from librouteros.query import Key
 except ImportError:
     # Fallback if librouteros is not installed
     connect = None
+    Key = None
     TrapError = Exception
     FatalError = Exception
     RouterOSConnectionError = Exception
 
 from django.conf import settings
-from routers.models import RouterLog
+from routers.services.log_buffer import get_log_buffer
+from routers.services.connection_pool import get_connection_pool, PoolExhausted
+from routers.services.circuit_breaker import RouterCircuitBreaker
+from routers.services.rate_limiter import RouterRateLimiter, RateLimitTimeout
 
 logger = logging.getLogger(__name__)
 
+_UPTIME_PART = re.compile(r'(\d+)([wdhms])')
+_UPTIME_SECONDS = {'w': 604800, 'd': 86400, 'h': 3600, 'm': 60, 's': 1}
+
+# Dynamic interface RouterOS creates for each PPP server session, e.g. <pppoe-john>
+PPP_INTERFACE_NAME = re.compile(r'^<(?:pppoe|l2tp|pptp|sstp|ovpn)-(.+)>$')
+
+
+def ppp_interface_traffic(interfaces) -> List[Dict]:
+    """
+    Pick the PPP session interfaces out of an /interface print.
+
+    Counters are seen from the router: rx is what the customer uploaded,
+    tx what they downloaded.
+
+    Returns:
+        List of {'id', 'username', 'rx_bytes', 'tx_bytes'}
+    """
+    traffic = []
+    for interface in interfaces:
+        match = PPP_INTERFACE_NAME.match(str(interface.get('name', '')))
+        if match:
+            traffic.append({
+                'id': interface.get('.id', ''),
+                'username': match.group(1),
+                'rx_bytes': int(interface.get('rx-byte', 0) or 0),
+                'tx_bytes': int(interface.get('tx-byte', 0) or 0),
+            })
+    return traffic
+
+
+def parse_uptime(uptime) -> int:
+    """
+    Convert a RouterOS uptime into seconds.
+
+    Handles ``1w2d3h4m5s`` as well as the ``2d03:04:05`` form of older
+    versions; anything unparseable counts as 0.
+    """
+    if isinstance(uptime, int):
+        return uptime
+    uptime = str(uptime or '')
+    seconds = 0
+    if ':' in uptime:
+        uptime, _, clock = uptime.rpartition('d') if 'd' in uptime else ('', '', uptime)
+        parts = [int(part) for part in clock.split(':') if part.isdigit()]
+        for part in parts:
+            seconds = seconds * 60 + part
+        uptime = f"{uptime}d" if uptime else ''
+    for value, unit in _UPTIME_PART.findall(uptime):
+        seconds += int(value) * _UPTIME_SECONDS[unit]
+    return seconds
+
 
 class MikroTikAPIService:
     """
     Service class for interacting with MikroTik routers via API.
     """
     
+    # Maximum number of .ids sent in a single bulk set/remove command
+    BULK_CHUNK_SIZE = 500
+    
     def __init__(self, router):
         """
         Initialize the API service with a router instance.
@@ -38,10 +98,20 @@ class MikroTikAPIService:
         self.router = router
         self.connection = None
         self.timeout = getattr(settings, 'MIKROTIK_API_TIMEOUT', 10)
+        self.breaker = RouterCircuitBreaker(router.id)
+        self.limiter = RouterRateLimiter(router)
+        # Seconds the last connect spent waiting in the rate limiter
+        self.limiter_wait = 0.0
     
     def connect_router(self) -> Tuple[bool, str]:
         """
-        Establish connection to the MikroTik router.
+        Borrow an authenticated session for the router from the connection pool.
+        
+        A new TCP connection and RouterOS login only happen when the pool has
+        no healthy idle session for this router. Routers whose circuit
+        breaker is open are rejected immediately instead of waiting for the
+        connect timeout. Sessions are admitted by the router's rate limiter,
+        which may make the caller wait.
         
         Returns:
             Tuple of (success: bool, message: str)
@@ -49,37 +119,65 @@ class MikroTikAPIService:
         if connect is None:
             return False, "librouteros library is not installed"
         
-        try:
-            self.connection = connect(
-                host=self.router.vpn_ip,
-                username=self.router.username,
-                password=self.router.password,
-                port=self.router.api_port,
-                timeout=self.timeout,
+        allowed, retry_after = self.breaker.allow_request()
+        if not allowed:
+            return False, (
+                f"Router {self.router.name} is unreachable (recent connection failures); "
+                f"retrying in {retry_after}s"
             )
+        
+        if not self.limiter.held:
+            try:
+                self.limiter_wait = self.limiter.acquire()
+            except RateLimitTimeout as e:
+                logger.warning(f"Router {self.router.name}: {str(e)}")
+                return False, str(e)
+        
+        try:
+            self.connection, is_new = get_connection_pool().acquire(self.router, self.timeout)
             
-            self.log_action('INFO', 'Connection established', 'Successfully connected to router')
+            self.breaker.record_success()
+            if is_new:
+                self.log_action('INFO', 'Connection established', 'Successfully connected to router')
             return True, "Connection successful"
             
+        except PoolExhausted as e:
+            self.limiter.release()
+            error_msg = str(e)
+            logger.warning(f"Router {self.router.name}: {error_msg}")
+            return False, error_msg
         except (RouterOSConnectionError, socket.timeout, socket.error) as e:
+            self.limiter.release()
             error_msg = f"Connection failed: {str(e)}"
+            self.breaker.record_failure(error_msg)
             self.log_action('ERROR', 'Connection failed', error_msg)
             logger.error(f"Router {self.router.name}: {error_msg}")
             return False, error_msg
         except Exception as e:
+            self.limiter.release()
             error_msg = f"Unexpected error: {str(e)}"
+            self.breaker.record_failure(error_msg)
             self.log_action('ERROR', 'Connection error', error_msg)
             logger.error(f"Router {self.router.name}: {error_msg}")
             return False, error_msg
     
-    def disconnect(self):
-        """Close the router connection."""
+    def disconnect(self, error: Optional[Exception] = None):
+        """
+        Return the session to the connection pool.
+        
+        Args:
+            error: Exception raised while the session was in use. Anything
+                   other than a RouterOS trap may leave the socket in an
+                   unknown state, so the session is closed instead of reused.
+        """
         if self.connection:
+            discard = error is not None and not isinstance(error, TrapError)
             try:
-                self.connection.close()
-                self.connection = None
+                get_connection_pool().release(self.router, self.connection, discard=discard)
             except Exception as e:
-                logger.warning(f"Error closing connection: {str(e)}")
+                logger.warning(f"Error releasing connection: {str(e)}")
+            self.connection = None
+        self.limiter.release()
     
     def __enter__(self):
         """Context manager entry."""
@@ -90,7 +188,7 @@ class MikroTikAPIService:
     
     def __exit__(self, exc_type, exc_val, exc_tb):
         """Context manager exit."""
-        self.disconnect()
+        self.disconnect(exc_val)
     
     def check_status(self) -> Tuple[bool, Dict]:
         """
@@ -137,8 +235,10 @@ class MikroTikAPIService:
             
         except Exception as e:
             error_msg = f"Error fetching system info: {str(e)}"
+            if not isinstance(e, TrapError):
+                self.breaker.record_failure(error_msg)
             self.log_action('ERROR', 'Status check failed', error_msg)
-            self.disconnect()
+            self.disconnect(e)
             return False, {'error': error_msg}
     
     def create_ppp_secret(self, username: str, password: str, profile: str, 
@@ -163,7 +263,7 @@ class MikroTikAPIService:
             ppp_secrets = self.connection.path('/ppp/secret')
             
             # Check if user already exists
-            existing = list(ppp_secrets.select('name').where('.id', username))
+            existing = list(ppp_secrets.select('.id').where(Key('name') == username))
             if existing:
                 self.disconnect()
                 return False, f"User {username} already exists on this router"
@@ -183,12 +283,12 @@ class MikroTikAPIService:
         except TrapError as e:
             error_msg = f"API error creating user: {str(e)}"
             self.log_action('ERROR', 'User creation failed', error_msg)
-            self.disconnect()
+            self.disconnect(e)
             return False, error_msg
         except Exception as e:
             error_msg = f"Error creating user: {str(e)}"
             self.log_action('ERROR', 'User creation error', error_msg)
-            self.disconnect()
+            self.disconnect(e)
             return False, error_msg
     
     def update_ppp_secret(self, username: str, **kwargs) -> Tuple[bool, str]:
@@ -210,7 +310,7 @@ class MikroTikAPIService:
             ppp_secrets = self.connection.path('/ppp/secret')
             
             # Find the secret
-            secrets = list(ppp_secrets.select('.id', 'name').where('name', username))
+            secrets = list(ppp_secrets.select('.id', 'name').where(Key('name') == username))
             if not secrets:
                 self.disconnect()
                 return False, f"User {username} not found on router"
@@ -227,7 +327,7 @@ class MikroTikAPIService:
         except Exception as e:
             error_msg = f"Error updating user: {str(e)}"
             self.log_action('ERROR', 'User update error', error_msg)
-            self.disconnect()
+            self.disconnect(e)
             return False, error_msg
     
     def delete_ppp_secret(self, username: str) -> Tuple[bool, str]:
@@ -248,7 +348,7 @@ class MikroTikAPIService:
             ppp_secrets = self.connection.path('/ppp/secret')
             
             # Find and remove the secret
-            secrets = list(ppp_secrets.select('.id', 'name').where('name', username))
+            secrets = list(ppp_secrets.select('.id', 'name').where(Key('name') == username))
             if not secrets:
                 self.disconnect()
                 return False, f"User {username} not found on router"
@@ -263,7 +363,7 @@ class MikroTikAPIService:
         except Exception as e:
             error_msg = f"Error deleting user: {str(e)}"
             self.log_action('ERROR', 'User deletion error', error_msg)
-            self.disconnect()
+            self.disconnect(e)
             return False, error_msg
     
     def disable_ppp_secret(self, username: str) -> Tuple[bool, str]:
@@ -320,41 +420,316 @@ class MikroTikAPIService:
         except Exception as e:
             error_msg = f"Error fetching active connections: {str(e)}"
             self.log_action('ERROR', 'Active connections fetch error', error_msg)
-            self.disconnect()
+            self.disconnect(e)
             return False, []
     
     def get_all_ppp_secrets(self) -> Tuple[bool, List[Dict]]:
         """
         Get all PPP secrets from the router.
         
+        Reuses the session already held by this service, so it can be
+        combined with the bulk methods inside one ``with`` block.
+        
         Returns:
             Tuple of (success: bool, secrets: list)
         """
-        success, message = self.connect_router()
-        if not success:
-            return False, []
+        owns_connection = self.connection is None
+        if owns_connection:
+            success, message = self.connect_router()
+            if not success:
+                return False, []
         
         try:
             ppp_secrets = self.connection.path('/ppp/secret')
             secrets = []
             
-            for secret in ppp_secrets:
+            for secret in ppp_secrets.select('.id', 'name', 'password', 'profile', 'service', 'disabled'):
                 secrets.append({
+                    'id': secret.get('.id', ''),
                     'name': secret.get('name', ''),
+                    'password': secret.get('password', ''),
                     'profile': secret.get('profile', ''),
                     'service': secret.get('service', ''),
-                    'disabled': secret.get('disabled', 'no') == 'yes',
+                    # librouteros already turns yes/no into booleans
+                    'disabled': secret.get('disabled') in (True, 'yes', 'true'),
                 })
             
-            self.disconnect()
+            if owns_connection:
+                self.disconnect()
             return True, secrets
             
         except Exception as e:
             error_msg = f"Error fetching PPP secrets: {str(e)}"
             self.log_action('ERROR', 'PPP secrets fetch error', error_msg)
+            if owns_connection:
+                self.disconnect(e)
+            return False, []
+    
+    def get_ppp_interface_traffic(self) -> Tuple[bool, List[Dict]]:
+        """
+        Get the byte counters of every PPP session with a single print.
+        
+        Returns:
+            Tuple of (success: bool, interfaces: list, see ppp_interface_traffic())
+        """
+        success, message = self.connect_router()
+        if not success:
+            return False, []
+        
+        try:
+            interfaces = self.connection.path('/interface').select('.id', 'name', 'rx-byte', 'tx-byte')
+            traffic = ppp_interface_traffic(interfaces)
             self.disconnect()
+            return True, traffic
+            
+        except Exception as e:
+            error_msg = f"Error fetching interface traffic: {str(e)}"
+            self.log_action('ERROR', 'Interface traffic fetch error', error_msg)
+            self.disconnect(e)
             return False, []
     
+    def _fetch_secret_ids(self, ppp_secrets) -> Dict[str, str]:
+        """Map every PPP secret name on the router to its .id with a single print."""
+        return {
+            # Numeric usernames come back as ints from librouteros
+            str(secret['name']): secret['.id']
+            for secret in ppp_secrets.select('.id', 'name')
+        }
+    
+    def _run_bulk(self, action: str, usernames: List[str], apply,
+                  secret_ids: Optional[Dict[str, str]] = None) -> Dict[str, Tuple[bool, str]]:
+        """
+        Run a batch of PPP secret changes over one session.
+        
+        Reuses the session already held by this service (e.g. inside a
+        ``with`` block) so several bulk calls can share one login.
+        
+        Args:
+            action: Short description used for logging (e.g. 'disable')
+            usernames: Usernames the batch applies to
+            apply: Callable(ppp_secrets, secret_ids, results) that performs
+                   the changes and fills in per-user results
+            secret_ids: Pre-fetched name -> .id map, fetched if omitted
+        
+        Returns:
+            Dict mapping username to (success: bool, message: str)
+        """
+        results: Dict[str, Tuple[bool, str]] = {}
+        if not usernames:
+            return results
+        
+        owns_connection = self.connection is None
+        if owns_connection:
+            success, message = self.connect_router()
+            if not success:
+                return {username: (False, message) for username in usernames}
+        
+        error = None
+        try:
+            ppp_secrets = self.connection.path('/ppp/secret')
+            if secret_ids is None:
+                secret_ids = self._fetch_secret_ids(ppp_secrets)
+            apply(ppp_secrets, secret_ids, results)
+        except Exception as e:
+            error = e
+            error_msg = f"Error during bulk {action}: {str(e)}"
+            self.log_action('ERROR', f'Bulk {action} error', error_msg)
+            logger.error(f"Router {self.router.name}: {error_msg}")
+            for username in usernames:
+                results.setdefault(username, (False, error_msg))
+        
+        if owns_connection:
+            self.disconnect(error)
+        
+        succeeded = sum(1 for ok, _ in results.values() if ok)
+        if succeeded:
+            self.log_action(
+                'SUCCESS', f'Bulk {action}',
+                f"Bulk {action}: {succeeded} of {len(usernames)} PPP secrets",
+                details={'succeeded': succeeded, 'failed': len(usernames) - succeeded},
+            )
+        return results
+    
+    @staticmethod
+    def _chunks(items: List, size: int):
+        for start in range(0, len(items), size):
+            yield items[start:start + size]
+    
+    def _set_many(self, ppp_secrets, secret_ids: Dict[str, str], usernames: List[str],
+                  fields: Dict, results: Dict[str, Tuple[bool, str]], success_msg: str):
+        """
+        Apply the same fields to many secrets with one ``set`` per chunk.
+        
+        RouterOS accepts a comma separated .id list; if a chunk is rejected
+        the chunk is retried user by user so one bad entry does not fail
+        the rest.
+        """
+        found = []
+        for username in usernames:
+            if username in secret_ids:
+                found.append(username)
+            else:
+                results[username] = (False, f"User {username} not found on router")
+        
+        for chunk in self._chunks(found, self.BULK_CHUNK_SIZE):
+            try:
+                ppp_secrets.update(**{'.id': ','.join(secret_ids[u] for u in chunk), **fields})
+                for username in chunk:
+                    results[username] = (True, success_msg.format(username=username))
+            except TrapError:
+                for username in chunk:
+                    try:
+                        ppp_secrets.update(**{'.id': secret_ids[username], **fields})
+                        results[username] = (True, success_msg.format(username=username))
+                    except TrapError as e:
+                        results[username] = (False, f"API error updating user: {str(e)}")
+    
+    def bulk_create_secrets(self, secrets: List[Dict],
+                            secret_ids: Optional[Dict[str, str]] = None) -> Dict[str, Tuple[bool, str]]:
+        """
+        Create many PPP secrets over one session.
+        
+        Args:
+            secrets: Dicts with 'name', 'password', 'profile' and optionally
+                     'service' (default 'any') and 'disabled'
+            secret_ids: Pre-fetched name -> .id map (optional)
+        
+        Returns:
+            Dict mapping username to (success: bool, message: str)
+        """
+        def apply(ppp_secrets, ids, results):
+            for secret in secrets:
+                username = secret['name']
+                if username in ids:
+                    results[username] = (False, f"User {username} already exists on this router")
+                    continue
+                fields = {'service': 'any', **secret}
+                try:
+                    ids[username] = ppp_secrets.add(**fields)
+                    results[username] = (True, f"User {username} created successfully")
+                except TrapError as e:
+                    results[username] = (False, f"API error creating user: {str(e)}")
+        
+        return self._run_bulk('create', [s['name'] for s in secrets], apply, secret_ids)
+    
+    def bulk_set_disabled(self, usernames: List[str], disabled: bool,
+                          secret_ids: Optional[Dict[str, str]] = None) -> Dict[str, Tuple[bool, str]]:
+        """
+        Enable or disable many PPP secrets over one session.
+        
+        Args:
+            usernames: Usernames to change
+            disabled: True to disable, False to enable
+            secret_ids: Pre-fetched name -> .id map (optional)
+        
+        Returns:
+            Dict mapping username to (success: bool, message: str)
+        """
+        usernames = list(usernames)
+        verb = 'disabled' if disabled else 'enabled'
+        
+        def apply(ppp_secrets, ids, results):
+            self._set_many(
+                ppp_secrets, ids, usernames, {'disabled': 'yes' if disabled else 'no'},
+                results, f"User {{username}} {verb} successfully",
+            )
+        
+        return self._run_bulk('disable' if disabled else 'enable', usernames, apply, secret_ids)
+    
+    def bulk_set_fields(self, usernames: List[str], fields: Dict,
+                        secret_ids: Optional[Dict[str, str]] = None) -> Dict[str, Tuple[bool, str]]:
+        """
+        Set the same fields (e.g. a new profile) on many PPP secrets over one session.
+        
+        Args:
+            usernames: Usernames to change
+            fields: Fields to set on every secret
+            secret_ids: Pre-fetched name -> .id map (optional)
+        
+        Returns:
+            Dict mapping username to (success: bool, message: str)
+        """
+        usernames = list(usernames)
+        
+        def apply(ppp_secrets, ids, results):
+            self._set_many(
+                ppp_secrets, ids, usernames, fields,
+                results, "User {username} updated successfully",
+            )
+        
+        return self._run_bulk('update', usernames, apply, secret_ids)
+    
+    def bulk_update_secrets(self, updates: Dict[str, Dict],
+                            secret_ids: Optional[Dict[str, str]] = None) -> Dict[str, Tuple[bool, str]]:
+        """
+        Update many PPP secrets over one session.
+        
+        Args:
+            updates: Dict mapping username to the fields to set
+                     (password, profile, disabled, ...)
+            secret_ids: Pre-fetched name -> .id map (optional)
+        
+        Returns:
+            Dict mapping username to (success: bool, message: str)
+        """
+        def apply(ppp_secrets, ids, results):
+            for username, fields in updates.items():
+                if username not in ids:
+                    results[username] = (False, f"User {username} not found on router")
+                    continue
+                try:
+                    ppp_secrets.update(**{'.id': ids[username], **fields})
+                    results[username] = (True, f"User {username} updated successfully")
+                except TrapError as e:
+                    results[username] = (False, f"API error updating user: {str(e)}")
+        
+        return self._run_bulk('update', list(updates), apply, secret_ids)
+    
+    def bulk_delete_secrets(self, usernames: List[str],
+                            secret_ids: Optional[Dict[str, str]] = None) -> Dict[str, Tuple[bool, str]]:
+        """
+        Delete many PPP secrets over one session.
+        
+        Args:
+            usernames: Usernames to delete
+            secret_ids: Pre-fetched name -> .id map (optional)
+        
+        Returns:
+            Dict mapping username to (success: bool, message: str)
+        """
+        usernames = list(usernames)
+        
+        def apply(ppp_secrets, ids, results):
+            found = []
+            for username in usernames:
+                if username in ids:
+                    found.append(username)
+                else:
+                    results[username] = (False, f"User {username} not found on router")
+            
+            for chunk in self._chunks(found, self.BULK_CHUNK_SIZE):
+                try:
+                    ppp_secrets.remove(*(ids[u] for u in chunk))
+                    deleted = chunk
+                except TrapError:
+                    # The chunk may have stopped partway; what it already
+                    # removed is gone now, which is what was asked for
+                    deleted = []
+                    for username in chunk:
+                        try:
+                            ppp_secrets.remove(ids[username])
+                            deleted.append(username)
+                        except TrapError as e:
+                            if 'no such item' in str(e).lower():
+                                deleted.append(username)
+                            else:
+                                results[username] = (False, f"API error deleting user: {str(e)}")
+                for username in deleted:
+                    ids.pop(username, None)
+                    results[username] = (True, f"User {username} deleted successfully")
+        
+        return self._run_bulk('delete', usernames, apply, secret_ids)
+    
     def create_ppp_profile(self, name: str, local_address: str, 
                           remote_address: str, rate_limit: str = '') -> Tuple[bool, str]:
         """
@@ -377,7 +752,7 @@ class MikroTikAPIService:
             ppp_profiles = self.connection.path('/ppp/profile')
             
             # Check if profile exists
-            existing = list(ppp_profiles.select('name').where('name', name))
+            existing = list(ppp_profiles.select('.id').where(Key('name') == name))
             if existing:
                 self.disconnect()
                 return False, f"Profile {name} already exists"
@@ -401,13 +776,87 @@ class MikroTikAPIService:
         except Exception as e:
             error_msg = f"Error creating profile: {str(e)}"
             self.log_action('ERROR', 'Profile creation error', error_msg)
+            self.disconnect(e)
+            return False, error_msg
+    
+    def start_import(self, file_name: str) -> Tuple[bool, str]:
+        """
+        Run /import on a script file in the background.
+        
+        The import is started with /execute, so a long script does not hit
+        the API timeout; have the script log a marker and wait for it with
+        has_log_message().
+        
+        Args:
+            file_name: Name of the uploaded .rsc file
+        
+        Returns:
+            Tuple of (success: bool, message: str)
+        """
+        success, message = self.connect_router()
+        if not success:
+            return False, message
+        
+        try:
+            tuple(self.connection('/execute', script=f'/import file-name="{file_name}" verbose=no'))
+            self.log_action('INFO', 'Script import started', f"Importing {file_name}")
+            self.disconnect()
+            return True, f"Import of {file_name} started"
+            
+        except Exception as e:
+            error_msg = f"Error starting import: {str(e)}"
+            self.log_action('ERROR', 'Script import error', error_msg)
+            self.disconnect(e)
+            return False, error_msg
+    
+    def has_log_message(self, message: str) -> Tuple[bool, bool]:
+        """
+        Check whether the router's log contains an exact message.
+        
+        Returns:
+            Tuple of (success: bool, found: bool)
+        """
+        success, error_msg = self.connect_router()
+        if not success:
+            return False, False
+        
+        try:
+            found = any(True for _ in self.connection.path('/log').select('.id').where(Key('message') == message))
+            self.disconnect()
+            return True, found
+            
+        except Exception as e:
+            logger.error(f"Router {self.router.name}: error reading log: {str(e)}")
+            self.disconnect(e)
+            return False, False
+    
+    def remove_file(self, file_name: str) -> Tuple[bool, str]:
+        """Delete a file from the router's storage."""
+        success, message = self.connect_router()
+        if not success:
+            return False, message
+        
+        try:
+            files = self.connection.path('/file')
+            ids = [row['.id'] for row in files.select('.id').where(Key('name') == file_name)]
+            if ids:
+                files.remove(*ids)
             self.disconnect()
+            return True, f"File {file_name} removed"
+            
+        except Exception as e:
+            error_msg = f"Error removing file: {str(e)}"
+            self.log_action('ERROR', 'File removal error', error_msg)
+            self.disconnect(e)
             return False, error_msg
     
     def log_action(self, log_type: str, action: str, message: str, details: Dict = None):
         """
         Log an action to the RouterLog model.
         
+        Entries are buffered and written in batches (see log_buffer), and
+        may be sampled according to ROUTER_LOG_SAMPLING.
+        
         Args:
             log_type: Type of log (INFO, WARNING, ERROR, SUCCESS)
             action: Action description
@@ -415,13 +864,7 @@ class MikroTikAPIService:
             details: Additional details as dict
         """
         try:
-            RouterLog.objects.create(
-                router=self.router,
-                log_type=log_type,
-                action=action,
-                message=message,
-                details=details,
-            )
+            get_log_buffer().add(self.router, log_type, action, message, details)
         except Exception as e:
             logger.error(f"Failed to create router log: {str(e)}")
 
@@ -0,0 +1,369 @@
+"""
+Per-router outbox of PPP secret changes.
+
+Views, payments and tasks enqueue RouterCommand rows instead of calling
+the router directly. Commands for the same user are coalesced when queued
+(the last enable/disable wins, repeated updates are merged) and replayed
+in order over a single API session by the replay_router_commands task,
+which also runs when a router comes back online.
+
+Only one replay runs per router at a time (REPLAY_LOCK_KEY). A replay
+claims the pending commands by moving them to SENDING, so commands queued
+meanwhile are never coalesced into ones already being sent; they stay
+PENDING for the next replay.
+"""
+import logging
+import uuid
+from collections import defaultdict
+from datetime import timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from routers.models import RouterCommand
+from routers.services.mikrotik_api import MikroTikAPIService
+from routers.services.reconciler import mark_router_dirty
+
+logger = logging.getLogger(__name__)
+
+SCHEDULED_KEY = 'router:outbox:scheduled:{router_id}'
+REPLAY_LOCK_KEY = 'router:outbox:replay:{router_id}'
+
+# Longest a replay may hold its router; SENDING commands older than this
+# belong to a replay that died and are handed back to PENDING
+REPLAY_TIMEOUT = 900
+
+CREATE = 'CREATE'
+UPDATE = 'UPDATE'
+ENABLE = 'ENABLE'
+DISABLE = 'DISABLE'
+DELETE = 'DELETE'
+
+
+def _coalesce(pending: List[RouterCommand], action: str,
+              payload: Dict) -> Tuple[List[RouterCommand], List[RouterCommand], bool]:
+    """
+    Fold a new command into the user's pending commands.
+
+    Args:
+        pending: The user's pending commands, oldest first
+        action: Action of the new command
+        payload: Payload of the new command
+
+    Returns:
+        Tuple of (commands to supersede, commands to save, queue new command)
+    """
+    create = next((c for c in reversed(pending) if c.action == CREATE), None)
+
+    if action == DELETE:
+        return pending, [], True
+
+    if action == CREATE:
+        # A pending delete still has to run first, everything else is moot
+        return [c for c in pending if c.action != DELETE], [], True
+
+    if action in (ENABLE, DISABLE):
+        if create is not None:
+            create.payload['disabled'] = 'yes' if action == DISABLE else 'no'
+            return [], [create], False
+        return [c for c in pending if c.action in (ENABLE, DISABLE)], [], True
+
+    # UPDATE: merge into a pending create or update, later values win
+    target = create or next((c for c in reversed(pending) if c.action == UPDATE), None)
+    if target is not None:
+        target.payload.update(payload)
+        return [], [target], False
+    return [], [], True
+
+
+def enqueue_commands(router, usernames: Iterable[str], action: str,
+                     payload: Optional[Dict] = None, user=None) -> int:
+    """
+    Queue the same command for many users of one router.
+
+    Args:
+        router: Router model instance
+        usernames: PPP secret names
+        action: One of CREATE, UPDATE, ENABLE, DISABLE, DELETE
+        payload: Secret fields for CREATE/UPDATE (password, profile, ...)
+        user: Admin user who caused the change
+
+    Returns:
+        Number of new RouterCommand rows
+    """
+    usernames = list(dict.fromkeys(usernames))
+    if not usernames:
+        return 0
+    payload = payload or {}
+
+    with transaction.atomic():
+        # Only unclaimed commands are coalesced; SENDING ones are in flight
+        pending = defaultdict(list)
+        for command in (RouterCommand.objects.select_for_update()
+                        .filter(router=router, status='PENDING', username__in=usernames)
+                        .order_by('created_at', 'id')):
+            pending[command.username].append(command)
+
+        superseded, changed, created = [], {}, []
+        now = timezone.now()
+        for username in usernames:
+            drop, save, queue = _coalesce(pending[username], action, dict(payload))
+            superseded.extend(drop)
+            for command in save:
+                changed[command.pk] = command
+            if queue:
+                created.append(RouterCommand(
+                    router=router, username=username, action=action,
+                    payload=dict(payload), created_by=user, created_at=now,
+                ))
+
+        if superseded:
+            RouterCommand.objects.filter(pk__in=[c.pk for c in superseded]).update(
+                status='SUPERSEDED', processed_at=now,
+            )
+        if changed:
+            RouterCommand.objects.bulk_update(changed.values(), ['payload'])
+        RouterCommand.objects.bulk_create(created)
+        schedule_replay(router.id)
+
+    return len(created)
+
+
+def enqueue_command(router, username: str, action: str,
+                    payload: Optional[Dict] = None, user=None) -> int:
+    """Queue a command for one user; see enqueue_commands()."""
+    return enqueue_commands(router, [username], action, payload, user)
+
+
+def schedule_replay(router_id):
+    """
+    Queue a replay once the current transaction commits.
+
+    Several enqueues in a row schedule a single task; the flag is cleared
+    when the task starts so later commands schedule another run.
+    """
+    def send():
+        if not cache.add(SCHEDULED_KEY.format(router_id=router_id), 1, timeout=60):
+            return
+        try:
+            from routers.tasks import replay_router_commands
+            # Fail fast: a broker outage must not stall the request
+            replay_router_commands.apply_async(args=[str(router_id)], retry=False, ignore_result=True)
+        except Exception as e:
+            # The periodic replay picks the commands up later
+            cache.delete(SCHEDULED_KEY.format(router_id=router_id))
+            logger.warning(f"Could not schedule command replay for router {router_id}: {str(e)}")
+
+    transaction.on_commit(send)
+
+
+def _waves(commands: List[RouterCommand]) -> List[List[RouterCommand]]:
+    """
+    Split commands into waves holding at most one command per user.
+
+    Running the waves in order keeps each user's commands in order while
+    commands of different users in the same wave are sent in bulk.
+    """
+    per_user = defaultdict(list)
+    for command in commands:
+        per_user[command.username].append(command)
+
+    waves = []
+    depth = max((len(queue) for queue in per_user.values()), default=0)
+    for index in range(depth):
+        waves.append([queue[index] for queue in per_user.values() if len(queue) > index])
+    return waves
+
+
+def _run_wave(api: MikroTikAPIService, wave: List[RouterCommand], secret_ids: Dict[str, str],
+              results: Dict[int, Tuple[bool, str]]):
+    """
+    Send one wave grouped by action, filling results keyed by command pk.
+
+    Raises RuntimeError when the session broke, so the remaining commands
+    stay pending instead of being marked failed.
+    """
+    by_action = defaultdict(list)
+    for command in wave:
+        by_action[command.action].append(command)
+
+    def collect(commands, outcome, missing_ok=False):
+        for command in commands:
+            ok, message = outcome.get(command.username, (False, 'No result'))
+            if not ok and message.startswith('Error during bulk'):
+                # Raised by the session itself, not a rejection of this command
+                raise RuntimeError(message)
+            if not ok and missing_ok and 'not found' in message:
+                ok = True
+            results[command.pk] = (ok, message)
+
+    deletes = by_action.get(DELETE, [])
+    if deletes:
+        outcome = api.bulk_delete_secrets([c.username for c in deletes], secret_ids)
+        collect(deletes, outcome, missing_ok=True)
+
+    creates = by_action.get(CREATE, [])
+    existing = [c for c in creates if c.username in secret_ids]
+    new = [c for c in creates if c.username not in secret_ids]
+    if new:
+        outcome = api.bulk_create_secrets([{'name': c.username, **c.payload} for c in new], secret_ids)
+        collect(new, outcome)
+
+    # Creating a secret that already exists just brings it up to date
+    updates = existing + by_action.get(UPDATE, [])
+    if updates:
+        outcome = api.bulk_update_secrets({c.username: c.payload for c in updates}, secret_ids)
+        collect(updates, outcome)
+
+    for action, disabled in ((ENABLE, False), (DISABLE, True)):
+        commands = by_action.get(action, [])
+        if commands:
+            outcome = api.bulk_set_disabled([c.username for c in commands], disabled, secret_ids)
+            collect(commands, outcome)
+
+
+def replay_commands(router) -> Dict:
+    """
+    Apply all pending commands of a router over one session.
+
+    Commands the router rejects are marked FAILED and the router is
+    flagged for reconciliation. If the router cannot be reached the
+    commands stay PENDING for the next attempt.
+
+    Returns:
+        Dict with done/failed/pending counts, or skipped when another
+        replay of the router is running
+    """
+    lock_key = REPLAY_LOCK_KEY.format(router_id=router.id)
+    token = uuid.uuid4().hex
+    if not cache.add(lock_key, token, timeout=REPLAY_TIMEOUT):
+        return {'router': router.name, 'skipped': True}
+    try:
+        cache.delete(SCHEDULED_KEY.format(router_id=router.id))
+        stats = _replay_claimed(router)
+    finally:
+        if cache.get(lock_key) == token:
+            cache.delete(lock_key)
+
+    # Commands queued during the replay found the lock taken
+    if RouterCommand.objects.filter(router=router, status='PENDING').exists():
+        schedule_replay(router.id)
+    return stats
+
+
+def _claim_commands(router) -> List[RouterCommand]:
+    """Move the router's pending commands to SENDING and return them, oldest first."""
+    now = timezone.now()
+    with transaction.atomic():
+        # Left behind by a replay that died
+        RouterCommand.objects.filter(
+            router=router, status='SENDING', processed_at__lt=now - timedelta(seconds=REPLAY_TIMEOUT),
+        ).update(status='PENDING', processed_at=None)
+        # Waits for enqueue_commands() to finish coalescing into these rows
+        commands = list(
+            RouterCommand.objects.select_for_update()
+            .filter(router=router, status='PENDING').order_by('created_at', 'id')
+        )
+        # processed_at holds the claim time while SENDING
+        RouterCommand.objects.filter(pk__in=[c.pk for c in commands]).update(
+            status='SENDING', processed_at=now,
+        )
+    for command in commands:
+        command.status = 'SENDING'
+    return commands
+
+
+def _release_commands(commands: List[RouterCommand], message: str):
+    """Hand claimed commands back to PENDING for the next replay."""
+    RouterCommand.objects.filter(pk__in=[c.pk for c in commands], status='SENDING').update(
+        status='PENDING', processed_at=None, last_error=message,
+    )
+
+
+def _replay_claimed(router) -> Dict:
+    commands = _claim_commands(router)
+    if not commands:
+        return {'router': router.name, 'done': 0, 'failed': 0, 'pending': 0}
+
+    api = MikroTikAPIService(router)
+    success, message = api.connect_router()
+    if not success:
+        _release_commands(commands, message)
+        logger.info(f"Router {router.name}: {len(commands)} commands waiting ({message})")
+        return {'router': router.name, 'done': 0, 'failed': 0, 'pending': len(commands), 'error': message}
+
+    results: Dict[int, Tuple[bool, str]] = {}
+    error = None
+    try:
+        fetched, secrets = api.get_all_ppp_secrets()
+        if not fetched:
+            raise RuntimeError('Could not read /ppp/secret')
+        secret_ids = {secret['name']: secret['id'] for secret in secrets}
+
+        for wave in _waves(commands):
+            _run_wave(api, wave, secret_ids, results)
+    except Exception as e:
+        error = e
+        logger.error(f"Router {router.name}: command replay interrupted: {str(e)}")
+    finally:
+        api.disconnect(error)
+
+    now = timezone.now()
+    done = failed = 0
+    for command in commands:
+        command.attempts += 1
+        if command.pk not in results:
+            # Not reached before the session broke; retry next time
+            command.status = 'PENDING'
+            command.last_error = str(error) if error else ''
+            command.processed_at = None
+            continue
+        ok, result_message = results[command.pk]
+        command.status = 'DONE' if ok else 'FAILED'
+        command.last_error = '' if ok else result_message
+        command.processed_at = now
+        if ok:
+            done += 1
+        else:
+            failed += 1
+
+    with transaction.atomic():
+        # Only rows still claimed by this replay are written
+        claimed = set(
+            RouterCommand.objects.select_for_update()
+            .filter(pk__in=[c.pk for c in commands], status='SENDING')
+            .values_list('pk', flat=True)
+        )
+        RouterCommand.objects.bulk_update(
+            [c for c in commands if c.pk in claimed],
+            ['status', 'attempts', 'last_error', 'processed_at'], batch_size=500,
+        )
+
+    if failed:
+        mark_router_dirty(router.id)
+        api.log_action(
+            'WARNING', 'Command replay',
+            f"{failed} of {len(commands)} queued commands were rejected by the router",
+        )
+
+    stats = {
+        'router': router.name,
+        'done': done,
+        'failed': failed,
+        'pending': len(commands) - done - failed,
+    }
+    logger.info(f"Router {router.name}: replayed commands {stats}")
+    return stats
+
+
+def purge_processed_commands() -> int:
+    """Delete processed commands older than ROUTER_OUTBOX_RETENTION_DAYS."""
+    days = getattr(settings, 'ROUTER_OUTBOX_RETENTION_DAYS', 7)
+    cutoff = timezone.now() - timedelta(days=days)
+    deleted, _ = RouterCommand.objects.filter(
+        status__in=['DONE', 'SUPERSEDED', 'FAILED'], processed_at__lt=cutoff,
+    ).delete()
+    return deleted
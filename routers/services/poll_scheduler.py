@@ -0,0 +1,208 @@
+"""
+Adaptive scheduling of router status probes.
+
+Instead of probing every router at the same moment every few minutes, each
+router carries its own next-due time and interval in the cache. A beat
+task runs every ROUTER_POLL_TICK seconds, picks the routers that fall due
+before the next tick and dispatches their probes with countdowns spread
+over the tick, so the load on the workers and the VPN concentrator stays
+flat.
+
+The interval adapts to the router's recent history:
+    - a router that failed its last probe or flapped recently is probed
+      every ROUTER_POLL_MIN_INTERVAL seconds;
+    - a router that has answered HISTORY_LENGTH probes in a row is probed
+      every ROUTER_POLL_MAX_INTERVAL seconds;
+    - anything else is probed every ROUTER_CHECK_INTERVAL seconds.
+Each next-due time gets +/- ROUTER_POLL_JITTER of the interval so routers
+added together drift apart.
+
+A router already known to be online that another API call reached within
+half its interval (see RouterCircuitBreaker.last_successes()) is not
+probed; the call counts as a successful probe.
+
+Queue depth and lag of each tick are kept under METRICS_KEY, see
+get_metrics().
+"""
+import logging
+import random
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from routers.services.circuit_breaker import RouterCircuitBreaker
+
+logger = logging.getLogger(__name__)
+
+STATE_KEY = 'router:poll:{router_id}'
+METRICS_KEY = 'router:poll:metrics'
+
+# Probe outcomes remembered per router
+HISTORY_LENGTH = 6
+
+
+class PollScheduler:
+    """Per-router probe intervals and due times kept in the cache."""
+
+    def __init__(self):
+        self.base_interval = getattr(settings, 'ROUTER_CHECK_INTERVAL', 300)
+        self.min_interval = getattr(settings, 'ROUTER_POLL_MIN_INTERVAL', 60)
+        self.max_interval = getattr(settings, 'ROUTER_POLL_MAX_INTERVAL', 900)
+        self.jitter = getattr(settings, 'ROUTER_POLL_JITTER', 0.1)
+        self.tick = getattr(settings, 'ROUTER_POLL_TICK', 60)
+
+    def _key(self, router_id) -> str:
+        return STATE_KEY.format(router_id=router_id)
+
+    def _timeout(self) -> int:
+        # Outlive the longest interval so a stable router keeps its state
+        return self.max_interval * 4
+
+    def _new_state(self) -> Dict:
+        return {'history': [], 'interval': self.base_interval, 'next_due': 0,
+                'dispatched_at': None, 'checked_at': None}
+
+    def get_states(self, router_ids: Iterable) -> Dict[str, Dict]:
+        """Stored states by router id (routers never scheduled are left out)."""
+        keys = {self._key(router_id): str(router_id) for router_id in router_ids}
+        return {keys[key]: state for key, state in cache.get_many(list(keys)).items()}
+
+    def next_interval(self, history: List[bool]) -> int:
+        """Seconds until the next probe, given the outcomes of the last probes."""
+        if not history:
+            return self.base_interval
+        flaps = sum(1 for previous, current in zip(history, history[1:]) if previous != current)
+        if flaps or not history[-1]:
+            return self.min_interval
+        if len(history) >= HISTORY_LENGTH:
+            return self.max_interval
+        return self.base_interval
+
+    def _jittered(self, interval: float) -> float:
+        return interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def _with_result(self, state: Optional[Dict], online: bool, now: float) -> Dict:
+        state = dict(state or self._new_state())
+        state['history'] = (state['history'] + [online])[-HISTORY_LENGTH:]
+        state['interval'] = self.next_interval(state['history'])
+        state['next_due'] = now + self._jittered(state['interval'])
+        state['dispatched_at'] = None
+        state['checked_at'] = now
+        return state
+
+    def record_result(self, router_id, online: bool, now: Optional[float] = None):
+        """
+        Schedule the next probe of a router after a status check.
+
+        Args:
+            router_id: Router primary key
+            online: Whether the router answered
+            now: Time of the check (defaults to now)
+        """
+        now = now or time.time()
+        key = self._key(router_id)
+        cache.set(key, self._with_result(cache.get(key), online, now), timeout=self._timeout())
+
+    def record_results(self, results: Dict, now: Optional[float] = None):
+        """record_result() for many routers ({router_id: online}) with two cache calls."""
+        now = now or time.time()
+        states = self.get_states(results)
+        cache.set_many(
+            {self._key(router_id): self._with_result(states.get(str(router_id)), online, now)
+             for router_id, online in results.items()},
+            timeout=self._timeout(),
+        )
+
+    def plan(self, routers: Iterable[Tuple[object, str]], now: Optional[float] = None
+             ) -> Tuple[List[Tuple[str, float]], Dict]:
+        """
+        Pick the routers to probe during the next tick.
+
+        Routers picked are marked as dispatched and get a provisional
+        next-due time one base interval away, so a probe that is lost is
+        retried instead of the router dropping out of the schedule.
+
+        Args:
+            routers: (router id, stored status) of every active router
+            now: Current time (defaults to now)
+
+        Returns:
+            Tuple of ([(router_id, countdown_seconds)], metrics dict)
+        """
+        now = now or time.time()
+        routers = [(str(router_id), status) for router_id, status in routers]
+        router_ids = [router_id for router_id, _ in routers]
+        states = self.get_states(router_ids)
+        last_successes = RouterCircuitBreaker.last_successes(router_ids)
+
+        due: List[Tuple[str, float]] = []
+        updates: Dict[str, Dict] = {}
+        lags: List[float] = []
+        confirmed = in_flight = 0
+        horizon = now + self.tick
+
+        for router_id, status in routers:
+            state = states.get(router_id)
+            if state is None:
+                # Never scheduled: spread new routers over the tick
+                state, countdown = self._new_state(), random.uniform(0, self.tick)
+            else:
+                if state['dispatched_at'] and state['next_due'] > now:
+                    in_flight += 1
+                if state['next_due'] > horizon:
+                    continue
+
+                last_success = last_successes.get(router_id)
+                if (status == 'ONLINE' and state['history'][-1:] == [True]
+                        and last_success and now - last_success < state['interval'] / 2):
+                    # Reached by another API call recently, no need to ask again
+                    updates[self._key(router_id)] = self._with_result(state, True, now)
+                    confirmed += 1
+                    continue
+
+                lag = now - state['next_due']
+                if lag > 0:
+                    # Overdue: spread the backlog over the tick instead of sending it at once
+                    lags.append(lag)
+                    countdown = random.uniform(0, self.tick)
+                else:
+                    countdown = -lag
+
+            state = dict(state)
+            state['dispatched_at'] = now
+            state['next_due'] = now + countdown + self.base_interval
+            updates[self._key(router_id)] = state
+            due.append((router_id, round(countdown, 1)))
+
+        if updates:
+            cache.set_many(updates, timeout=self._timeout())
+
+        metrics = {
+            'at': now,
+            'routers': len(routers),
+            'dispatched': len(due),
+            'queue_depth': len(lags),
+            'in_flight': in_flight,
+            'confirmed': confirmed,
+            'max_lag': round(max(lags), 1) if lags else 0,
+            'avg_lag': round(sum(lags) / len(lags), 1) if lags else 0,
+        }
+        cache.set(METRICS_KEY, metrics, timeout=self.tick * 10)
+        return due, metrics
+
+
+def get_metrics() -> Dict:
+    """
+    Metrics of the last scheduler tick.
+
+    Returns:
+        Dict with at (timestamp of the tick), routers (active routers),
+        dispatched (probes sent), queue_depth (routers that were overdue),
+        in_flight (probes sent earlier still without a result), confirmed
+        (probes skipped thanks to a recent API call) and max_lag/avg_lag
+        (seconds overdue routers waited past their due time). Empty if the
+        scheduler has not run recently.
+    """
+    return cache.get(METRICS_KEY) or {}
@@ -0,0 +1,123 @@
+"""
+Rollout of billing profiles to the /ppp/profile table of every router.
+
+A rollout reads /ppp/profile once per router and only adds the profiles
+that are missing and sets the attributes that differ, so running it again
+changes nothing. All routers are handled concurrently through the async
+fan-out; progress and per-router results are kept in the cache under the
+rollout id while it runs (see get_rollout()).
+"""
+import logging
+import uuid
+from typing import Dict, Iterable, Optional
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from routers.services.async_api import iter_fan_out
+
+logger = logging.getLogger(__name__)
+
+ROLLOUT_KEY = 'router:profile-rollout:{rollout_id}'
+ROLLOUT_TIMEOUT = 86400
+
+# /ppp/profile attributes set from a billing Profile; others are left to the router
+MANAGED_ATTRIBUTES = ['rate-limit']
+
+
+def desired_profile(profile) -> Dict[str, str]:
+    """Managed /ppp/profile attributes of a billing Profile."""
+    return {
+        'rate-limit': profile.rate_limit or f"{profile.upload_speed}/{profile.download_speed}",
+    }
+
+
+def new_rollout_id() -> str:
+    """Id under which a rollout reports its progress."""
+    return uuid.uuid4().hex
+
+
+def get_rollout(rollout_id: str) -> Optional[Dict]:
+    """
+    Progress of a rollout.
+
+    Returns:
+        Dict with profiles, total, done, failed, started_at, finished_at
+        and results (router name -> {'created', 'updated', 'unchanged'} or
+        {'error'}), or None for an unknown or expired rollout
+    """
+    return cache.get(ROLLOUT_KEY.format(rollout_id=rollout_id))
+
+
+async def _apply_profiles(api, desired: Dict[str, Dict[str, str]]) -> Dict:
+    """Add or update the desired profiles on one router over a single session."""
+    stats = {'created': [], 'updated': [], 'unchanged': 0}
+    async with api:
+        connection = api.connection
+        existing = {
+            row['name']: row
+            for row in await connection.print('/ppp/profile', '.id', 'name', *MANAGED_ATTRIBUTES)
+        }
+        for name, attributes in desired.items():
+            row = existing.get(name)
+            if row is None:
+                await connection.command('/ppp/profile/add', name=name, **attributes)
+                stats['created'].append(name)
+                continue
+            changes = {
+                key: value for key, value in attributes.items()
+                if str(row.get(key, '')) != value
+            }
+            if changes:
+                await connection.command('/ppp/profile/set', **{'.id': row['.id'], **changes})
+                stats['updated'].append(name)
+            else:
+                stats['unchanged'] += 1
+    return stats
+
+
+def rollout_profiles(profiles: Iterable, routers: Iterable,
+                     rollout_id: Optional[str] = None) -> Dict:
+    """
+    Push profiles to many routers concurrently.
+
+    Args:
+        profiles: Profile model instances
+        routers: Router model instances
+        rollout_id: Key for progress reporting (see get_rollout())
+
+    Returns:
+        Final progress dict (see get_rollout())
+    """
+    desired = {profile.get_mikrotik_profile_name(): desired_profile(profile) for profile in profiles}
+    routers = list(routers) if desired else []
+    key = ROLLOUT_KEY.format(rollout_id=rollout_id or new_rollout_id())
+
+    progress = {
+        'profiles': sorted(desired),
+        'total': len(routers),
+        'done': 0,
+        'failed': 0,
+        'started_at': timezone.now().isoformat(),
+        'finished_at': None,
+        'results': {},
+    }
+    cache.set(key, progress, timeout=ROLLOUT_TIMEOUT)
+
+    for outcome in iter_fan_out(routers, lambda api: _apply_profiles(api, desired)):
+        progress['done'] += 1
+        if outcome.error is None:
+            progress['results'][outcome.router.name] = outcome.result
+        else:
+            progress['failed'] += 1
+            progress['results'][outcome.router.name] = {'error': outcome.error}
+        cache.set(key, progress, timeout=ROLLOUT_TIMEOUT)
+
+    progress['finished_at'] = timezone.now().isoformat()
+    cache.set(key, progress, timeout=ROLLOUT_TIMEOUT)
+    logger.info(
+        f"Profile rollout of {', '.join(progress['profiles'])}: "
+        f"{progress['done'] - progress['failed']}/{progress['total']} routers updated, "
+        f"{progress['failed']} failed"
+    )
+    return progress
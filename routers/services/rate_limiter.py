@@ -0,0 +1,215 @@
+"""
+Per-router rate limit and concurrency cap shared across processes.
+
+Every session opened by MikroTikAPIService or AsyncMikroTikAPIService
+first passes the router's limiter:
+
+    rate: a token bucket (kept as a GCRA theoretical arrival time in the
+          cache) admits ``rate`` sessions per second with bursts of up to
+          ``burst``. Callers reserve their slot in time under a short
+          cache lock, so they are admitted in the order they arrived
+          instead of racing each other.
+    concurrency: at most ``concurrency`` sessions are open at once; each
+          holds one of that many leased cache keys, which expire on their
+          own if a process dies without releasing them.
+
+Limits come from ROUTER_RATE_LIMITS, keyed by router model: the longest
+key the router's model (board name) starts with wins, falling back to
+'default'. The time spent waiting is returned to the caller and counted
+per router (see get_stats()).
+"""
+import asyncio
+import logging
+import time
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LIMITS = {'rate': 20, 'burst': 10, 'concurrency': 4}
+
+# How long one process may hold the reservation lock
+LOCK_TIMEOUT = 2
+
+# Seconds between attempts to take the reservation lock
+LOCK_POLL_INTERVAL = 0.005
+
+# Seconds between attempts to get a free concurrency slot
+SLOT_POLL_INTERVAL = 0.05
+
+
+class RateLimitTimeout(Exception):
+    """The router's limiter did not admit the caller in time."""
+
+
+def limits_for(router) -> Dict:
+    """Rate, burst and concurrency limits for a router's model."""
+    configured = getattr(settings, 'ROUTER_RATE_LIMITS', {})
+    model = (router.router_model or '').lower()
+    matches = [key for key in configured if key != 'default' and model.startswith(key.lower())]
+    limits = dict(DEFAULT_LIMITS)
+    limits.update(configured.get('default', {}))
+    if matches:
+        limits.update(configured[max(matches, key=len)])
+    return limits
+
+
+def _incr(key: str, delta: int = 1):
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        if not cache.add(key, delta, timeout=None):
+            cache.incr(key, delta)
+
+
+def get_stats(router_id) -> Dict:
+    """
+    Limiter counters of a router.
+
+    Returns:
+        Dict with acquired (sessions admitted), timeouts (callers turned
+        away), wait_seconds (total time spent waiting) and avg_wait
+    """
+    prefix = f"router:limit:stats:{router_id}"
+    values = cache.get_many([f"{prefix}:acquired", f"{prefix}:timeouts", f"{prefix}:wait_ms"])
+    acquired = values.get(f"{prefix}:acquired", 0)
+    wait_seconds = values.get(f"{prefix}:wait_ms", 0) / 1000
+    return {
+        'acquired': acquired,
+        'timeouts': values.get(f"{prefix}:timeouts", 0),
+        'wait_seconds': round(wait_seconds, 3),
+        'avg_wait': round(wait_seconds / acquired, 3) if acquired else 0,
+    }
+
+
+class RouterRateLimiter:
+    """Limiter for one router; acquire() before opening a session, release() after."""
+
+    def __init__(self, router):
+        """
+        Args:
+            router: Router model instance
+        """
+        limits = limits_for(router)
+        self.router_id = str(router.id)
+        self.interval = 1 / limits['rate']
+        self.burst = max(int(limits['burst']), 1)
+        self.concurrency = max(int(limits['concurrency']), 1)
+        self.timeout = getattr(settings, 'ROUTER_RATE_LIMIT_TIMEOUT', 30)
+        self.lease = getattr(settings, 'ROUTER_RATE_LIMIT_SLOT_LEASE', 600)
+        self.tat_key = f"router:limit:tat:{self.router_id}"
+        self.lock_key = f"router:limit:lock:{self.router_id}"
+        self.stats_prefix = f"router:limit:stats:{self.router_id}"
+        self.slot: Optional[str] = None
+
+    @property
+    def held(self) -> bool:
+        return self.slot is not None
+
+    def _take(self, timeout: float) -> Optional[float]:
+        """
+        Reserve the next admission time; the caller holds the reservation lock.
+
+        Returns the seconds to wait for it, or None if that is longer than
+        ``timeout``: a caller about to give up reserves nothing, so it does
+        not delay the callers queued behind it.
+        """
+        now = time.time()
+        tat = max(cache.get(self.tat_key) or now, now)
+        # Up to `burst` callers may be admitted ahead of the steady rate
+        delay = max(tat - (self.burst - 1) * self.interval - now, 0)
+        if delay > timeout:
+            return None
+        # Kept at least as long as the queue of reservations ahead
+        cache.set(self.tat_key, tat + self.interval, timeout=int(tat - now) + 60)
+        return delay
+
+    def _reserve(self, started: float, timeout: float) -> Optional[float]:
+        """Take the next admission time under the reservation lock (see _take())."""
+        # A dead holder's lock expires on its own after LOCK_TIMEOUT
+        while not cache.add(self.lock_key, 1, timeout=LOCK_TIMEOUT):
+            if time.monotonic() - started > timeout:
+                self._timed_out(started)
+            time.sleep(LOCK_POLL_INTERVAL)
+        try:
+            return self._take(timeout - (time.monotonic() - started))
+        finally:
+            cache.delete(self.lock_key)
+
+    async def _reserve_async(self, started: float, timeout: float) -> Optional[float]:
+        """_reserve() for asyncio code; waits for the lock without blocking the event loop."""
+        while not cache.add(self.lock_key, 1, timeout=LOCK_TIMEOUT):
+            if time.monotonic() - started > timeout:
+                self._timed_out(started)
+            await asyncio.sleep(LOCK_POLL_INTERVAL)
+        try:
+            return self._take(timeout - (time.monotonic() - started))
+        finally:
+            cache.delete(self.lock_key)
+
+    def _try_slot(self) -> bool:
+        for index in range(self.concurrency):
+            key = f"router:limit:slot:{self.router_id}:{index}"
+            if cache.add(key, 1, timeout=self.lease):
+                self.slot = key
+                return True
+        return False
+
+    def _admitted(self, started: float) -> float:
+        waited = time.monotonic() - started
+        _incr(f"{self.stats_prefix}:acquired")
+        _incr(f"{self.stats_prefix}:wait_ms", int(waited * 1000))
+        if waited >= 1:
+            logger.info(f"Router {self.router_id}: waited {waited:.2f}s in the rate limiter")
+        return waited
+
+    def _timed_out(self, started: float):
+        _incr(f"{self.stats_prefix}:timeouts")
+        raise RateLimitTimeout(
+            f"Router is busy: not admitted within {time.monotonic() - started:.0f}s "
+            f"(limit {1 / self.interval:g}/s, {self.concurrency} concurrent sessions)"
+        )
+
+    def acquire(self, timeout: Optional[float] = None) -> float:
+        """
+        Wait until the router may be contacted.
+
+        Returns:
+            Seconds spent waiting
+
+        Raises:
+            RateLimitTimeout: If not admitted within the timeout
+        """
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        delay = self._reserve(started, timeout)
+        if delay is None:
+            self._timed_out(started)
+        time.sleep(delay)
+        while not self._try_slot():
+            if time.monotonic() - started > timeout:
+                self._timed_out(started)
+            time.sleep(SLOT_POLL_INTERVAL)
+        return self._admitted(started)
+
+    async def acquire_async(self, timeout: Optional[float] = None) -> float:
+        """acquire() for asyncio code; waits without blocking the event loop."""
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        delay = await self._reserve_async(started, timeout)
+        if delay is None:
+            self._timed_out(started)
+        await asyncio.sleep(delay)
+        while not self._try_slot():
+            if time.monotonic() - started > timeout:
+                self._timed_out(started)
+            await asyncio.sleep(SLOT_POLL_INTERVAL)
+        return self._admitted(started)
+
+    def release(self):
+        """Give back the concurrency slot."""
+        if self.slot is not None:
+            cache.delete(self.slot)
+            self.slot = None
@@ -0,0 +1,278 @@
+"""
+Desired-state reconciliation between Customer rows and router PPP secrets.
+
+For each router the reconciler reads /ppp/secret once, diffs it against
+the customers assigned to that router and applies only the missing
+add/set/remove operations, all over a single API session. Saving or
+deleting a customer marks its router dirty so the scheduled run only
+visits routers that changed; a full sweep catches changes made directly
+on the routers.
+"""
+import logging
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+from routers.services.mikrotik_api import MikroTikAPIService
+
+logger = logging.getLogger(__name__)
+
+DIRTY_KEY = 'router:reconcile:dirty:{router_id}'
+STATS_KEY = 'router:reconcile:stats:{router_id}'
+
+
+def mark_router_dirty(router_id):
+    """Flag a router for the next incremental reconciliation run."""
+    cache.set(DIRTY_KEY.format(router_id=router_id), True, timeout=None)
+
+
+def dirty_router_ids(router_ids: Iterable) -> List:
+    """Return the subset of router_ids that are flagged dirty."""
+    router_ids = list(router_ids)
+    keys = {DIRTY_KEY.format(router_id=router_id): router_id for router_id in router_ids}
+    flagged = cache.get_many(list(keys))
+    return [keys[key] for key in flagged]
+
+
+def get_drift_stats(router_id) -> Optional[Dict]:
+    """Return the statistics of the last reconciliation of a router."""
+    return cache.get(STATS_KEY.format(router_id=router_id))
+
+
+def _same_value(desired: str, actual) -> bool:
+    """
+    Compare a desired string with a value read through librouteros.
+
+    librouteros casts numeric words to int and yes/no/true/false to bool.
+    Names and passwords are read uncast (see connection_pool.RAW_ATTRIBUTES)
+    and compare as plain strings; other numeric values compare as numbers.
+    """
+    if isinstance(actual, bool):
+        return desired.lower() in (('yes', 'true') if actual else ('no', 'false'))
+    if isinstance(actual, int):
+        try:
+            return int(desired) == actual
+        except ValueError:
+            return False
+    return desired == str(actual)
+
+
+class SecretDiff:
+    """Minimal set of changes that brings /ppp/secret to the desired state."""
+
+    def __init__(self):
+        self.create: List[Dict] = []
+        self.update: Dict[str, Dict] = {}
+        self.enable: List[str] = []
+        self.disable: List[str] = []
+        self.delete: List[str] = []
+        self.unmanaged: List[str] = []
+        self.in_sync = 0
+
+    @property
+    def changes(self) -> int:
+        return len(self.create) + len(self.update) + len(self.enable) + len(self.disable) + len(self.delete)
+
+    def as_dict(self) -> Dict:
+        return {
+            'create': len(self.create),
+            'update': len(self.update),
+            'enable': len(self.enable),
+            'disable': len(self.disable),
+            'delete': len(self.delete),
+            'unmanaged': len(self.unmanaged),
+            'in_sync': self.in_sync,
+        }
+
+
+def desired_secrets(router) -> Dict[str, Dict]:
+    """
+    Build the desired /ppp/secret table for a router from its customers.
+
+    Returns:
+        Dict mapping username to {'name', 'password', 'profile', 'disabled'}
+    """
+    from customers.models import Customer
+
+    customers = (
+        Customer.objects.filter(router=router)
+        .select_related('profile')
+        .only('username', 'password', 'is_active', 'profile__name')
+    )
+    return {
+        customer.username: {
+            'name': customer.username,
+            'password': customer.password,
+            'profile': customer.profile.get_mikrotik_profile_name(),
+            'disabled': not customer.is_active,
+        }
+        for customer in customers.iterator(chunk_size=2000)
+    }
+
+
+def compute_diff(desired: Dict[str, Dict], actual: List[Dict], prune: bool = False) -> SecretDiff:
+    """
+    Diff the desired secrets against the secrets read from the router.
+
+    Args:
+        desired: Output of desired_secrets()
+        actual: Output of MikroTikAPIService.get_all_ppp_secrets()
+        prune: Remove secrets that have no matching customer
+
+    Returns:
+        SecretDiff
+    """
+    diff = SecretDiff()
+    seen = set()
+
+    for secret in actual:
+        name = secret['name']
+        seen.add(name)
+        wanted = desired.get(name)
+        if wanted is None:
+            if prune:
+                diff.delete.append(name)
+            else:
+                diff.unmanaged.append(name)
+            continue
+
+        fields = {}
+        if not _same_value(wanted['password'], secret['password']):
+            fields['password'] = wanted['password']
+        if not _same_value(wanted['profile'], secret['profile']):
+            fields['profile'] = wanted['profile']
+        disabled_changed = wanted['disabled'] != secret['disabled']
+
+        if fields:
+            if disabled_changed:
+                fields['disabled'] = 'yes' if wanted['disabled'] else 'no'
+            diff.update[name] = fields
+        elif disabled_changed:
+            # Status-only changes share one bulk set per chunk
+            (diff.disable if wanted['disabled'] else diff.enable).append(name)
+        else:
+            diff.in_sync += 1
+
+    for name, wanted in desired.items():
+        if name not in seen:
+            diff.create.append({
+                'name': name,
+                'password': wanted['password'],
+                'profile': wanted['profile'],
+                'disabled': 'yes' if wanted['disabled'] else 'no',
+            })
+
+    return diff
+
+
+class SecretReconciler:
+    """
+    Reconcile the PPP secrets of one router with the Customer table.
+    """
+
+    def __init__(self, router, prune: Optional[bool] = None):
+        """
+        Args:
+            router: Router model instance
+            prune: Remove router secrets without a customer
+                   (default: ROUTER_RECONCILE_PRUNE setting)
+        """
+        self.router = router
+        self.prune = getattr(settings, 'ROUTER_RECONCILE_PRUNE', False) if prune is None else prune
+        self.api = MikroTikAPIService(router)
+
+    def _apply_updates(self, updates: Dict[str, Dict], secret_ids: Dict[str, str]) -> Dict:
+        """
+        Apply updates, sending identical changes (e.g. a renamed profile)
+        as one bulk set instead of one command per secret.
+        """
+        grouped = defaultdict(list)
+        individual = {}
+        for name, fields in updates.items():
+            if 'password' in fields:
+                individual[name] = fields
+            else:
+                grouped[tuple(sorted(fields.items()))].append(name)
+
+        results = self.api.bulk_update_secrets(individual, secret_ids)
+        for fields, names in grouped.items():
+            results.update(self.api.bulk_set_fields(names, dict(fields), secret_ids))
+        return results
+
+    def reconcile(self, dry_run: bool = False) -> Dict:
+        """
+        Diff and, unless dry_run, apply the changes in one session.
+
+        Returns:
+            Drift statistics dict
+        """
+        started = time.monotonic()
+        if not dry_run:
+            # Cleared up front so edits made while we run mark it dirty again
+            cache.delete(DIRTY_KEY.format(router_id=self.router.id))
+        desired = desired_secrets(self.router)
+
+        success, message = self.api.connect_router()
+        if not success:
+            # Try again on the next incremental run
+            mark_router_dirty(self.router.id)
+            return {'router': self.router.name, 'success': False, 'error': message}
+
+        error = None
+        failed: Dict[str, str] = {}
+        try:
+            fetched, actual = self.api.get_all_ppp_secrets()
+            if not fetched:
+                raise RuntimeError('Could not read /ppp/secret')
+
+            diff = compute_diff(desired, actual, prune=self.prune)
+            if not dry_run and diff.changes:
+                secret_ids = {secret['name']: secret['id'] for secret in actual}
+                results = {}
+                results.update(self.api.bulk_create_secrets(diff.create, secret_ids))
+                results.update(self._apply_updates(diff.update, secret_ids))
+                results.update(self.api.bulk_set_disabled(diff.enable, False, secret_ids))
+                results.update(self.api.bulk_set_disabled(diff.disable, True, secret_ids))
+                results.update(self.api.bulk_delete_secrets(diff.delete, secret_ids))
+                failed = {name: msg for name, (ok, msg) in results.items() if not ok}
+        except Exception as e:
+            error = e
+        finally:
+            self.api.disconnect(error)
+
+        if error is not None:
+            mark_router_dirty(self.router.id)
+            error_msg = f"Reconciliation failed: {str(error)}"
+            self.api.log_action('ERROR', 'Reconciliation failed', error_msg)
+            logger.error(f"Router {self.router.name}: {error_msg}")
+            return {'router': self.router.name, 'success': False, 'error': error_msg}
+
+        if failed:
+            mark_router_dirty(self.router.id)
+
+        stats = {
+            'router': self.router.name,
+            'success': True,
+            'dry_run': dry_run,
+            'desired': len(desired),
+            'actual': len(actual),
+            **diff.as_dict(),
+            'failed': len(failed),
+            'errors': dict(list(failed.items())[:20]),
+            'duration': round(time.monotonic() - started, 3),
+            'finished_at': time.time(),
+        }
+        cache.set(STATS_KEY.format(router_id=self.router.id), stats, timeout=None)
+
+        if diff.changes or diff.unmanaged or failed:
+            self.api.log_action(
+                'WARNING' if failed else 'INFO', 'Reconciliation',
+                f"{'Found' if dry_run else 'Fixed'} {diff.changes} drifted PPP secrets "
+                f"({len(failed)} failed, {len(diff.unmanaged)} unmanaged)",
+                details={key: value for key, value in stats.items() if key != 'router'},
+            )
+        logger.info(f"Router {self.router.name}: reconciled {stats}")
+        return stats
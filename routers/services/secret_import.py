@@ -0,0 +1,159 @@
+"""
+Import of PPP secrets that already exist on a router as Customers.
+
+The router's /ppp/secret table is read once. Router profile names are
+mapped to billing Profiles by their MikroTik name (see
+Profile.get_mikrotik_profile_name()), usernames already in the database
+are skipped, and the remaining secrets are created as Customers with
+bulk_create in chunks. Without ``commit`` only the report is produced,
+so it can be reviewed before anything is written.
+
+Enabled secrets become ACTIVE customers whose billing period starts at
+the import: they expire after their profile's duration, or at an explicit
+``expires_at``, so the expiry sweep, reminders and auto-renewal pick them
+up like any other customer.
+
+The import writes no router changes: the secrets are already there.
+"""
+import logging
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from django.utils import timezone
+
+from routers.services.mikrotik_api import MikroTikAPIService
+
+logger = logging.getLogger(__name__)
+
+# Existing-username lookups are chunked to keep the IN clause reasonable
+LOOKUP_CHUNK_SIZE = 2000
+
+# Rows per INSERT
+CREATE_CHUNK_SIZE = 1000
+
+# Usernames listed per category in the report
+REPORT_SAMPLE_SIZE = 20
+
+
+def _existing_usernames(usernames: List[str]) -> set:
+    from customers.models import Customer
+
+    existing = set()
+    for start in range(0, len(usernames), LOOKUP_CHUNK_SIZE):
+        existing.update(
+            Customer.objects.filter(username__in=usernames[start:start + LOOKUP_CHUNK_SIZE])
+            .values_list('username', flat=True)
+        )
+    return existing
+
+
+def import_router_secrets(router, commit: bool = False, default_profile=None,
+                          created_by=None, expires_at: Optional[datetime] = None) -> Dict:
+    """
+    Create Customers for the PPP secrets of a router that are not in the database.
+
+    Args:
+        router: Router model instance
+        commit: Write the customers; otherwise only report what would happen
+        default_profile: Profile for secrets whose router profile has no
+                         billing Profile (skipped when not given)
+        created_by: User recorded as creator
+        expires_at: Expiry of the enabled secrets (defaults to the
+                    profile duration counted from now)
+
+    Returns:
+        Dict with counts of secrets, new (of which active, i.e. enabled and
+        given an expiry), existing, unmapped and invalid secrets, created
+        customers, the expiry used, a per router profile mapping and
+        sample usernames for each skipped category
+    """
+    from customers.models import Customer
+    from profiles.models import Profile
+
+    success, secrets = MikroTikAPIService(router).get_all_ppp_secrets()
+    if not success:
+        return {'router': router.name, 'success': False, 'error': 'Could not read /ppp/secret'}
+
+    profiles = {profile.get_mikrotik_profile_name(): profile for profile in Profile.objects.all()}
+    existing = _existing_usernames([secret['name'] for secret in secrets])
+    max_username = Customer._meta.get_field('username').max_length
+    max_password = Customer._meta.get_field('password').max_length
+
+    now = timezone.now()
+    new: List = []
+    skipped = {'existing': [], 'unmapped': [], 'invalid': []}
+    mapping = Counter()
+    seen = set()
+    for secret in secrets:
+        # Read uncast (see connection_pool.RAW_ATTRIBUTES); a value cast to
+        # int or bool would not match the router, so it is not imported
+        username = secret['name']
+        password = secret['password']
+        if (not isinstance(username, str) or not isinstance(password, str)
+                or not username or username in seen or len(username) > max_username
+                or not password or len(password) > max_password):
+            skipped['invalid'].append(str(username))
+            continue
+        seen.add(username)
+        if username in existing:
+            skipped['existing'].append(username)
+            continue
+
+        router_profile = secret['profile']
+        profile = profiles.get(router_profile, default_profile)
+        mapping[(router_profile, profile.name if profile else None)] += 1
+        if profile is None:
+            skipped['unmapped'].append(username)
+            continue
+
+        active = not secret['disabled']
+        new.append(Customer(
+            username=username,
+            password=password,
+            full_name=username,
+            router=router,
+            profile=profile,
+            status='ACTIVE' if active else 'DISABLED',
+            is_active=active,
+            activated_at=now if active else None,
+            expires_at=(expires_at or profile.calculate_expiry_date(now)) if active else None,
+            created_at=now,
+            created_by=created_by,
+            notes=f"Imported from router {router.name}",
+        ))
+
+    created = 0
+    if commit:
+        for start in range(0, len(new), CREATE_CHUNK_SIZE):
+            chunk = new[start:start + CREATE_CHUNK_SIZE]
+            # A username taken since the lookup is skipped, not an error
+            Customer.objects.bulk_create(chunk, ignore_conflicts=True)
+            created += Customer.objects.filter(
+                router=router, created_at=now, username__in=[customer.username for customer in chunk],
+            ).count()
+
+    report = {
+        'router': router.name,
+        'success': True,
+        'dry_run': not commit,
+        'secrets': len(secrets),
+        'new': len(new),
+        'active': sum(1 for customer in new if customer.is_active),
+        'expiry': expires_at.isoformat() if expires_at else 'profile duration',
+        'existing': len(skipped['existing']),
+        'unmapped': len(skipped['unmapped']),
+        'invalid': len(skipped['invalid']),
+        'created': created,
+        'profiles': [
+            {'router_profile': router_profile, 'profile': profile_name, 'secrets': count}
+            for (router_profile, profile_name), count in sorted(mapping.items(), key=lambda item: -item[1])
+        ],
+        'samples': {key: names[:REPORT_SAMPLE_SIZE] for key, names in skipped.items()},
+    }
+    logger.info(
+        f"Router {router.name}: secret import {'' if commit else '(dry run) '}"
+        f"{report['new']} new, {report['existing']} existing, {report['unmapped']} unmapped, "
+        f"{report['invalid']} invalid, {created} created"
+    )
+    return report
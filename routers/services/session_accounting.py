@@ -0,0 +1,201 @@
+"""
+CustomerSession accounting from periodic /ppp/active snapshots.
+
+Each run takes the current active-session table of every router (from the
+session listener's cache where available, otherwise by querying the
+router) and diffs it against the previous snapshot kept in the cache.
+New sessions open CustomerSession rows and bump the customer's
+last_connection and total_connections; sessions that disappeared are
+closed with their duration. A router's changes are written in one
+transaction with bulk_create/bulk_update, so the number of queries does
+not grow with the number of sessions.
+
+If a snapshot is missing (first run, cache flushed) it is rebuilt from
+the router's open CustomerSession rows.
+"""
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from routers.services.mikrotik_api import parse_uptime
+from routers.services.session_listener import iter_active_sessions
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_KEY = 'router:accounting:snapshot:{router_id}'
+LOCK_KEY = 'router:accounting:lock'
+LOCK_TIMEOUT = 600
+
+# Customer lookups are chunked to keep the IN clause reasonable
+LOOKUP_CHUNK_SIZE = 2000
+
+# Session key -> (CustomerSession pk or None for unknown users, started_at)
+Snapshot = Dict[str, Tuple[Optional[int], datetime]]
+
+
+def session_key(session: Dict) -> str:
+    """Identify an active session across snapshots (.id is reused after a reboot)."""
+    return f"{session.get('id', '')}:{session['name']}"
+
+
+def customer_ids(router, usernames: List[str]) -> Dict[str, object]:
+    """Map usernames of a router's customers to their ids."""
+    from customers.models import Customer
+
+    ids = {}
+    for start in range(0, len(usernames), LOOKUP_CHUNK_SIZE):
+        ids.update(
+            Customer.objects.filter(router=router, username__in=usernames[start:start + LOOKUP_CHUNK_SIZE])
+            .values_list('username', 'id')
+        )
+    return ids
+
+
+def _rebuild_snapshot(router, current: Dict[str, Dict]) -> Snapshot:
+    """
+    Recreate a lost snapshot from the router's open CustomerSession rows.
+
+    Open rows are matched to current sessions by username and address;
+    rows without a match get keys that cannot match, so they are closed.
+    """
+    from customers.models import CustomerSession
+
+    by_user = defaultdict(list)
+    for key, session in current.items():
+        by_user[(session['name'], session.get('address') or None)].append(key)
+
+    snapshot: Snapshot = {}
+    open_sessions = (
+        CustomerSession.objects.filter(router=router, ended_at__isnull=True)
+        .values_list('pk', 'started_at', 'customer__username', 'ip_address')
+    )
+    for pk, started_at, username, address in open_sessions.iterator(chunk_size=2000):
+        keys = by_user.get((username, address))
+        key = keys.pop() if keys else f"closed:{pk}"
+        snapshot[key] = (pk, started_at)
+    return snapshot
+
+
+def account_router_sessions(router, sessions: List[Dict], now: Optional[datetime] = None) -> Dict:
+    """
+    Record the changes between a router's last snapshot and its current sessions.
+
+    Args:
+        router: Router model instance
+        sessions: Current /ppp/active rows (see get_active_connections())
+        now: Time of the snapshot
+
+    Returns:
+        Dict with opened/closed/active counts
+    """
+    from customers.models import Customer, CustomerSession
+
+    now = now or timezone.now()
+    current = {session_key(session): session for session in sessions}
+
+    snapshot_key = SNAPSHOT_KEY.format(router_id=router.id)
+    previous: Optional[Snapshot] = cache.get(snapshot_key)
+    if previous is None:
+        previous = _rebuild_snapshot(router, current)
+
+    started = [key for key in current if key not in previous]
+    ended = [key for key in previous if key not in current]
+
+    ids = customer_ids(router, list({current[key]['name'] for key in started}))
+    opened = []
+    connections = defaultdict(lambda: [0, None])
+    for key in started:
+        session = current[key]
+        customer_id = ids.get(session['name'])
+        if customer_id is None:
+            # Secret without a customer; remembered so it is not looked up again
+            continue
+        started_at = now - timedelta(seconds=parse_uptime(session.get('uptime')))
+        opened.append((key, CustomerSession(
+            customer_id=customer_id,
+            router=router,
+            started_at=started_at,
+            ip_address=session.get('address') or None,
+            caller_id=str(session.get('caller_id', ''))[:100],
+        )))
+        stats = connections[customer_id]
+        stats[0] += 1
+        stats[1] = max(stats[1] or started_at, started_at)
+
+    closed = []
+    for key in ended:
+        pk, started_at = previous[key]
+        if pk is not None:
+            closed.append(CustomerSession(
+                pk=pk, ended_at=now,
+                duration_seconds=max(int((now - started_at).total_seconds()), 0),
+            ))
+
+    with transaction.atomic():
+        CustomerSession.objects.bulk_create([session for _, session in opened], batch_size=1000)
+        if closed:
+            CustomerSession.objects.bulk_update(closed, ['ended_at', 'duration_seconds'], batch_size=1000)
+        if connections:
+            Customer.objects.bulk_update(
+                [
+                    Customer(
+                        pk=customer_id,
+                        last_connection=last_connection,
+                        total_connections=F('total_connections') + count,
+                    )
+                    for customer_id, (count, last_connection) in connections.items()
+                ],
+                ['last_connection', 'total_connections'],
+                batch_size=1000,
+            )
+
+    snapshot: Snapshot = {key: previous[key] for key in current if key in previous}
+    snapshot.update((key, (None, now)) for key in started)
+    # bulk_create sets the primary keys on PostgreSQL and SQLite
+    snapshot.update((key, (session.pk, session.started_at)) for key, session in opened)
+    cache.set(snapshot_key, snapshot, timeout=None)
+
+    return {
+        'router': router.name,
+        'opened': len(opened),
+        'closed': len(closed),
+        'active': len(current),
+    }
+
+
+def account_sessions(routers: Iterable) -> Dict:
+    """
+    Run session accounting for many routers.
+
+    Only one run at a time is allowed across workers; overlapping runs
+    would open the same sessions twice.
+
+    Returns:
+        Dict with totals and the number of routers processed
+    """
+    if not cache.add(LOCK_KEY, 1, timeout=LOCK_TIMEOUT):
+        logger.info("Session accounting already running, skipped")
+        return {'skipped': True}
+
+    totals = {'routers': 0, 'opened': 0, 'closed': 0, 'active': 0}
+    try:
+        for router, sessions in iter_active_sessions(routers):
+            try:
+                stats = account_router_sessions(router, sessions)
+            except Exception as e:
+                logger.error(f"Router {router.name}: session accounting failed: {str(e)}")
+                continue
+            totals['routers'] += 1
+            for key in ('opened', 'closed', 'active'):
+                totals[key] += stats[key]
+    finally:
+        cache.delete(LOCK_KEY)
+
+    logger.info(f"Session accounting: {totals}")
+    return totals
@@ -0,0 +1,339 @@
+"""
+Streaming listener for PPP session changes across the router fleet.
+
+Keeps one RouterOS ``/ppp/active/listen`` open per router and turns the
+stream into CONNECTED / DISCONNECTED events, instead of downloading the
+whole active table on every poll. All routers share one asyncio event
+loop, so a single process follows the whole fleet. Broken sessions are
+re-established with backoff and the table is re-synced on every
+reconnect, so sessions that came and went meanwhile are not missed.
+
+Events are batched per router and handed to a synchronous handler in a
+worker thread. The default handler publishes each router's live session
+table to the cache (see get_live_sessions()) and sends the
+ppp_session_events signal.
+
+Run it with ``python manage.py listen_sessions``.
+"""
+import asyncio
+import logging
+import random
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from routers.models import Router
+from routers.services.async_api import AsyncMikroTikAPIService, iter_fan_out
+from routers.signals import ppp_session_events
+
+logger = logging.getLogger(__name__)
+
+SESSIONS_KEY = 'router:sessions:{router_id}'
+HEARTBEAT_KEY = 'router:sessions:heartbeat'
+HEARTBEAT_INTERVAL = 15
+HEARTBEAT_TTL = 60
+
+CONNECTED = 'CONNECTED'
+DISCONNECTED = 'DISCONNECTED'
+
+
+class SessionEvent(NamedTuple):
+    """A PPP session that appeared on or vanished from a router."""
+    kind: str
+    router_id: Any
+    session_id: str  # RouterOS .id of the /ppp/active entry
+    username: str
+    address: str
+    caller_id: str
+    service: str
+    uptime: str
+    at: datetime
+    # Found by comparing tables after (re)connecting rather than streamed
+    # live, so ``at`` is only when the listener noticed
+    resync: bool
+
+
+def _session(row: Dict) -> Dict[str, str]:
+    return {
+        'id': row.get('.id', ''),
+        # Numeric usernames come back as ints
+        'name': str(row.get('name', '')),
+        'address': row.get('address', ''),
+        'caller_id': row.get('caller-id', ''),
+        'service': row.get('service', ''),
+        'uptime': row.get('uptime', ''),
+    }
+
+
+def _event(kind: str, router_id, session: Dict[str, str], resync: bool) -> SessionEvent:
+    return SessionEvent(
+        kind, router_id, session['id'], session['name'], session['address'],
+        session['caller_id'], session['service'], session['uptime'], timezone.now(), resync,
+    )
+
+
+class RouterSessionWatcher:
+    """
+    Follows /ppp/active on one router until cancelled.
+
+    ``sessions`` holds the router's live sessions keyed by .id and is kept
+    across reconnects so the re-sync can tell what changed meanwhile.
+    """
+
+    def __init__(self, router, publish: Callable, keepalive: float, max_backoff: float):
+        self.router = router
+        self.publish = publish
+        self.keepalive = keepalive
+        self.max_backoff = max_backoff
+        self.sessions: Dict[str, Dict[str, str]] = {}
+        self.synced = False
+
+    async def run(self):
+        failures = 0
+        while True:
+            api = AsyncMikroTikAPIService(self.router)
+            success, message = await api.connect_router()
+            if success:
+                # A listener stays connected for days; it must not hold one
+                # of the router's concurrency slots for all that time
+                api.limiter.release()
+                try:
+                    await self._follow(api.connection)
+                    message = 'listen ended'
+                except Exception as e:
+                    message = str(e) or e.__class__.__name__
+                finally:
+                    await api.disconnect()
+
+                if self.synced:
+                    # Was following fine, so reconnect promptly
+                    failures = 0
+                    self.synced = False
+                    self.publish(self, [])
+
+            failures += 1
+            delay = min(2 ** (failures - 1), self.max_backoff)
+            logger.warning(
+                f"Router {self.router.name}: session listener disconnected ({message}); "
+                f"retrying in {delay}s"
+            )
+            await asyncio.sleep(delay * random.uniform(0.8, 1.2))
+
+    async def _follow(self, connection):
+        snapshot: Dict[str, Dict[str, str]] = {}
+        early_changes: List[Dict] = []
+
+        async for kind, row in connection.listen('/ppp/active', keepalive=self.keepalive):
+            if kind == 'item':
+                session = _session(row)
+                snapshot[session['id']] = session
+            elif kind == 'synced':
+                # Changes seen before the print finished may or may not be
+                # in it; applying them on top gives the current table
+                for change in early_changes:
+                    self._apply(snapshot, change)
+                events = self._diff(snapshot)
+                self.sessions = snapshot
+                self.synced = True
+                self.publish(self, events)
+                logger.info(f"Router {self.router.name}: following {len(snapshot)} PPP sessions")
+            elif not self.synced:
+                early_changes.append(row)
+            else:
+                event = self._apply(self.sessions, row)
+                if event:
+                    self.publish(self, [event])
+
+    def _apply(self, table: Dict[str, Dict[str, str]], row: Dict) -> Optional[SessionEvent]:
+        """Apply one streamed change to a table, returning the resulting event if any."""
+        session_id = row.get('.id', '')
+        if row.get('.dead') in (True, 'yes', 'true'):
+            session = table.pop(session_id, None)
+            return _event(DISCONNECTED, self.router.id, session, False) if session else None
+
+        is_new = session_id not in table
+        table[session_id] = _session(row)
+        return _event(CONNECTED, self.router.id, table[session_id], False) if is_new else None
+
+    def _diff(self, snapshot: Dict[str, Dict[str, str]]) -> List[SessionEvent]:
+        """Events for sessions that ended or started while the router was not followed."""
+        events = [
+            _event(DISCONNECTED, self.router.id, session, True)
+            for session_id, session in self.sessions.items() if session_id not in snapshot
+        ]
+        events.extend(
+            _event(CONNECTED, self.router.id, session, True)
+            for session_id, session in snapshot.items() if session_id not in self.sessions
+        )
+        return events
+
+
+class SessionListener:
+    """
+    Follows /ppp/active on many routers from one event loop.
+
+    Args:
+        routers: Router instances to follow; defaults to all active routers,
+                 re-read every ``refresh_interval`` seconds
+        handler: Callable(router, events, sessions) run in a worker thread
+                 for each batch; ``sessions`` is the router's full table of
+                 live sessions keyed by .id, or None while it is unknown
+        keepalive: Idle seconds before a router is probed
+                   (defaults to ROUTER_SESSION_LISTENER_KEEPALIVE)
+        flush_interval: Seconds events are collected before the handler runs
+        refresh_interval: Seconds between re-reads of the router list
+    """
+
+    def __init__(self, routers: Optional[Iterable] = None, handler: Optional[Callable] = None,
+                 keepalive: Optional[float] = None, flush_interval: float = 1.0,
+                 refresh_interval: float = 300):
+        self.routers = list(routers) if routers is not None else None
+        self.handler = handler or publish_session_events
+        self.keepalive = keepalive or getattr(settings, 'ROUTER_SESSION_LISTENER_KEEPALIVE', 30)
+        self.max_backoff = getattr(settings, 'ROUTER_SESSION_LISTENER_MAX_BACKOFF', 300)
+        self.flush_interval = flush_interval
+        self.refresh_interval = refresh_interval
+        self._watchers: Dict[Any, Tuple[RouterSessionWatcher, asyncio.Task]] = {}
+        self._pending: Dict[Any, Tuple[RouterSessionWatcher, List[SessionEvent]]] = {}
+
+    def publish(self, watcher: RouterSessionWatcher, events: List[SessionEvent]):
+        """Queue events of a watcher for the next flush."""
+        _, queued = self._pending.get(watcher.router.id, (None, []))
+        # The latest watcher of a router decides what table gets published
+        self._pending[watcher.router.id] = (watcher, queued + events)
+
+    @staticmethod
+    def _endpoint(router) -> Tuple:
+        return (router.vpn_ip, router.api_port, router.username, router.password)
+
+    def _sync_watchers(self, routers: List):
+        """Start watchers for new routers, stop removed ones and restart changed ones."""
+        wanted = {router.id: router for router in routers}
+        restarted = {}
+
+        for router_id, (watcher, task) in list(self._watchers.items()):
+            router = wanted.get(router_id)
+            if router is not None and self._endpoint(router) == self._endpoint(watcher.router):
+                continue
+            task.cancel()
+            del self._watchers[router_id]
+            watcher.synced = False
+            self.publish(watcher, [])
+            if router is not None:
+                restarted[router_id] = watcher.sessions
+
+        for router_id, router in wanted.items():
+            if router_id in self._watchers:
+                continue
+            watcher = RouterSessionWatcher(router, self.publish, self.keepalive, self.max_backoff)
+            # A router restarted with new connection details keeps its known table
+            watcher.sessions = restarted.get(router_id, {})
+            self._watchers[router_id] = (watcher, asyncio.ensure_future(watcher.run()))
+
+        logger.info(f"Session listener following {len(self._watchers)} routers")
+
+    async def _flush(self):
+        pending, self._pending = self._pending, {}
+        for watcher, events in pending.values():
+            # Copied here because the watcher keeps changing its table
+            sessions = dict(watcher.sessions) if watcher.synced else None
+            try:
+                await sync_to_async(self.handler)(watcher.router, events, sessions)
+            except Exception as e:
+                logger.error(f"Router {watcher.router.name}: session event handler failed: {str(e)}")
+
+    async def run(self):
+        """Follow the routers until cancelled."""
+        last_refresh = last_heartbeat = None
+        try:
+            while True:
+                now = time.monotonic()
+                if last_refresh is None or (self.routers is None and now - last_refresh >= self.refresh_interval):
+                    routers = self.routers
+                    if routers is None:
+                        routers = await sync_to_async(lambda: list(Router.objects.filter(is_active=True)))()
+                    self._sync_watchers(routers)
+                    last_refresh = now
+
+                await asyncio.sleep(self.flush_interval)
+                await self._flush()
+
+                if last_heartbeat is None or now - last_heartbeat >= HEARTBEAT_INTERVAL:
+                    await sync_to_async(cache.set)(HEARTBEAT_KEY, timezone.now(), HEARTBEAT_TTL)
+                    last_heartbeat = now
+        finally:
+            tasks = [task for _, task in self._watchers.values()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def run_forever(self):
+        """Synchronous entry point for management commands."""
+        asyncio.run(self.run())
+
+
+def publish_session_events(router, events: List[SessionEvent], sessions: Optional[Dict[str, Dict]]):
+    """
+    Default handler: cache the router's live sessions and send ppp_session_events.
+    """
+    key = SESSIONS_KEY.format(router_id=router.id)
+    if sessions is None:
+        cache.delete(key)
+    else:
+        cache.set(key, list(sessions.values()), timeout=None)
+        Router.objects.filter(id=router.id).update(active_users=len(sessions))
+
+    if events:
+        ppp_session_events.send(sender=Router, router=router, events=events)
+
+
+def get_live_sessions(router_ids: Iterable) -> Dict[Any, List[Dict]]:
+    """
+    Live session tables published by a running listener.
+
+    Args:
+        router_ids: Router IDs to look up
+
+    Returns:
+        Dict mapping router ID to its sessions (dicts like
+        get_active_connections() returns), for routers the listener is
+        currently following; empty if no listener is running
+    """
+    router_ids = list(router_ids)
+    if not router_ids or cache.get(HEARTBEAT_KEY) is None:
+        return {}
+    keys = {SESSIONS_KEY.format(router_id=router_id): router_id for router_id in router_ids}
+    return {keys[key]: sessions for key, sessions in cache.get_many(list(keys)).items()}
+
+
+def iter_active_sessions(routers: Iterable) -> Iterator[Tuple[Any, List[Dict]]]:
+    """
+    Current /ppp/active table of every router.
+
+    Routers followed by a running listener are served from the cache;
+    the rest are queried concurrently. Routers that could not be reached
+    are skipped.
+
+    Yields:
+        (router, sessions) pairs, sessions as returned by get_active_connections()
+    """
+    routers = list(routers)
+    live = get_live_sessions(router.id for router in routers)
+    for router in routers:
+        if router.id in live:
+            yield router, live[router.id]
+
+    for outcome in iter_fan_out(
+        [router for router in routers if router.id not in live],
+        lambda api: api.get_active_connections(),
+    ):
+        if outcome.error:
+            continue
+        success, sessions = outcome.result
+        if success:
+            yield outcome.router, sessions
@@ -0,0 +1,238 @@
+"""
+Write-behind store for router probe results.
+
+The latest result of every status check is kept in the cache under
+STATUS_KEY. The Router row is written only when something worth keeping
+changes (status, version, model or identity); last_checked and
+last_online, which change on every check, stay in the cache and are
+copied to the table in bulk by flush_checked(), run periodically.
+
+Pages showing router status read through overlay(), which puts the
+cached values on the Router instances, so they stay current without
+the Router table being written on every probe.
+
+Write-behind needs a cache shared by every process (see
+core.checks.cache_is_shared()): with a per-process cache the flush task
+and the web views would never see the workers' results, so every check
+is written through to the Router row instead.
+
+Views that check a router on demand go through check_router(): a result
+younger than ROUTER_STATUS_CACHE_TTL is served from the store, and
+concurrent requests for the same router share a single probe.
+"""
+import logging
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from core.checks import cache_is_shared
+from routers.models import Router
+
+logger = logging.getLogger(__name__)
+
+STATUS_KEY = 'router:status:{router_id}'
+PROBE_LOCK_KEY = 'router:status:probe:{router_id}'
+
+# How often a request waiting for another request's probe looks for its result
+PROBE_POLL_INTERVAL = 0.2
+
+# Router field -> key in the check_status() info
+INFO_FIELDS = {
+    'router_version': 'version',
+    'router_model': 'board_name',
+    'router_identity': 'identity',
+}
+
+# Updated on a change only; last_checked/last_online are written by flush_checked()
+CHANGE_FIELDS = ['status', 'last_checked', 'last_online', *INFO_FIELDS]
+
+
+def _key(router_id) -> str:
+    return STATUS_KEY.format(router_id=router_id)
+
+
+def _entry(router: Router, online: bool, info: Dict, now: datetime, previous: Optional[Dict]) -> Dict:
+    # The cached value is newer than the row until the next flush
+    last_online = previous['online_at'] if previous else router.last_online
+    return {
+        'status': 'ONLINE' if online else 'OFFLINE',
+        'checked_at': now,
+        'online_at': now if online else last_online,
+        'info': info if online else {},
+        'error': '' if online else info.get('error', 'Unknown'),
+    }
+
+
+def _apply(router: Router, entry: Dict) -> bool:
+    """Copy a probe result onto a router; True if a persisted attribute changed."""
+    changed = router.status != entry['status']
+    router.status = entry['status']
+    for field, key in INFO_FIELDS.items():
+        if key in entry['info'] and getattr(router, field) != entry['info'][key]:
+            setattr(router, field, entry['info'][key])
+            changed = True
+    router.last_checked = entry['checked_at']
+    router.last_online = entry['online_at']
+    return changed
+
+
+def record_results(results: Iterable[Tuple[Router, bool, Dict]],
+                   now: Optional[datetime] = None) -> List[Router]:
+    """
+    Store the results of many status checks.
+
+    Args:
+        results: (router, online, info) per check; info as returned by check_status()
+        now: Time of the checks (defaults to now)
+
+    Returns:
+        Routers whose row was written: those where something changed, or
+        all of them when the cache is not shared (write-through)
+    """
+    now = now or timezone.now()
+    results = list(results)
+    previous = get_statuses(router.id for router, _, _ in results)
+    entries = {}
+    changed = []
+    write_through = not cache_is_shared()
+    for router, online, info in results:
+        entry = _entry(router, online, info, now, previous.get(str(router.id)))
+        entries[_key(router.id)] = entry
+        if _apply(router, entry) or write_through:
+            changed.append(router)
+
+    if changed:
+        Router.objects.bulk_update(changed, CHANGE_FIELDS, batch_size=500)
+    cache.set_many(entries, timeout=None)
+    return changed
+
+
+def record_result(router: Router, online: bool, info: Dict) -> bool:
+    """
+    Store the result of one status check.
+
+    Returns:
+        True if the Router row was written
+    """
+    return bool(record_results([(router, online, info)]))
+
+
+def get_statuses(router_ids: Iterable) -> Dict[str, Dict]:
+    """
+    Latest probe results by router id.
+
+    Returns:
+        Dict of router id -> {'status', 'checked_at', 'online_at', 'info',
+        'error'}; routers not checked since the cache was cleared are left out
+    """
+    keys = {_key(router_id): str(router_id) for router_id in router_ids}
+    return {keys[key]: entry for key, entry in cache.get_many(list(keys)).items()}
+
+
+def get_status(router_id) -> Optional[Dict]:
+    """Latest probe result of one router (see get_statuses())."""
+    return cache.get(_key(router_id))
+
+
+def overlay(routers: Iterable[Router]) -> List[Router]:
+    """Put the latest probe results on Router instances for display."""
+    routers = list(routers)
+    statuses = get_statuses(router.id for router in routers)
+    for router in routers:
+        entry = statuses.get(str(router.id))
+        if entry:
+            router.status = entry['status']
+            router.last_checked = entry['checked_at']
+            router.last_online = entry['online_at']
+    return routers
+
+
+def flush_checked(batch_size: int = 1000) -> int:
+    """
+    Copy cached last_checked/last_online values newer than the table's.
+
+    Returns:
+        Number of routers updated
+    """
+    rows = list(Router.objects.values_list('id', 'last_checked', 'last_online'))
+    statuses = get_statuses(router_id for router_id, _, _ in rows)
+
+    stale = []
+    for router_id, last_checked, last_online in rows:
+        entry = statuses.get(str(router_id))
+        if entry and (last_checked is None or entry['checked_at'] > last_checked):
+            stale.append(Router(id=router_id, last_checked=entry['checked_at'],
+                                last_online=entry['online_at'] or last_online))
+
+    for start in range(0, len(stale), batch_size):
+        Router.objects.bulk_update(stale[start:start + batch_size], ['last_checked', 'last_online'])
+    return len(stale)
+
+
+def _is_fresh(entry: Optional[Dict], max_age: float, since: Optional[datetime] = None) -> bool:
+    if not entry:
+        return False
+    if since is not None:
+        return entry['checked_at'] >= since
+    return (timezone.now() - entry['checked_at']).total_seconds() < max_age
+
+
+def check_router(router: Router, force: bool = False) -> Tuple[Dict, bool]:
+    """
+    Status of a router for on-demand checks, probing it at most once at a time.
+
+    A cached result younger than ROUTER_STATUS_CACHE_TTL is returned as is
+    unless ``force`` is set. Otherwise the first caller probes the router
+    and concurrent callers wait for that probe's result instead of opening
+    their own connections.
+
+    Args:
+        router: Router model instance
+        force: Ignore the cached result and wait for a new probe
+
+    Returns:
+        Tuple of (status entry (see get_statuses()), probed: bool), where
+        probed is False when the result came from the cache or another
+        request's probe. If that probe does not finish in time, the last
+        known status is returned rather than probing alongside it.
+    """
+    from routers.services.mikrotik_api import MikroTikAPIService
+    from routers.services.poll_scheduler import PollScheduler
+
+    ttl = getattr(settings, 'ROUTER_STATUS_CACHE_TTL', 15)
+    requested_at = timezone.now()
+    if not force:
+        entry = get_status(router.id)
+        if _is_fresh(entry, ttl):
+            return entry, False
+
+    lock_key = PROBE_LOCK_KEY.format(router_id=router.id)
+    probe_timeout = getattr(settings, 'MIKROTIK_API_TIMEOUT', 10) * 2
+    deadline = time.monotonic() + probe_timeout
+    while not cache.add(lock_key, 1, timeout=probe_timeout):
+        # Another request is probing this router; use its result
+        time.sleep(PROBE_POLL_INTERVAL)
+        entry = get_status(router.id)
+        if _is_fresh(entry, ttl, since=requested_at if force else None):
+            return entry, False
+        if time.monotonic() > deadline:
+            # Still in flight: serve the last known status, not a second probe
+            return entry or {
+                'status': router.status,
+                'checked_at': router.last_checked or requested_at,
+                'online_at': router.last_online,
+                'info': {},
+                'error': 'Status check already in progress',
+            }, False
+
+    try:
+        is_online, info = MikroTikAPIService(router).check_status()
+        PollScheduler().record_result(router.id, is_online)
+        record_result(router, is_online, info)
+    finally:
+        cache.delete(lock_key)
+    return get_status(router.id), True
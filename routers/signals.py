@@ -0,0 +1,8 @@
+"""
+Signals sent by the routers app.
+"""
+from django.dispatch import Signal
+
+# Sent by the session listener with ``router`` and ``events`` (a list of
+# SessionEvent) whenever PPP sessions connect to or disconnect from a router.
+ppp_session_events = Signal()
@@ -0,0 +1,658 @@
+"""
+Local RouterOS API simulator for testing and benchmarking.
+
+Speaks the RouterOS API wire protocol used by librouteros over localhost
+TCP and serves an in-memory model of the menus the billing system uses:
+/system/resource, /system/identity, /ppp/secret, /ppp/profile,
+/ppp/active (including ``listen``) and the PPP session interfaces in
+/interface with growing byte counters. Latency, packet loss,
+dropped connections, login failures, session churn and table sizes are
+configurable, and a whole fleet of simulated routers can run on one event
+loop in a background thread.
+
+Example:
+    with SimulatedRouter(secrets=20000, latency=0.02) as sim:
+        router = Router.objects.create(name='sim-1', **sim.router_kwargs())
+        MikroTikAPIService(router).check_status()
+"""
+import asyncio
+import itertools
+import logging
+import random
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from librouteros.protocol import Encoder, Decoder
+
+logger = logging.getLogger(__name__)
+
+
+class SimulatorConfig:
+    """
+    Behaviour of a simulated router.
+
+    Args:
+        username / password: Credentials accepted by /login
+        secrets: Number of PPP secrets to pre-populate
+        profiles: Number of PPP profiles to pre-populate
+        active_ratio: Fraction of enabled secrets with an active session
+        latency: Seconds added to every reply
+        jitter: Random extra seconds (0..jitter) added to every reply
+        packet_loss: Probability that a reply is delayed by a retransmission
+        retransmit_delay: Seconds a "lost" reply is delayed by
+        drop_rate: Probability that the connection is dropped instead of replying
+        login_failure_rate: Probability that a correct login is rejected anyway
+        session_churn: PPP sessions connecting or disconnecting per second
+        version / board_name: Reported by /system/resource
+        seed: Seed for the random generator, for reproducible runs
+    """
+
+    def __init__(self, username: str = 'admin', password: str = 'admin',
+                 secrets: int = 100, profiles: int = 5, active_ratio: float = 0.5,
+                 latency: float = 0.0, jitter: float = 0.0,
+                 packet_loss: float = 0.0, retransmit_delay: float = 1.0,
+                 drop_rate: float = 0.0, login_failure_rate: float = 0.0,
+                 session_churn: float = 0.0, version: str = '7.12 (stable)', board_name: str = 'hAP ac^2',
+                 seed: Optional[int] = None):
+        self.username = username
+        self.password = password
+        self.secrets = secrets
+        self.profiles = profiles
+        self.active_ratio = active_ratio
+        self.latency = latency
+        self.jitter = jitter
+        self.packet_loss = packet_loss
+        self.retransmit_delay = retransmit_delay
+        self.drop_rate = drop_rate
+        self.login_failure_rate = login_failure_rate
+        self.session_churn = session_churn
+        self.version = version
+        self.board_name = board_name
+        self.seed = seed
+
+
+class RouterState:
+    """In-memory RouterOS menus of one simulated router."""
+
+    # Attributes that must be unique within a menu
+    UNIQUE_KEYS = {
+        '/ppp/secret': 'name',
+        '/ppp/profile': 'name',
+    }
+
+    def __init__(self, config: SimulatorConfig, identity: str):
+        self.config = config
+        self.identity = identity
+        self.random = random.Random(config.seed)
+        self._ids = itertools.count(1)
+        self.tables: Dict[str, List[Dict[str, str]]] = {
+            '/ppp/secret': [],
+            '/ppp/profile': [],
+            '/ppp/active': [],
+        }
+        # Callbacks of clients running ``listen``, per menu
+        self.listeners: Dict[str, List[Callable[[Dict[str, str]], None]]] = {}
+        # Session .id -> [rx, tx] byte counters of its interface
+        self.counters: Dict[str, List[int]] = {}
+        self._populate()
+
+    def next_id(self) -> str:
+        return f"*{next(self._ids):X}"
+
+    def _populate(self):
+        config = self.config
+        profiles = ['default'] + [f"plan_{i}" for i in range(1, config.profiles + 1)]
+        for name in profiles:
+            self.tables['/ppp/profile'].append({
+                '.id': self.next_id(), 'name': name,
+                'local-address': 'pool-local', 'remote-address': 'pool-remote',
+                'rate-limit': '' if name == 'default' else f"{name[5:]}M/{name[5:]}M",
+            })
+
+        for i in range(1, config.secrets + 1):
+            secret = {
+                '.id': self.next_id(), 'name': f"user{i:05d}", 'password': f"pass{i:05d}",
+                'profile': profiles[i % len(profiles)], 'service': 'any', 'disabled': 'no',
+            }
+            self.tables['/ppp/secret'].append(secret)
+            if self.random.random() < config.active_ratio:
+                self.tables['/ppp/active'].append(self._session_for(secret))
+
+    def _session_for(self, secret: Dict[str, str]) -> Dict[str, str]:
+        octet = len(self.tables['/ppp/active']) + 2
+        return {
+            '.id': self.next_id(),
+            'name': secret['name'],
+            'service': 'pppoe',
+            'caller-id': '02:00:%02X:%02X:%02X:%02X' % tuple(self.random.randrange(256) for _ in range(4)),
+            'address': f"10.{(octet >> 16) & 255}.{(octet >> 8) & 255}.{octet & 255}",
+            'uptime': f"{self.random.randrange(1, 72)}h{self.random.randrange(60)}m",
+        }
+
+    def notify(self, path: str, row: Dict[str, str], dead: bool = False):
+        """Send a changed row to the clients listening on a menu."""
+        if dead:
+            row = {'.id': row['.id'], '.dead': 'yes'}
+        for callback in list(self.listeners.get(path, ())):
+            callback(row)
+
+    def connect_session(self, name: Optional[str] = None) -> Optional[Dict[str, str]]:
+        """Start a PPP session for a secret (a random idle one if not given)."""
+        active = {row['name'] for row in self.tables['/ppp/active']}
+        idle = [
+            secret for secret in self.tables['/ppp/secret']
+            if secret['name'] not in active and secret.get('disabled') != 'yes'
+            and (name is None or secret['name'] == name)
+        ]
+        if not idle:
+            return None
+        session = self._session_for(self.random.choice(idle))
+        session['uptime'] = '0s'
+        self.tables['/ppp/active'].append(session)
+        self.notify('/ppp/active', session)
+        return session
+
+    def disconnect_session(self, ref: Optional[str] = None) -> Optional[Dict[str, str]]:
+        """End a PPP session by .id or name (a random one if not given)."""
+        table = self.tables['/ppp/active']
+        if ref is None:
+            session = self.random.choice(table) if table else None
+        else:
+            session = self.find('/ppp/active', ref)
+        if session is None:
+            return None
+        table.remove(session)
+        self.notify('/ppp/active', session, dead=True)
+        return session
+
+    def interfaces(self) -> List[Dict[str, str]]:
+        """
+        Dynamic PPP interfaces of the active sessions.
+
+        Counters grow on every print and start from zero for a new session,
+        like a reconnect does on a real router.
+        """
+        rows = []
+        counters = {}
+        for session in self.tables['/ppp/active']:
+            rx, tx = self.counters.get(session['.id'], (0, 0))
+            rx += self.random.randrange(0, 2 * 1024 * 1024)
+            tx += self.random.randrange(0, 20 * 1024 * 1024)
+            counters[session['.id']] = [rx, tx]
+            rows.append({
+                '.id': f"*I{session['.id'][1:]}",
+                'name': f"<{session['service']}-{session['name']}>",
+                'type': f"{session['service']}-in",
+                'rx-byte': str(rx),
+                'tx-byte': str(tx),
+            })
+        self.counters = counters
+        return rows
+
+    def resource(self) -> Dict[str, str]:
+        total = 256 * 1024 * 1024
+        return {
+            'uptime': '3d4h5m6s',
+            'version': self.config.version,
+            'board-name': self.config.board_name,
+            'platform': 'MikroTik',
+            'cpu-load': str(self.random.randrange(1, 40)),
+            'free-memory': str(total - self.random.randrange(total // 4, total // 2)),
+            'total-memory': str(total),
+        }
+
+    def find(self, path: str, ref: str) -> Optional[Dict[str, str]]:
+        """Find a row by .id, or by name like RouterOS does."""
+        key = self.UNIQUE_KEYS.get(path, 'name')
+        for row in self.tables[path]:
+            if row['.id'] == ref or row.get(key) == ref:
+                return row
+        return None
+
+
+class CommandError(Exception):
+    """Turns into a !trap reply."""
+
+
+def _matches(row: Dict[str, str], queries: List[str]) -> bool:
+    """Evaluate RouterOS query words (?a=b, ?a, ?-a, ?#|&!) against a row."""
+    if not queries:
+        return True
+
+    stack: List[bool] = []
+    for query in queries:
+        if query.startswith('?#'):
+            for op in query[2:]:
+                if op == '!':
+                    stack.append(not stack.pop())
+                elif op in '|&':
+                    right, left = stack.pop(), stack.pop()
+                    stack.append(left or right if op == '|' else left and right)
+            continue
+
+        body = query[1:]
+        if body.startswith('='):
+            body = body[1:]
+        if body.startswith('-'):
+            stack.append(body[1:] not in row)
+        elif body.startswith('<') or body.startswith('>'):
+            key, _, value = body[1:].partition('=')
+            try:
+                left, right = float(row.get(key, 0)), float(value)
+            except ValueError:
+                left, right = row.get(key, ''), value
+            stack.append(left < right if body[0] == '<' else left > right)
+        elif '=' in body:
+            key, _, value = body.partition('=')
+            stack.append(row.get(key) == value)
+        else:
+            stack.append(body in row)
+    return all(stack)
+
+
+class RouterOSProtocolHandler:
+    """Serves one client connection of a simulated router."""
+
+    def __init__(self, server: 'SimulatedRouterServer', reader: asyncio.StreamReader,
+                 writer: asyncio.StreamWriter):
+        self.server = server
+        self.state = server.state
+        self.config = server.config
+        self.reader = reader
+        self.writer = writer
+        self.logged_in = False
+        # tag -> (menu, callback) of this client's running listens
+        self.listens: Dict[str, Tuple[str, Callable]] = {}
+
+    async def _read_sentence(self) -> List[str]:
+        words = []
+        while True:
+            first = await self.reader.readexactly(1)
+            if first == b'\x00':
+                return words
+            length_bytes = first + await self.reader.readexactly(Decoder.determineLength(first))
+            word = await self.reader.readexactly(Decoder.decodeLength(length_bytes))
+            words.append(word.decode('ASCII', errors='ignore'))
+
+    def _write_sentence(self, *words: str):
+        encoded = b''
+        for word in words:
+            raw = word.encode('ASCII', errors='replace')
+            encoded += Encoder.encodeLength(len(raw)) + raw
+        self.writer.write(encoded + b'\x00')
+
+    async def serve(self):
+        self.server.connections += 1
+        try:
+            while True:
+                sentence = await self._read_sentence()
+                if not sentence:
+                    continue
+                if not await self._delay_reply():
+                    break
+                replies = self.handle(sentence[0], sentence[1:])
+                for reply in replies:
+                    self._write_sentence(*reply)
+                await self.writer.drain()
+                if replies and replies[-1][0] == '!fatal':
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            # Client went away or the simulator is shutting down
+            pass
+        finally:
+            for tag in list(self.listens):
+                self._stop_listen(tag)
+            self.server.connections -= 1
+            self.writer.close()
+
+    async def _delay_reply(self) -> bool:
+        """Apply latency and loss; returns False if the connection is dropped."""
+        config = self.config
+        rand = self.state.random
+        if config.drop_rate and rand.random() < config.drop_rate:
+            return False
+        delay = config.latency + (rand.random() * config.jitter if config.jitter else 0)
+        if config.packet_loss and rand.random() < config.packet_loss:
+            delay += config.retransmit_delay
+        if delay:
+            await asyncio.sleep(delay)
+        return True
+
+    def handle(self, command: str, words: List[str]) -> List[Tuple[str, ...]]:
+        """Execute one API sentence and return the reply sentences."""
+        self.server.commands += 1
+        attributes: Dict[str, str] = {}
+        queries: List[str] = []
+        tag = None
+        for word in words:
+            if word.startswith('='):
+                key, _, value = word[1:].partition('=')
+                attributes[key] = value
+            elif word.startswith('?'):
+                queries.append(word)
+            elif word.startswith('.tag='):
+                tag = word[5:]
+
+        def done(*extra: str) -> Tuple[str, ...]:
+            return ('!done',) + extra + ((f'.tag={tag}',) if tag else ())
+
+        if command == '/login':
+            return self._login(attributes, tag, done)
+        if not self.logged_in:
+            return [('!fatal', 'not logged in')]
+
+        if command == '/cancel':
+            return self._cancel(attributes.get('tag'), done)
+        path, _, action = command.rpartition('/')
+        if action == 'listen' and path in self.state.tables:
+            self._start_listen(path, tag)
+            return []
+        try:
+            rows = self._dispatch(path, action, attributes, queries)
+        except CommandError as e:
+            return [('!trap', f'=message={e}') + ((f'.tag={tag}',) if tag else ()), done()]
+
+        if isinstance(rows, str):
+            return [done(f'=ret={rows}')]
+        proplist = attributes.get('.proplist')
+        keys = proplist.split(',') if proplist else None
+        replies = []
+        for row in rows:
+            items = row.items() if keys is None else ((k, row[k]) for k in keys if k in row)
+            replies.append(('!re',) + tuple(f'={k}={v}' for k, v in items) + ((f'.tag={tag}',) if tag else ()))
+        replies.append(done())
+        return replies
+
+    def _start_listen(self, path: str, tag: Optional[str]):
+        """Stream changes of a menu as !re sentences until cancelled."""
+        tag_words = (f'.tag={tag}',) if tag else ()
+
+        def send(row: Dict[str, str]):
+            self._write_sentence('!re', *(f'={k}={v}' for k, v in row.items()), *tag_words)
+
+        self.listens[tag or ''] = (path, send)
+        self.state.listeners.setdefault(path, []).append(send)
+
+    def _stop_listen(self, tag: str):
+        path, send = self.listens.pop(tag)
+        self.state.listeners[path].remove(send)
+
+    def _cancel(self, tag: Optional[str], done) -> List[Tuple[str, ...]]:
+        if tag is None:
+            tags = list(self.listens)
+        elif tag in self.listens:
+            tags = [tag]
+        else:
+            return [('!trap', '=message=unknown command tag'), done()]
+        replies = []
+        for cancelled in tags:
+            self._stop_listen(cancelled)
+            tag_words = (f'.tag={cancelled}',) if cancelled else ()
+            replies.append(('!trap', '=category=2', '=message=interrupted') + tag_words)
+            replies.append(('!done',) + tag_words)
+        replies.append(done())
+        return replies
+
+    def _login(self, attributes: Dict[str, str], tag: Optional[str], done) -> List[Tuple[str, ...]]:
+        config = self.config
+        rejected = (
+            attributes.get('name') != config.username
+            or attributes.get('password') != config.password
+            or (config.login_failure_rate and self.state.random.random() < config.login_failure_rate)
+        )
+        if rejected:
+            self.server.failed_logins += 1
+            trap = ('!trap', '=message=invalid user name or password (6)') + ((f'.tag={tag}',) if tag else ())
+            return [trap, done()]
+        self.logged_in = True
+        self.server.logins += 1
+        return [done()]
+
+    def _dispatch(self, path: str, action: str, attributes: Dict[str, str], queries: List[str]):
+        state = self.state
+        if path == '/system/resource' and action == 'print':
+            return [state.resource()]
+        if path == '/interface' and action == 'print':
+            return [row for row in state.interfaces() if _matches(row, queries)]
+        if path == '/system/identity':
+            if action == 'print':
+                return [{'name': state.identity}]
+            if action == 'set':
+                state.identity = attributes.get('name', state.identity)
+                return []
+        if path not in state.tables:
+            raise CommandError('no such command prefix')
+
+        table = state.tables[path]
+        if action == 'print':
+            return [row for row in table if _matches(row, queries)]
+        if path == '/ppp/active' and action != 'remove':
+            raise CommandError('no such command')
+        if path == '/ppp/active':
+            # Removing an active entry disconnects the session
+            for ref in filter(None, attributes.get('.id', '').split(',')):
+                if state.disconnect_session(ref) is None:
+                    raise CommandError('no such item')
+            return []
+
+        if action == 'add':
+            unique = RouterState.UNIQUE_KEYS.get(path)
+            if unique and unique not in attributes:
+                raise CommandError(f'failure: {unique} is required')
+            if unique and state.find(path, attributes[unique]):
+                raise CommandError(f'failure: {path[5:]} with the same {unique} already exists')
+            row = {'.id': state.next_id(), **attributes}
+            if path == '/ppp/secret':
+                row.setdefault('disabled', 'no')
+                row.setdefault('service', 'any')
+                row.setdefault('profile', 'default')
+            table.append(row)
+            return row['.id']
+
+        if action in ('set', 'remove'):
+            refs = attributes.pop('.id', '')
+            targets = []
+            for ref in filter(None, refs.split(',')):
+                row = state.find(path, ref)
+                if row is None:
+                    raise CommandError('no such item')
+                targets.append(row)
+            if action == 'set':
+                for row in targets:
+                    row.update(attributes)
+            else:
+                removed = set(id(row) for row in targets)
+                table[:] = [row for row in table if id(row) not in removed]
+            return []
+
+        raise CommandError('no such command')
+
+
+class SimulatedRouterServer:
+    """One simulated router listening on a TCP port."""
+
+    def __init__(self, host: str, port: int, config: SimulatorConfig, identity: str):
+        self.host = host
+        self.port = port
+        self.config = config
+        self.state = RouterState(config, identity)
+        self.server: Optional[asyncio.AbstractServer] = None
+        self._churn_task: Optional[asyncio.Task] = None
+        self.connections = 0
+        self.commands = 0
+        self.logins = 0
+        self.failed_logins = 0
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._on_connect, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        if self.config.session_churn:
+            self._churn_task = asyncio.ensure_future(self._churn())
+
+    async def _churn(self):
+        """Connect and disconnect random sessions, keeping the table size roughly stable."""
+        state = self.state
+        target = len(state.tables['/ppp/active'])
+        while True:
+            await asyncio.sleep(state.random.expovariate(self.config.session_churn))
+            active = len(state.tables['/ppp/active'])
+            if active < target or (active == target and state.random.random() < 0.5):
+                state.connect_session()
+            else:
+                state.disconnect_session()
+
+    async def stop(self):
+        if self._churn_task:
+            self._churn_task.cancel()
+            self._churn_task = None
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+
+    async def _on_connect(self, reader, writer):
+        await RouterOSProtocolHandler(self, reader, writer).serve()
+
+    def router_kwargs(self) -> Dict[str, Any]:
+        """Fields for a Router model instance pointing at this simulator."""
+        return {
+            'vpn_ip': self.host,
+            'api_port': self.port,
+            'username': self.config.username,
+            'password': self.config.password,
+        }
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'connections': self.connections,
+            'commands': self.commands,
+            'logins': self.logins,
+            'failed_logins': self.failed_logins,
+        }
+
+
+class SimulatedFleet:
+    """
+    Many simulated routers served from one event loop in a background thread.
+
+    Routers listen on consecutive ports starting at ``base_port`` (0 picks
+    free ports). With ``spread_hosts`` each router gets its own loopback
+    address (127.0.x.y) and listens on ``base_port``, which on Linux lets
+    hundreds of routers share the real API port 8728.
+
+    Args:
+        count: Number of routers
+        host: Listen address when not spreading over loopback addresses
+        base_port: First port (0 = let the OS choose)
+        spread_hosts: Give every router its own 127.0.x.y address
+        **config: SimulatorConfig options shared by every router
+    """
+
+    def __init__(self, count: int, host: str = '127.0.0.1', base_port: int = 0,
+                 spread_hosts: bool = False, **config):
+        self.count = count
+        self.host = host
+        self.base_port = base_port
+        self.spread_hosts = spread_hosts
+        self.config = config
+        self.routers: List[SimulatedRouterServer] = []
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._started = threading.Event()
+        self._error: Optional[BaseException] = None
+
+    def _endpoint(self, index: int) -> Tuple[str, int]:
+        if self.spread_hosts:
+            number = index + 2
+            return f"127.0.{number // 254}.{number % 254 + 1}", self.base_port
+        return self.host, self.base_port + index if self.base_port else 0
+
+    def start(self) -> 'SimulatedFleet':
+        """Start every router; returns once all of them are listening."""
+        self._thread = threading.Thread(target=self._run, name='routeros-simulator', daemon=True)
+        self._thread.start()
+        self._started.wait()
+        if self._error:
+            raise self._error
+        return self
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            for index in range(self.count):
+                host, port = self._endpoint(index)
+                seed = self.config.get('seed')
+                config = SimulatorConfig(**{**self.config, 'seed': None if seed is None else seed + index})
+                router = SimulatedRouterServer(host, port, config, identity=f"SimRouter{index + 1}")
+                self.loop.run_until_complete(router.start())
+                self.routers.append(router)
+        except BaseException as e:
+            self._error = e
+        self._started.set()
+        if self._error is None:
+            self.loop.run_forever()
+        self.loop.close()
+
+    async def _shutdown(self):
+        for router in self.routers:
+            await router.stop()
+        current = asyncio.current_task()
+        handlers = [task for task in asyncio.all_tasks() if task is not current]
+        for task in handlers:
+            task.cancel()
+        await asyncio.gather(*handlers, return_exceptions=True)
+        self.loop.stop()
+
+    def stop(self):
+        """Stop every router, drop open client connections and end the loop."""
+        if self.loop and self._thread and self._thread.is_alive():
+            asyncio.run_coroutine_threadsafe(self._shutdown(), self.loop)
+            self._thread.join()
+
+    def call(self, func, *args):
+        """Run a function on the simulator loop, e.g. to mutate router state safely."""
+        future = asyncio.run_coroutine_threadsafe(self._call(func, *args), self.loop)
+        return future.result()
+
+    @staticmethod
+    async def _call(func, *args):
+        return func(*args)
+
+    def stats(self) -> Dict[str, int]:
+        """Totals across the fleet."""
+        totals: Dict[str, int] = {}
+        for router in self.routers:
+            for key, value in router.stats().items():
+                totals[key] = totals.get(key, 0) + value
+        return totals
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+class SimulatedRouter(SimulatedFleet):
+    """
+    A single simulated router, for use as a test fixture.
+
+    Example:
+        with SimulatedRouter(secrets=50, latency=0.01) as sim:
+            router = Router(name='sim', **sim.router_kwargs())
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, **config):
+        super().__init__(1, host=host, base_port=port, **config)
+
+    @property
+    def server(self) -> SimulatedRouterServer:
+        return self.routers[0]
+
+    @property
+    def state(self) -> RouterState:
+        return self.server.state
+
+    def router_kwargs(self) -> Dict[str, Any]:
+        return self.server.router_kwargs()
@@ -2,9 +2,19 @@
 Celery tasks for router management.
 """
 from celery import shared_task
+from django.conf import settings
 from django.utils import timezone
-from .models import Router
+from .models import Router, RouterCommand
 from .services.mikrotik_api import MikroTikAPIService
+from .services.reconciler import SecretReconciler, dirty_router_ids
+from .services.outbox import replay_commands, purge_processed_commands
+from .services.session_accounting import account_sessions
+from .services import health_store, status_store
+from .services.poll_scheduler import PollScheduler
+from .services.fleet_probe import probe_shard, shard
+from .services.profile_rollout import rollout_profiles
+from .services.bulk_provision import provision_secrets
+from .services.secret_import import import_router_secrets
 import logging
 
 logger = logging.getLogger(__name__)
@@ -22,22 +32,17 @@ def check_router_status(router_id):
         router = Router.objects.get(id=router_id, is_active=True)
         api_service = MikroTikAPIService(router)
         is_online, info = api_service.check_status()
+        health_store.record_sample(router, is_online, info)
+        PollScheduler().record_result(router.id, is_online)
+        status_store.record_result(router, is_online, info)
         
         if is_online:
-            router.update_status('ONLINE')
-            
-            # Update router information
-            if 'version' in info:
-                router.router_version = info['version']
-            if 'board_name' in info:
-                router.router_model = info['board_name']
-            if 'identity' in info:
-                router.router_identity = info['identity']
-            
-            router.save()
             logger.info(f"Router {router.name} is online")
+            
+            # Deliver changes queued while the router was unreachable
+            if router.commands.filter(status='PENDING').exists():
+                replay_router_commands.delay(str(router.id))
         else:
-            router.update_status('OFFLINE')
             logger.warning(f"Router {router.name} is offline: {info.get('error', 'Unknown')}")
         
         return {'router': router.name, 'status': router.status}
@@ -50,26 +55,91 @@ def check_router_status(router_id):
         return {'error': str(e)}
 
 
+@shared_task
+def schedule_router_probes():
+    """
+    Dispatch the status checks that fall due before the next scheduler tick.
+    This task is scheduled to run every ROUTER_POLL_TICK seconds.
+    """
+    routers = Router.objects.filter(is_active=True).values_list('id', 'status')
+    due, metrics = PollScheduler().plan(routers)
+    
+    # Routers due within the same few seconds share shards, sent when the first
+    # of them is due; the spread over the tick is kept
+    slot_seconds = getattr(settings, 'ROUTER_PROBE_SLOT_SECONDS', 5)
+    slots = {}
+    for router_id, countdown in sorted(due, key=lambda item: item[1]):
+        slots.setdefault(int(countdown // slot_seconds), (countdown, []))[1].append(router_id)
+    shards = 0
+    for countdown, router_ids in slots.values():
+        for shard_ids in shard(router_ids):
+            probe_router_shard.apply_async((shard_ids,), countdown=countdown)
+            shards += 1
+    metrics['shards'] = shards
+    
+    if metrics['queue_depth']:
+        logger.warning(
+            f"Router probe scheduler: {metrics['queue_depth']} routers overdue, "
+            f"max lag {metrics['max_lag']}s"
+        )
+    logger.info(f"Router probe scheduler: {metrics}")
+    return metrics
+
+
 @shared_task
 def check_all_routers_status():
     """
-    Check the status of all active routers.
-    This task is scheduled to run periodically.
+    Check the status of all active routers at once.
+    Periodic checks go through schedule_router_probes(); this is for a
+    manual full sweep.
     """
-    active_routers = Router.objects.filter(is_active=True)
+    router_ids = Router.objects.filter(is_active=True).values_list('id', flat=True)
     results = []
     
-    for router in active_routers:
-        result = check_router_status.delay(str(router.id))
+    for shard_ids in shard(router_ids):
+        result = probe_router_shard.delay(shard_ids)
         results.append({
-            'router': router.name,
+            'routers': len(shard_ids),
             'task_id': result.id
         })
     
-    logger.info(f"Initiated status check for {len(results)} routers")
+    logger.info(f"Initiated status check for {sum(r['routers'] for r in results)} routers in {len(results)} shards")
     return results
 
 
+@shared_task(ignore_result=True)
+def probe_router_shard(router_ids):
+    """
+    Check the status of a shard of routers concurrently.
+    
+    Args:
+        router_ids: UUIDs of the routers in the shard
+    """
+    try:
+        stats = probe_shard(router_ids)
+    except Exception as e:
+        logger.error(f"Error probing router shard: {str(e)}")
+        return {'error': str(e)}
+    
+    # Deliver changes queued while the routers were unreachable
+    for router_id in stats.pop('replay'):
+        replay_router_commands.delay(router_id)
+    
+    logger.info(f"Router shard probed: {stats}")
+    return stats
+
+
+@shared_task
+def flush_router_status():
+    """
+    Copy last_checked/last_online of recent status checks to the Router table.
+    This task is scheduled to run periodically.
+    """
+    updated = status_store.flush_checked()
+    logger.info(f"Flushed status check times of {updated} routers")
+    return {'updated': updated}
+
+
 @shared_task
 def sync_router_users(router_id):
     """
@@ -101,3 +171,181 @@ def sync_router_users(router_id):
         logger.error(f"Error syncing router users: {str(e)}")
         return {'error': str(e)}
 
+
+@shared_task
+def rollout_ppp_profiles(profile_ids=None, rollout_id=None):
+    """
+    Create or update billing profiles in /ppp/profile on every active router.
+    
+    Args:
+        profile_ids: UUIDs of the profiles to push (default: all active profiles)
+        rollout_id: Key for progress reporting (see profile_rollout.get_rollout())
+    """
+    from profiles.models import Profile
+    
+    try:
+        profiles = Profile.objects.filter(is_active=True)
+        if profile_ids is not None:
+            profiles = Profile.objects.filter(id__in=profile_ids)
+        routers = Router.objects.filter(is_active=True)
+        progress = rollout_profiles(profiles, routers, rollout_id=rollout_id)
+        return {key: progress[key] for key in ('profiles', 'total', 'done', 'failed')}
+    except Exception as e:
+        logger.error(f"Error rolling out PPP profiles: {str(e)}")
+        return {'error': str(e)}
+
+
+@shared_task
+def provision_router_secrets(router_id):
+    """
+    Push every customer of a router as PPP secrets with a single script import.
+    
+    Args:
+        router_id: UUID of the router
+    """
+    try:
+        router = Router.objects.get(id=router_id, is_active=True)
+        return provision_secrets(router)
+        
+    except Router.DoesNotExist:
+        logger.error(f"Router with ID {router_id} not found")
+        return {'error': 'Router not found'}
+    except Exception as e:
+        logger.error(f"Error provisioning router secrets: {str(e)}")
+        return {'error': str(e)}
+
+
+@shared_task
+def import_router_users(router_id, commit=False, default_profile_id=None, user_id=None, expires_at=None):
+    """
+    Create customers for the PPP secrets already on a router.
+    
+    Args:
+        router_id: UUID of the router
+        commit: Write the customers; otherwise only return the dry-run report
+        default_profile_id: UUID of the profile for secrets with an unknown router profile
+        user_id: Admin user recorded as creator
+        expires_at: ISO datetime the enabled secrets expire at (default: profile duration)
+    """
+    from django.contrib.auth.models import User
+    from django.utils.dateparse import parse_datetime
+    from profiles.models import Profile
+    
+    try:
+        router = Router.objects.get(id=router_id, is_active=True)
+        default_profile = Profile.objects.get(id=default_profile_id) if default_profile_id else None
+        created_by = User.objects.filter(id=user_id).first() if user_id else None
+        return import_router_secrets(router, commit=commit, default_profile=default_profile,
+                                     created_by=created_by,
+                                     expires_at=parse_datetime(expires_at) if expires_at else None)
+        
+    except Router.DoesNotExist:
+        logger.error(f"Router with ID {router_id} not found")
+        return {'error': 'Router not found'}
+    except Exception as e:
+        logger.error(f"Error importing router users: {str(e)}")
+        return {'error': str(e)}
+
+
+@shared_task
+def reconcile_router_secrets(router_id, prune=None, dry_run=False):
+    """
+    Bring the PPP secrets of a router in line with its customers.
+    
+    Args:
+        router_id: UUID of the router
+        prune: Remove secrets without a customer (default: ROUTER_RECONCILE_PRUNE)
+        dry_run: Only compute and report the drift
+    """
+    try:
+        router = Router.objects.get(id=router_id, is_active=True)
+        stats = SecretReconciler(router, prune=prune).reconcile(dry_run=dry_run)
+        
+        if stats['success'] and not dry_run:
+            secret_count = stats['actual'] + stats['create'] - stats['delete']
+            Router.objects.filter(pk=router.pk).update(total_users=secret_count)
+        return stats
+        
+    except Router.DoesNotExist:
+        logger.error(f"Router with ID {router_id} not found")
+        return {'error': 'Router not found'}
+    except Exception as e:
+        logger.error(f"Error reconciling router secrets: {str(e)}")
+        return {'error': str(e)}
+
+
+@shared_task
+def reconcile_all_routers(only_dirty=True):
+    """
+    Queue reconciliation for active routers.
+    
+    Args:
+        only_dirty: Only routers whose customers changed since their last run
+    """
+    router_ids = list(Router.objects.filter(is_active=True).values_list('id', flat=True))
+    if only_dirty:
+        router_ids = dirty_router_ids(router_ids)
+    
+    for router_id in router_ids:
+        reconcile_router_secrets.delay(str(router_id))
+    
+    logger.info(f"Queued reconciliation for {len(router_ids)} routers")
+    return {'queued': len(router_ids)}
+
+
+@shared_task
+def replay_router_commands(router_id):
+    """
+    Apply the queued PPP secret changes of a router.
+    
+    Args:
+        router_id: UUID of the router
+    """
+    try:
+        router = Router.objects.get(id=router_id)
+        return replay_commands(router)
+        
+    except Router.DoesNotExist:
+        logger.error(f"Router with ID {router_id} not found")
+        return {'error': 'Router not found'}
+    except Exception as e:
+        logger.error(f"Error replaying router commands: {str(e)}")
+        return {'error': str(e)}
+
+
+@shared_task
+def replay_all_pending_commands():
+    """
+    Queue a replay for every active router with pending commands and
+    purge old processed commands. Scheduled as a safety net.
+    """
+    router_ids = list(
+        RouterCommand.objects.filter(status='PENDING', router__is_active=True)
+        .values_list('router_id', flat=True).distinct()
+    )
+    for router_id in router_ids:
+        replay_router_commands.delay(str(router_id))
+    
+    purged = purge_processed_commands()
+    logger.info(f"Queued command replay for {len(router_ids)} routers, purged {purged} old commands")
+    return {'queued': len(router_ids), 'purged': purged}
+
+
+@shared_task
+def account_customer_sessions():
+    """
+    Open and close CustomerSession rows from the routers' active sessions.
+    """
+    routers = Router.objects.filter(is_active=True, status='ONLINE')
+    return account_sessions(routers)
+
+
+@shared_task
+def rollup_router_health():
+    """
+    Roll router health samples up into hourly and daily buckets and
+    delete buckets past their retention.
+    """
+    stats = health_store.rollup_health()
+    logger.info(f"Router health rollup: {stats}")
+    return stats
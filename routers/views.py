@@ -7,10 +7,18 @@ from django.contrib import messages
 from django.http import JsonResponse
 from django.views.decorators.http import require_POST
 from django.db.models import Count, Q
+from django.utils import timezone
+from datetime import timedelta
 
 from .models import Router, RouterLog
 from .forms import RouterForm
-from .services.mikrotik_api import MikroTikAPIService
+from .services.connection_pool import get_connection_pool
+from .services.circuit_breaker import RouterCircuitBreaker
+from .services.health_store import get_health_series
+from .services.poll_scheduler import get_metrics as get_poll_metrics
+from .services import status_store
+from .services.rate_limiter import get_stats as get_limiter_stats
+from .tasks import reconcile_router_secrets
 from core.models import ActivityLog
 
 
@@ -22,7 +30,7 @@ def router_list(request):
     ).order_by('name')
     
     context = {
-        'routers': routers,
+        'routers': status_store.overlay(routers),
         'total_routers': routers.count(),
         'online_routers': routers.filter(status='ONLINE').count(),
         'offline_routers': routers.filter(status='OFFLINE').count(),
@@ -68,6 +76,7 @@ def router_create(request):
 def router_detail(request, router_id):
     """View router details and logs."""
     router = get_object_or_404(Router, id=router_id)
+    status_store.overlay([router])
     recent_logs = router.logs.all()[:20]
     
     # Get router statistics
@@ -95,6 +104,9 @@ def router_edit(request, router_id):
         if form.is_valid():
             router = form.save()
             
+            # Connection details may have changed; give the router a clean slate
+            RouterCircuitBreaker(router.id).reset()
+            
             # Log activity
             ActivityLog.objects.create(
                 user=request.user,
@@ -135,7 +147,9 @@ def router_delete(request, router_id):
         ip_address=request.META.get('REMOTE_ADDR'),
     )
     
+    router_pk = router.id
     router.delete()
+    get_connection_pool().close_router(router_pk)
     messages.success(request, f"Router '{router_name}' deleted successfully!")
     
     return redirect('routers:router_list')
@@ -143,59 +157,86 @@ def router_delete(request, router_id):
 
 @login_required
 def router_test_connection(request, router_id):
-    """Test connection to a router."""
+    """Test connection to a router (?refresh=1 skips the cached status)."""
     router = get_object_or_404(Router, id=router_id)
     
-    api_service = MikroTikAPIService(router)
-    is_online, info = api_service.check_status()
-    
-    if is_online:
-        router.update_status('ONLINE')
-        
-        # Update router info
-        if 'version' in info:
-            router.router_version = info['version']
-        if 'board_name' in info:
-            router.router_model = info['board_name']
-        if 'identity' in info:
-            router.router_identity = info['identity']
-        router.save()
-        
+    entry, _ = status_store.check_router(router, force=request.GET.get('refresh') == '1')
+    
+    if entry['status'] == 'ONLINE':
         messages.success(request, f"Router '{router.name}' is ONLINE!")
     else:
-        router.update_status('OFFLINE')
-        error_msg = info.get('error', 'Unknown error')
+        error_msg = entry['error'] or 'Unknown error'
         messages.error(request, f"Router '{router.name}' is OFFLINE: {error_msg}")
     
     return redirect('routers:router_detail', router_id=router.id)
 
 
+@login_required
+@require_POST
+def router_reconcile(request, router_id):
+    """Queue a reconciliation of the router's PPP secrets with the customer table."""
+    router = get_object_or_404(Router, id=router_id)
+    
+    reconcile_router_secrets.delay(str(router.id))
+    messages.success(request, f"Reconciliation of '{router.name}' queued. Results will appear in the router logs.")
+    
+    return redirect('routers:router_detail', router_id=router.id)
+
+
 @login_required
 def router_status_ajax(request, router_id):
-    """AJAX endpoint to check router status."""
+    """AJAX endpoint to check router status (?refresh=1 skips the cached status)."""
     router = get_object_or_404(Router, id=router_id)
     
-    api_service = MikroTikAPIService(router)
-    is_online, info = api_service.check_status()
+    entry, probed = status_store.check_router(router, force=request.GET.get('refresh') == '1')
     
-    if is_online:
-        router.update_status('ONLINE')
+    if entry['status'] == 'ONLINE':
         status_data = {
             'status': 'ONLINE',
             'status_class': 'bg-green-500',
-            'info': info,
+            'info': entry['info'],
         }
     else:
-        router.update_status('OFFLINE')
         status_data = {
             'status': 'OFFLINE',
             'status_class': 'bg-red-500',
-            'error': info.get('error', 'Connection failed'),
+            'error': entry['error'] or 'Connection failed',
         }
+    status_data['checked_at'] = entry['checked_at'].isoformat()
+    status_data['cached'] = not probed
+    status_data['limiter'] = get_limiter_stats(router.id)
     
     return JsonResponse(status_data)
 
 
+@login_required
+def router_poll_metrics(request):
+    """AJAX endpoint with the queue depth and lag of the status probe scheduler."""
+    return JsonResponse(get_poll_metrics())
+
+
+@login_required
+def router_health_ajax(request, router_id):
+    """AJAX endpoint with the router's health history for charts."""
+    router = get_object_or_404(Router, id=router_id)
+    
+    ranges = {
+        '6h': timedelta(hours=6),
+        '24h': timedelta(hours=24),
+        '7d': timedelta(days=7),
+        '30d': timedelta(days=30),
+        '1y': timedelta(days=365),
+    }
+    range_key = request.GET.get('range', '24h')
+    if range_key not in ranges:
+        return JsonResponse({'error': f"Unknown range, use one of: {', '.join(ranges)}"}, status=400)
+    
+    end = timezone.now()
+    series = get_health_series(router, end - ranges[range_key], end)
+    series['range'] = range_key
+    return JsonResponse(series)
+
+
 @login_required
 def router_logs(request, router_id):
     """View all logs for a router."""
@@ -171,13 +171,13 @@ def voucher_redeem(request):
                 voucher.mark_as_used(customer, request.META.get('REMOTE_ADDR'))
                 
                 # Extend customer subscription
+                was_active = customer.is_active
                 customer.extend_subscription()
                 
                 # Enable if disabled
-                if not customer.is_active:
-                    from routers.services.mikrotik_api import MikroTikAPIService
-                    api_service = MikroTikAPIService(customer.router)
-                    api_service.enable_ppp_secret(customer.username)
+                if not was_active:
+                    from routers.services.outbox import enqueue_command
+                    enqueue_command(customer.router, customer.username, 'ENABLE', user=request.user)
                 
                 # Log activity
                 ActivityLog.objects.create(